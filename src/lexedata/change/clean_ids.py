@@ -7,103 +7,146 @@ Optionally, create ‘transparent’ IDs, that is alphanumerical IDs which are d
 """
 
 import typing as t
+from collections import Counter
 
 import pycldf
 
 from lexedata import cli
-from lexedata.util import ID_FORMAT, string_to_id
+from lexedata.util import ID_FORMAT, raw_columns, string_to_id, substitute_ids
 
 
-def transparent_form_mapping(forms: t.Iterable) -> t.Mapping[str, str]:
-    """Create transparent form IDs."""
-    avoid = {row.id.lower() for row in forms if ID_FORMAT.fullmatch(row.id.lower())}
+def unique_mapping(bases: t.Iterable[t.Tuple[str, str]]) -> t.Dict[str, str]:
+    """Map IDs to unique new IDs derived from their bases
 
-    mapping = {}
-    for form in forms:
-        i = 1
-        base = string_to_id("{:}_{:}".format(form.language, form.concept))
+    An ID that equals its base keeps it. Every other ID is mapped to its base,
+    with a suffix _s2, _s3, … where needed to keep the new IDs unique.
 
-        if base in avoid and base not in mapping:
-            # I kept a spot for you!
-            mapping[form.id] = base
-            continue
+    >>> unique_mapping([("A b", "a_b"), ("a_b", "a_b"), ("A-b", "a_b")])
+    {'A b': 'a_b_s2', 'a_b': 'a_b', 'A-b': 'a_b_s3'}
 
-        # Make sure ID is unique
+    """
+    bases = list(bases)
+    taken = {id for id, base in bases if id == base}
+    mapping = {}
+    for id, base in bases:
+        if id == base:
+            mapping[id] = id
+            continue
+        i = 1
         tentative_mapping = base
-        while tentative_mapping in avoid or tentative_mapping in mapping:
+        while tentative_mapping in taken:
             i += 1
             tentative_mapping = "{:}_s{:}".format(base, i)
-        mapping[form.id] = tentative_mapping
-
+        taken.add(tentative_mapping)
+        mapping[id] = tentative_mapping
     return mapping
 
 
-def clean_mapping(ids: t.Set[str]) -> t.Mapping[str, str]:
+def transparent_form_mapping(dataset: pycldf.Dataset) -> t.Mapping[str, str]:
+    """Create transparent form IDs, from the language and concept of each form."""
+    return unique_mapping(
+        (id, string_to_id("{:}_{:}".format(language, concept)) or "form")
+        for id, language, concept in raw_columns(
+            dataset["FormTable"],
+            dataset["FormTable", "id"].name,
+            dataset["FormTable", "languageReference"].name,
+            dataset["FormTable", "parameterReference"].name,
+        )
+    )
+
+
+def clean_mapping(ids: t.Iterable[str]) -> t.Mapping[str, str]:
     """Create unique normalized IDs."""
-    avoid = {id.lower() for id in ids}
+    return unique_mapping((id, string_to_id(id) or "id") for id in ids)
 
-    mapping = {}
-    for id in ids:
-        i = 1
-        base = string_to_id(id)
 
-        if base in avoid and base not in mapping:
-            # I kept a spot for you!
-            mapping[id] = base
-            continue
+def integer_mapping(ids: t.Iterable[str]) -> t.Mapping[str, str]:
+    """Number the IDs consecutively, starting from 1.
 
-        # Make sure ID is unique
-        tentative_mapping = base
-        while tentative_mapping in avoid or tentative_mapping in mapping:
-            i += 1
-            tentative_mapping = "{:}_s{:}".format(base, i)
-        mapping[id] = tentative_mapping
+    >>> integer_mapping(["b", "a", "7"])
+    {'b': '1', 'a': '2', '7': '3'}
 
-    return mapping
+    """
+    return {id: str(i) for i, id in enumerate(ids, 1)}
 
 
 transparent_mappings = {"FormTable": transparent_form_mapping}
 
-if __name__ == "__main__":
-    parser = cli.parser(__doc__)
-    parser.add_argument(
-        "--transparent",
-        action="store_true",
-        default=False,
-        help="Generate transparent IDs.",
-    )
-    args = parser.parse_args()
-    logger = cli.setup_logging(args)
 
-    ds = pycldf.Wordlist.from_metadata(args.metadata)
+def clean_ids(
+    dataset: pycldf.Dataset,
+    transparent: bool = False,
+    integer: bool = False,
+    logger: cli.logging.Logger = cli.logger,
+) -> None:
+    """Clean the ID columns of all tables, and update all references to them
 
-    for table in ds.tables:
-        ttype = ds.get_tabletype(table)
+    First compute the mappings from old to new IDs for every table, then
+    rewrite each table exactly once, applying all mappings to its ID column
+    and every column that references another table. Raise a ValueError,
+    before changing anything, if a table has duplicate IDs.
+
+    """
+    mappings: t.Dict[str, t.Mapping[str, str]] = {}
+    for table in dataset.tables:
         c_id = table.get_column("http://cldf.clld.org/v1.0/terms.rdf#id")
-        if c_id.datatype.base == "string":
-            ...
-        elif c_id.datatype.base == "integer":
+        if c_id is None:
             continue
-        else:
+        ttype = dataset.get_tabletype(table)
+        if c_id.datatype.base not in ("string", "integer"):
             logger.warning(
-                f"Table {table.uri} had an id column ({c_id.name}) that is neither integer nor string. I did not touch it."
+                f"Table {table.url} had an id column ({c_id.name}) that is neither integer nor string. I did not touch it."
             )
             continue
+        elif c_id.datatype.base == "integer" and not integer:
+            continue
 
-        c_id.datatype.format = ID_FORMAT.pattern
+        ids = [id for (id,) in raw_columns(table, c_id.name)]
+        duplicates = sorted({id for id, count in Counter(ids).items() if count > 1})
+        if duplicates:
+            # A mapping from old to new IDs cannot tell the rows apart, and
+            # references to these IDs are ambiguous anyway.
+            raise ValueError(
+                f"Table {table.url} has duplicate IDs {duplicates}. Make the IDs unique before cleaning them."
+            )
 
-        if args.transparent and ttype in transparent_mappings:
-            mapping = transparent_mappings[ttype](ds.objects(ttype))
+        if integer:
+            mapping = integer_mapping(ids)
+        elif transparent and ttype in transparent_mappings:
+            mapping = transparent_mappings[ttype](dataset)
         else:
-            ids = {row[c_id.name] for row in ds[table]}
             mapping = clean_mapping(ids)
 
-        foreign_keys_to_here = {
-            (table, foreign_key)
-            for table in ds.tables
-            for foreign_key in table.tableSchema.foreignKeys
-        }
-        for table, column in foreign_keys_to_here:
-            ...
+        if c_id.datatype.base == "string":
+            c_id.datatype.format = ID_FORMAT.pattern
+        changes = {old: new for old, new in mapping.items() if old != new}
+        if changes:
+            mappings[table.url.string] = changes
+
+    dataset.write_metadata()
+    substitute_ids(dataset, mappings, logger=logger)
+
+
+if __name__ == "__main__":
+    parser = cli.parser(__doc__)
+    parser.add_argument(
+        "--transparent",
+        action="store_true",
+        default=False,
+        help="Generate transparent IDs.",
+    )
+    parser.add_argument(
+        "--integer",
+        action="store_true",
+        default=False,
+        help="Replace all IDs by consecutive integers, starting from 1 in every table.",
+    )
+    args = parser.parse_args()
+    logger = cli.setup_logging(args)
 
-            c_id.datatype = c_id.datatype
+    clean_ids(
+        pycldf.Wordlist.from_metadata(args.metadata),
+        transparent=args.transparent,
+        integer=args.integer,
+        logger=logger,
+    )
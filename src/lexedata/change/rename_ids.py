@@ -0,0 +1,168 @@
+"""Change IDs in one table of a dataset and in all tables referencing it
+
+This is the shared implementation of the rename_language and rename_concept
+scripts.
+
+"""
+import pycldf
+import argparse
+import typing as t
+from pathlib import Path
+
+from lexedata import cli
+from lexedata.enrich.add_status_column import add_status_column_to_table
+from lexedata.util import read_id_mapping, substitute_ids
+
+
+def rename(
+    ds: pycldf.Dataset,
+    table: str,
+    old_values_to_new_values: t.Mapping[str, str],
+    status_update: t.Optional[str],
+    smush: bool = False,
+    logger: cli.logging.Logger = cli.logger,
+) -> None:
+    """Change IDs in `table` and in all tables referencing it
+
+    Every affected table is rewritten once, in a single streaming pass.
+
+    """
+    if not smush:
+        c_id = ds[table, "id"].name
+        new_ids = [
+            old_values_to_new_values.get(row[c_id], row[c_id]) for row in ds[table]
+        ]
+        assert len(new_ids) == len(
+            set(new_ids)
+        ), f"Would collapse some rows of the {table} that were distinct before! Add '--smush' if that is intended."
+    substitute_ids(
+        ds,
+        {ds[table].url.string: old_values_to_new_values},
+        status_update=status_update,
+        merge=smush,
+        logger=logger,
+    )
+
+
+def replace_column(
+    dataset: pycldf.Dataset,
+    table: str,
+    original: str,
+    replacement: str,
+    column_replace: bool,
+    smush: bool,
+    status_update: t.Optional[str],
+    logger: cli.logging.Logger = cli.logger,
+) -> None:
+    # add Status_column if not existing and status update given
+    if status_update:
+        add_status_column_to_table(dataset=dataset, table_name=table)
+        dataset.write_metadata()
+
+    if column_replace:
+        assert (
+            original == "id" or original == dataset[table, "id"].name
+        ), f"Replacing an entire column is only meaningful when you change the #id column ({dataset[table, 'id'].name}) of the {table}."
+
+        c_id = dataset[table, original].name
+        c_new = dataset[table, replacement].name
+        mapping = {row[c_id]: row[c_new] for row in dataset[table]}
+    else:
+        mapping = {original: replacement}
+    rename(
+        dataset,
+        table,
+        mapping,
+        status_update=status_update,
+        smush=smush,
+        logger=logger,
+    )
+
+
+def parser(noun: str) -> argparse.ArgumentParser:
+    """Build the command line parser for renaming the IDs of `noun`s"""
+    parser = argparse.ArgumentParser(
+        description=f"Change the ID of a {noun} in the wordlist"
+    )
+    parser.add_argument(
+        "original",
+        type=str,
+        nargs="?",
+        help=f"The original {noun} ID, or with --column-replace, the name of the "
+        "original column to be replaced",
+    )
+    parser.add_argument(
+        "replacement",
+        type=str,
+        nargs="?",
+        help=f"The new {noun} ID, or with --column-replace, the name of the "
+        "replacement column",
+    )
+    parser.add_argument(
+        "--metadata",
+        type=Path,
+        default="Wordlist-metadata.json",
+        help="Path to the JSON metadata file describing the dataset (default: ./Wordlist-metadata.json)",
+    )
+    parser.add_argument("--column-replace", action="store_true", default=False)
+    parser.add_argument("--smush", action="store_true", default=False)
+    parser.add_argument(
+        "--mapping-file",
+        type=Path,
+        help=f"Rename many {noun}s at once, according to a CSV file with a header "
+        "row, the original IDs in the first and the new IDs in the second column",
+    )
+    parser.add_argument(
+        "--status-update",
+        type=str,
+        default="default",
+        help="Text written to Status_Column. Set to 'None' for no status update. "
+        "(default: Replaced column {original} by column {replacement}",
+    )
+    cli.add_log_controls(parser)
+    return parser
+
+
+def main(table: str, noun: str) -> None:
+    """Run the command line interface for renaming the IDs in `table`"""
+    rename_parser = parser(noun)
+    args = rename_parser.parse_args()
+    logger = cli.setup_logging(args)
+    if args.status_update == "None":
+        args.status_update = None
+    if args.status_update == "default":
+        if args.mapping_file:
+            args.status_update = f"Renamed according to {args.mapping_file}"
+        else:
+            args.status_update = (
+                f"Replaced column {args.original} by column {args.replacement}"
+            )
+
+    dataset = pycldf.Dataset.from_metadata(args.metadata)
+    if args.mapping_file:
+        if args.status_update:
+            add_status_column_to_table(dataset=dataset, table_name=table)
+            dataset.write_metadata()
+        rename(
+            dataset,
+            table,
+            read_id_mapping(args.mapping_file),
+            status_update=args.status_update,
+            smush=args.smush,
+            logger=logger,
+        )
+    elif args.original is None or args.replacement is None:
+        rename_parser.error(
+            "Either give original and replacement, or a --mapping-file."
+        )
+    else:
+        replace_column(
+            dataset=dataset,
+            table=table,
+            original=args.original,
+            replacement=args.replacement,
+            column_replace=args.column_replace,
+            smush=args.smush,
+            status_update=args.status_update,
+            logger=logger,
+        )
@@ -1,5 +1,7 @@
+import sys
 from pathlib import Path
 import logging
+import contextlib
 import argparse
 import typing as t
 
@@ -41,3 +43,10 @@ def parser(description: str) -> argparse.ArgumentParser:
     )
     add_log_controls(parser)
     return parser
+
+
+def open_output(output_file: t.Optional[Path]) -> t.ContextManager[t.TextIO]:
+    """Open the output file for writing, or use stdout if there is none"""
+    if output_file is None:
+        return contextlib.nullcontext(sys.stdout)
+    return output_file.open("w", encoding="utf-8", newline="")
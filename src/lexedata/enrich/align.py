@@ -1,42 +1,488 @@
 """Automatically align morphemes within each cognateset
 
-If possible, align using existing lexstat scorer.
+Morphemes are aligned progressively, using Needleman–Wunsch alignments of
+their sound classes. If possible, align using existing lexstat scorer.
 
 """
 
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import itertools
 import typing as t
 from pathlib import Path
+import concurrent.futures
 
 import pycldf
+import lingpy
+from lingpy.util import charstring
+from lingpy.settings import rcParams
+from lingpy.sequence.sound_classes import token2class, prosodic_string
 
 from lexedata.enrich.add_status_column import add_status_column_to_table
 from lexedata import cli
+from lexedata.util import parse_segment_slices
 
+# An alignment path: Pairs of indices into the two aligned sequences, with
+# None marking a gap.
+AlignmentPath = t.List[t.Tuple[t.Optional[int], t.Optional[int]]]
+# A profile: The indices of the sequences it contains, and for each of them
+# the positions of their segments in the columns of the profile.
+Profile = t.Tuple[t.List[int], t.List[t.List[t.Optional[int]]]]
 
-def align(forms):
-    """‘Align’ forms by adding gap characters to the end.
 
-    TODO: This is DUMB. Write a function that does this more sensibly, using
-    LexStat scorers where available.
+class SoundClassScorer:
+    """Score pairs of segments by their sound classes
+
+    The sound classes and the scoring matrix come from a lingpy sound class
+    model, by default SCA.
+
+    >>> scorer = SoundClassScorer()
+    >>> scorer.characters("ache", ("t", "a", "k"))
+    ('T', 'A', 'K')
+    >>> scorer("T", "T") > scorer("T", "K") > scorer("T", "A")
+    True
 
     """
-    length = 0
-    for (language, segments), metadata in forms:
-        length = max(len(segments), length)
 
-    for (language, segments), metadata in forms:
-        yield segments + ["-"] * (length - len(segments)), metadata
+    def __init__(self, model: str = "sca"):
+        self.model = lingpy.data.model.Model(model)
 
+    def characters(self, language: str, segments: t.Sequence[str]) -> t.Tuple[str, ...]:
+        """Convert a segment sequence into the characters compared by the scorer"""
+        return tuple(token2class(segment, self.model) for segment in segments)
 
-def aligne_cognate_table(
-    dataset: pycldf.Dataset, status_update: t.Optional[str] = None
-):
+    def __call__(self, a: str, b: str) -> float:
+        return self.model.scorer[a, b]
+
+
+class LexStatScorer(SoundClassScorer):
+    """Score pairs of segments using language-specific LexStat scores
+
+    The LexStat analysis must contain a scorer, such as the lexstats-*.tsv files
+    written by `lexedata.enrich.cognate_code_data`. Segment pairs the LexStat
+    scorer does not know, for example from languages missing in the LexStat
+    analysis, are scored by their sound classes instead.
+
+    """
+
+    def __init__(self, lexstat: lingpy.compare.lexstat.LexStat):
+        self.model = lexstat.model
+        self.scorer = lexstat.cscorer
+        self.known = set(lexstat.cscorer.chars2int)
+        self.languages = {
+            language: str(i) for i, language in enumerate(lexstat.cols, 1)
+        }
+        self.transform = getattr(lexstat, "_transform", rcParams["lexstat_transform"])
+
+    def characters(self, language: str, segments: t.Sequence[str]) -> t.Tuple[str, ...]:
+        classes = super().characters(language, segments)
+        if language not in self.languages or not segments:
+            return classes
+        return tuple(
+            charstring(self.languages[language], c, self.transform[p])
+            for c, p in zip(classes, prosodic_string(segments))
+        )
+
+    def __call__(self, a: str, b: str) -> float:
+        if a in self.known and b in self.known:
+            return self.scorer[a, b]
+        # Compare the bare sound classes of 'language.class.prosody' triples
+        return self.model.scorer[
+            a.split(".")[1] if "." in a else a, b.split(".")[1] if "." in b else b
+        ]
+
+
+def needleman_wunsch(
+    m: int,
+    n: int,
+    score: t.Callable[[int, int], float],
+    gap_a: t.Callable[[int], float],
+    gap_b: t.Callable[[int], float],
+) -> t.Tuple[float, AlignmentPath]:
+    """Globally align two sequences of length m and n
+
+    `score(i, j)` is the score of aligning the i-th element of the first
+    sequence with the j-th element of the second one, `gap_a(i)` the score of
+    aligning the i-th element of the first sequence with a gap, and `gap_b(j)`
+    the same for the second sequence. Return the optimal score and alignment
+    path. Ties are resolved in favour of matches, then gaps in the second
+    sequence.
+
+    >>> a, b = "kata", "kta"
+    >>> needleman_wunsch(
+    ...     len(a), len(b),
+    ...     lambda i, j: 1 if a[i] == b[j] else -1,
+    ...     lambda i: -1,
+    ...     lambda j: -1)
+    (2.0, [(0, 0), (1, None), (2, 1), (3, 2)])
+
+    """
+    matrix = [[0.0] * (n + 1) for _ in range(m + 1)]
+    trace = [[0] * (n + 1) for _ in range(m + 1)]
+    for i in range(1, m + 1):
+        matrix[i][0] = matrix[i - 1][0] + gap_a(i - 1)
+        trace[i][0] = 1
+    for j in range(1, n + 1):
+        matrix[0][j] = matrix[0][j - 1] + gap_b(j - 1)
+        trace[0][j] = 2
+    gaps_b = [gap_b(j) for j in range(n)]
+    for i in range(1, m + 1):
+        row, previous = matrix[i], matrix[i - 1]
+        gap_i = gap_a(i - 1)
+        for j in range(1, n + 1):
+            best = previous[j - 1] + score(i - 1, j - 1)
+            step = 0
+            candidate = previous[j] + gap_i
+            if candidate > best:
+                best, step = candidate, 1
+            candidate = row[j - 1] + gaps_b[j - 1]
+            if candidate > best:
+                best, step = candidate, 2
+            row[j] = best
+            trace[i][j] = step
+
+    path: AlignmentPath = []
+    i, j = m, n
+    while i > 0 or j > 0:
+        step = trace[i][j]
+        if step == 0:
+            i, j = i - 1, j - 1
+            path.append((i, j))
+        elif step == 1:
+            i -= 1
+            path.append((i, None))
+        else:
+            j -= 1
+            path.append((None, j))
+    path.reverse()
+    return matrix[m][n], path
+
+
+class Aligner:
+    """Progressive multiple alignment of segment sequences
+
+    Pairwise alignments are cached by the character sequences they align, so
+    that morphemes recurring in several cognatesets are aligned only once.
+
+    >>> aligner = Aligner()
+    >>> for alignment in aligner.align([
+    ...         ("a", ["k", "a", "t", "a"]),
+    ...         ("b", ["k", "t", "a"]),
+    ...         ("c", ["g", "a", "d", "a"])]):
+    ...     print(" ".join(alignment))
+    k a t a
+    k - t a
+    g a d a
+
+    """
+
+    def __init__(self, scorer: t.Optional[SoundClassScorer] = None, gap: float = -2.0):
+        self.scorer = SoundClassScorer() if scorer is None else scorer
+        self.gap = gap
+        self.pairwise_cache: t.Dict[
+            t.Tuple[t.Tuple[str, ...], t.Tuple[str, ...]],
+            t.Tuple[float, AlignmentPath],
+        ] = {}
+
+    def pairwise(
+        self, a: t.Tuple[str, ...], b: t.Tuple[str, ...]
+    ) -> t.Tuple[float, AlignmentPath]:
+        """Align two character sequences, using the cache"""
+        try:
+            return self.pairwise_cache[a, b]
+        except KeyError:
+            pass
+        scorer = self.scorer
+        result = needleman_wunsch(
+            len(a),
+            len(b),
+            lambda i, j: scorer(a[i], b[j]),
+            lambda i: self.gap,
+            lambda j: self.gap,
+        )
+        self.pairwise_cache[a, b] = result
+        return result
+
+    def distance(self, a: t.Tuple[str, ...], b: t.Tuple[str, ...]) -> float:
+        """The SCA distance of two character sequences"""
+        self_scores = sum(self.scorer(x, x) for x in a) + sum(
+            self.scorer(y, y) for y in b
+        )
+        if self_scores <= 0:
+            return 0.0 if a == b else 1.0
+        return 1 - 2 * self.pairwise(a, b)[0] / self_scores
+
+    def align_profiles(
+        self,
+        sequences: t.Sequence[t.Tuple[str, ...]],
+        a: Profile,
+        b: Profile,
+    ) -> Profile:
+        """Align two profiles of already aligned sequences
+
+        Columns are scored by the average score of all pairs of characters,
+        where a character against a gap scores the gap penalty, and a gap
+        against a gap scores 0.
+
+        """
+        members_a, rows_a = a
+        members_b, rows_b = b
+        if len(members_a) == 1 and len(members_b) == 1:
+            _, path = self.pairwise(sequences[members_a[0]], sequences[members_b[0]])
+        else:
+
+            def columns(members, rows):
+                length = len(rows[0]) if rows else 0
+                return [
+                    [
+                        sequences[s][row[c]]
+                        for s, row in zip(members, rows)
+                        if row[c] is not None
+                    ]
+                    for c in range(length)
+                ]
+
+            columns_a = columns(members_a, rows_a)
+            columns_b = columns(members_b, rows_b)
+            size = len(members_a) * len(members_b)
+            scorer = self.scorer
+
+            def score(i: int, j: int) -> float:
+                col_a, col_b = columns_a[i], columns_b[j]
+                matches = sum(scorer(x, y) for x in col_a for y in col_b)
+                gaps = len(col_a) * (len(members_b) - len(col_b)) + len(col_b) * (
+                    len(members_a) - len(col_a)
+                )
+                return (matches + self.gap * gaps) / size
+
+            _, path = needleman_wunsch(
+                len(columns_a),
+                len(columns_b),
+                score,
+                lambda i: self.gap * len(columns_a[i]) / len(members_a),
+                lambda j: self.gap * len(columns_b[j]) / len(members_b),
+            )
+
+        rows: t.List[t.List[t.Optional[int]]] = [
+            [None if i is None else row[i] for i, _ in path] for row in rows_a
+        ] + [[None if j is None else row[j] for _, j in path] for row in rows_b]
+        return members_a + members_b, rows
+
+    def align(
+        self, sequences: t.Sequence[t.Tuple[str, t.Sequence[str]]]
+    ) -> t.List[t.List[str]]:
+        """Align segment sequences, given with their languages
+
+        Build a UPGMA guide tree from the pairwise distances of the sequences,
+        and progressively align the profiles along that tree. Return the
+        aligned segments, with '-' for gaps, in the order of the input.
+
+        """
+        characters = [
+            self.scorer.characters(language, segments)
+            for language, segments in sequences
+        ]
+        clusters: t.Dict[int, t.Tuple[Profile, int]] = {
+            s: (([s], [list(range(len(c)))]), 1) for s, c in enumerate(characters)
+        }
+        distances = {
+            (s1, s2): self.distance(characters[s1], characters[s2])
+            for s1 in clusters
+            for s2 in clusters
+            if s1 < s2
+        }
+        next_cluster = len(characters)
+        while len(clusters) > 1:
+            c1, c2 = min(distances, key=lambda pair: (distances[pair], pair))
+            (profile1, size1), (profile2, size2) = clusters.pop(c1), clusters.pop(c2)
+            for other in clusters:
+                d1 = distances.pop((min(c1, other), max(c1, other)))
+                d2 = distances.pop((min(c2, other), max(c2, other)))
+                distances[other, next_cluster] = (d1 * size1 + d2 * size2) / (
+                    size1 + size2
+                )
+            del distances[c1, c2]
+            clusters[next_cluster] = (
+                self.align_profiles(characters, profile1, profile2),
+                size1 + size2,
+            )
+            next_cluster += 1
+
+        if not clusters:
+            return []
+        ((members, rows), _), *_ = clusters.values()
+        alignments: t.List[t.List[str]] = [[] for _ in sequences]
+        for s, row in zip(members, rows):
+            segments = sequences[s][1]
+            alignments[s] = ["-" if i is None else segments[i] for i in row]
+        return alignments
+
+
+def align(
+    forms: t.Sequence[t.Tuple[t.Tuple[str, t.Sequence[str]], t.Any]],
+    aligner: t.Optional[Aligner] = None,
+) -> t.Iterable[t.Tuple[t.List[str], t.Any]]:
+    """Align the morphemes of one cognateset
+
+    `forms` contains pairs of (language, segments) and some metadata, which is
+    passed through with the corresponding alignment.
+
+    """
+    if aligner is None:
+        aligner = Aligner()
+    alignments = aligner.align([morpheme for morpheme, metadata in forms])
+    for alignment, (morpheme, metadata) in zip(alignments, forms):
+        yield alignment, metadata
+
+
+# The aligner used by the worker processes, which keeps its pairwise cache
+# across all cognatesets a worker aligns. It is set by the pool initializer.
+_aligner: t.Optional[Aligner] = None
+
+
+def _set_aligner(aligner: Aligner) -> None:
+    global _aligner
+    _aligner = aligner
+
+
+def _align_cognateset(
+    morphemes: t.Sequence[t.Tuple[t.Tuple[str, t.Sequence[str]], t.Any]]
+) -> t.List[t.Tuple[t.List[str], t.Any]]:
+    return list(align(morphemes, _aligner))
+
+
+Morphemes = t.Sequence[t.Tuple[t.Tuple[str, t.Sequence[str]], t.Any]]
+
+
+def align_cognatesets(
+    cognatesets: t.Union[
+        t.Mapping[t.Any, Morphemes], t.Iterable[t.Tuple[t.Any, Morphemes]]
+    ],
+    aligner: t.Optional[Aligner] = None,
+    jobs: int = 1,
+) -> t.Iterable[t.Tuple[t.Any, t.List[t.Tuple[t.List[str], t.Any]]]]:
+    """Align the morphemes of many cognatesets, possibly in parallel
+
+    `cognatesets` is a mapping from cognateset IDs to their morphemes, or an
+    iterable of such pairs, which is consumed lazily. With more than one job,
+    the cognatesets are aligned in a pool of worker processes, each with its
+    own copy of the aligner, a bounded number of cognatesets at a time. Yield
+    the cognateset IDs with their alignments, in the order of `cognatesets`.
+
+    """
+    if aligner is None:
+        aligner = Aligner()
+    if isinstance(cognatesets, t.Mapping):
+        cognatesets = cognatesets.items()
+    if jobs > 1:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, initializer=_set_aligner, initargs=(aligner,)
+        ) as pool:
+            cognatesets = iter(cognatesets)
+            while True:
+                batch = list(itertools.islice(cognatesets, 64 * jobs))
+                if not batch:
+                    break
+                yield from zip(
+                    [cognateset for cognateset, _ in batch],
+                    pool.map(
+                        _align_cognateset,
+                        [morphemes for _, morphemes in batch],
+                        chunksize=16,
+                    ),
+                )
+    else:
+        for cognateset, morphemes in cognatesets:
+            yield cognateset, list(align(morphemes, aligner))
+
+
+def benchmark(
+    cognatesets: t.Mapping[t.Any, Morphemes],
+    aligner: t.Optional[Aligner] = None,
+    jobs: int = 1,
+    logger: cli.logging.Logger = cli.logger,
+) -> t.Dict[str, float]:
+    """Compare the alignment throughput with lingpy's progressive Alignments
+
+    Return the number of cognatesets aligned per second by lexedata and by
+    lingpy. Empty morphemes are left out, because lingpy cannot align them.
+
+    """
+    cognatesets = {
+        cognateset: [m for m in morphemes if m[0][1]]
+        for cognateset, morphemes in cognatesets.items()
+    }
+    cognatesets = {c: m for c, m in cognatesets.items() if m}
+
+    start = time.perf_counter()
+    for _ in align_cognatesets(cognatesets, aligner, jobs=jobs):
+        pass
+    lexedata_time = time.perf_counter() - start
+
+    wordlist: t.Dict[int, t.List[t.Any]] = {
+        0: ["doculect", "concept", "ipa", "tokens", "cogid"]
+    }
+    for c, (cognateset, morphemes) in enumerate(cognatesets.items(), 1):
+        for (language, segments), _ in morphemes:
+            wordlist[len(wordlist)] = [
+                language,
+                str(cognateset),
+                "".join(segments),
+                list(segments),
+                c,
+            ]
+    start = time.perf_counter()
+    alignments = lingpy.Alignments(wordlist, ref="cogid")
+    alignments.align(method="progressive")
+    lingpy_time = time.perf_counter() - start
+
+    throughput = {
+        "lexedata": len(cognatesets) / lexedata_time,
+        "lingpy": len(cognatesets) / lingpy_time,
+    }
+    for name, rate in throughput.items():
+        logger.info(f"{name}: {rate:.1f} cognatesets per second")
+    return throughput
+
+
+def morpheme_segments(
+    segments: t.Sequence[str], slices: t.Optional[t.Sequence[str]]
+) -> t.List[str]:
+    """Select the segments of a morpheme from the segments of its form
+
+    Segment slices are 1-based and inclusive, as in CLDF.
+
+    >>> morpheme_segments(["t", "a", "k", "a"], ["2:3"])
+    ['a', 'k']
+    >>> morpheme_segments(["t", "a", "k", "a"], ["1:1", "4:4"])
+    ['t', 'a']
+    >>> morpheme_segments(["t", "a", "k", "a"], [])
+    ['t', 'a', 'k', 'a']
+
+    """
+    if not slices:
+        return list(segments or [])
+    return [segments[i] for i in parse_segment_slices(slices)]
+
+
+def read_cognatesets(
+    dataset: pycldf.Dataset,
+) -> t.Tuple[
+    t.Dict[str, t.List[t.Tuple[t.Tuple[str, t.List[str]], str]]],
+    t.Dict[str, t.Dict[str, t.Any]],
+]:
+    """Collect the morphemes of each cognateset, and all cognate judgements
+
+    Return a mapping from cognateset IDs to lists of ((language, segments),
+    judgement ID), and a mapping of judgement IDs to judgements.
+
+    """
     f_id = dataset["FormTable", "id"].name
     f_segments = dataset["FormTable", "segments"].name
     f_language = dataset["FormTable", "languageReference"].name
-    # add Status_Column if not existing
-    if status_update:
-        add_status_column_to_table(dataset=dataset, table_name="CognateTable")
 
     forms = {}
     for form in cli.tq(dataset["FormTable"]):
@@ -47,36 +493,145 @@ def aligne_cognate_table(
     c_cognateset_id = dataset["CognateTable", "cognatesetReference"].name
     # TODO: how dos CognateTable get a segmentSlice column?
     c_slice = dataset["CognateTable", "segmentSlice"].name
-    c_alignment = dataset["CognateTable", "alignment"].name
 
-    cognatesets: t.Dict[str, t.List[t.Tuple[str, str, str, t.List[str]]]] = {}
+    cognatesets: t.Dict[str, t.List[t.Tuple[t.Tuple[str, t.List[str]], str]]] = {}
     judgements: t.Dict[str, t.Dict[str, t.Any]] = {}
     for judgement in dataset["CognateTable"]:
         judgements[judgement[c_id]] = judgement
         form = forms[judgement[c_form_id]]
-        morpheme = []
-        if not judgement[c_slice]:
-            morpheme = form[f_segments]
-        for s in judgement[c_slice]:
-            if ":" in s:
-                i_, j_ = s.split(":")
-                i, j = int(i_), int(j_)
-            else:
-                i = int(s)
-                j = i + 1
-            morpheme.extend(form[f_segments][slice(i, j)])
+        morpheme = morpheme_segments(form[f_segments], judgement[c_slice])
         cognatesets.setdefault(judgement[c_cognateset_id], []).append(
             ((form[f_language], morpheme), judgement[c_id])
         )
+    return cognatesets, judgements
+
+
+def aligne_cognate_table(
+    dataset: pycldf.Dataset,
+    status_update: t.Optional[str] = None,
+    aligner: t.Optional[Aligner] = None,
+    jobs: int = 1,
+):
+    # add Status_Column if not existing
+    if status_update:
+        add_status_column_to_table(dataset=dataset, table_name="CognateTable")
+
+    c_alignment = dataset["CognateTable", "alignment"].name
+    cognatesets, judgements = read_cognatesets(dataset)
 
-    for cognateset, morphemes in cognatesets.items():
-        for alignment, id in align(morphemes):
+    for cognateset, alignments in align_cognatesets(cognatesets, aligner, jobs=jobs):
+        for alignment, id in alignments:
             judgements[id][c_alignment] = alignment
             if status_update:
-                judgement["Status_Column"] = status_update
+                judgements[id]["Status_Column"] = status_update
     dataset["CognateTable"].write(judgements.values())
 
 
+def aligne_cognate_table_streaming(
+    dataset: pycldf.Dataset,
+    status_update: t.Optional[str] = None,
+    aligner: t.Optional[Aligner] = None,
+    jobs: int = 1,
+):
+    """Align the cognate table without loading it into memory
+
+    Index the segments of all forms and the cognate judgements in a temporary
+    SQLite database, let it sort the judgements by cognateset on disk, and
+    align one cognateset after the other. Then stream the cognate table once
+    more, adding the alignments. Only the morphemes of the cognatesets being
+    aligned are held in memory. Rows stay in the order of the cognate table.
+
+    """
+    if status_update:
+        add_status_column_to_table(dataset=dataset, table_name="CognateTable")
+
+    f_id = dataset["FormTable", "id"].name
+    f_segments = dataset["FormTable", "segments"].name
+    f_language = dataset["FormTable", "languageReference"].name
+    c_form_id = dataset["CognateTable", "formReference"].name
+    c_cognateset_id = dataset["CognateTable", "cognatesetReference"].name
+    c_slice = dataset["CognateTable", "segmentSlice"].name
+    c_alignment = dataset["CognateTable", "alignment"].name
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = sqlite3.connect(str(Path(tmp) / "alignments.sqlite"))
+        db.execute("PRAGMA temp_store = FILE")
+        db.execute(
+            "CREATE TABLE forms (id TEXT PRIMARY KEY, language TEXT, segments TEXT)"
+        )
+        db.executemany(
+            "INSERT INTO forms VALUES (?, ?, ?)",
+            (
+                (form[f_id], form[f_language], json.dumps(form[f_segments] or []))
+                for form in cli.tq(dataset["FormTable"])
+            ),
+        )
+        db.execute(
+            "CREATE TABLE judgements "
+            "(row INTEGER PRIMARY KEY, cognateset TEXT, form TEXT, slices TEXT)"
+        )
+        db.executemany(
+            "INSERT INTO judgements VALUES (?, ?, ?, ?)",
+            (
+                (
+                    r,
+                    judgement[c_cognateset_id],
+                    judgement[c_form_id],
+                    json.dumps(judgement[c_slice] or []),
+                )
+                for r, judgement in enumerate(dataset["CognateTable"])
+            ),
+        )
+        db.execute("CREATE TABLE alignments (row INTEGER PRIMARY KEY, alignment TEXT)")
+        db.commit()
+
+        def cognatesets() -> t.Iterator[t.Tuple[str, Morphemes]]:
+            judgements = db.execute(
+                "SELECT j.cognateset, j.row, j.form, f.language, f.segments, j.slices "
+                "FROM judgements j LEFT JOIN forms f ON j.form = f.id "
+                "ORDER BY j.cognateset, j.row"
+            )
+            for cognateset, rows in itertools.groupby(judgements, lambda r: r[0]):
+                morphemes = []
+                for _, r, form, language, segments, slices in rows:
+                    if language is None:
+                        raise KeyError(form)
+                    morpheme = morpheme_segments(
+                        json.loads(segments), json.loads(slices)
+                    )
+                    morphemes.append(((language, morpheme), r))
+                yield cognateset, morphemes
+
+        for cognateset, alignments in align_cognatesets(
+            cognatesets(), aligner, jobs=jobs
+        ):
+            db.executemany(
+                "INSERT INTO alignments VALUES (?, ?)",
+                ((r, json.dumps(alignment)) for alignment, r in alignments),
+            )
+        db.commit()
+
+        def aligned_judgements() -> t.Iterator[t.Dict[str, t.Any]]:
+            alignments = db.execute(
+                "SELECT row, alignment FROM alignments ORDER BY row"
+            )
+            aligned = next(alignments, None)
+            for r, judgement in enumerate(dataset["CognateTable"]):
+                if aligned is not None and aligned[0] == r:
+                    judgement[c_alignment] = json.loads(aligned[1])
+                    if status_update:
+                        judgement["Status_Column"] = status_update
+                    aligned = next(alignments, None)
+                yield judgement
+
+        table = dataset["CognateTable"]
+        fname = Path(table.url.resolve(table.base))
+        tmp_fname = fname.with_name(fname.name + ".tmp")
+        table.write(aligned_judgements(), fname=tmp_fname)
+        db.close()
+    os.replace(tmp_fname, fname)
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -94,9 +649,51 @@ if __name__ == "__main__":
         help="Text written to Status_Column. Set to 'None' for no status update. "
         "(default: Morphemes aligned)",
     )
+    parser.add_argument(
+        "--lexstat",
+        type=Path,
+        default=None,
+        help="Score segments using the LexStat scorer in this file, such as the "
+        "lexstats-*.tsv files written by lexedata.enrich.cognate_code_data "
+        "(default: use SCA sound class scores)",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Align cognatesets in this many parallel processes (default: 1)",
+    )
+    parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        default=False,
+        help="Sort the cognate judgements on disk and align one cognateset at a time, "
+        "instead of loading the whole dataset into memory",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        default=False,
+        help="Instead of writing the alignments, compare the alignment speed with lingpy's",
+    )
+    cli.add_log_controls(parser)
     args = parser.parse_args()
+    logger = cli.setup_logging(args)
     if args.status_update == "None":
         args.status_update = None
-    aligne_cognate_table(
-        pycldf.Wordlist.from_metadata(args.metadata), args.status_update
-    )
+    if args.lexstat is None:
+        aligner = Aligner()
+    else:
+        aligner = Aligner(
+            LexStatScorer(lingpy.compare.lexstat.LexStat(str(args.lexstat)))
+        )
+    dataset = pycldf.Wordlist.from_metadata(args.metadata)
+    if args.benchmark:
+        benchmark(read_cognatesets(dataset)[0], aligner, jobs=args.jobs, logger=logger)
+    elif args.low_memory:
+        aligne_cognate_table_streaming(
+            dataset, args.status_update, aligner, jobs=args.jobs
+        )
+    else:
+        aligne_cognate_table(dataset, args.status_update, aligner, jobs=args.jobs)
@@ -9,15 +9,12 @@ from pathlib import Path
 import pycldf
 import pyclts
 import segments
-import cldfbench
-import cldfcatalog
 
 import lingpy
 import lingpy.compare.partial
 
-clts_path = cldfcatalog.Config.from_file().get_clone("clts")
-clts = cldfbench.catalogs.CLTS(clts_path)
-bipa = clts.api.bipa
+from lexedata.util import get_bipa
+
 
 tokenizer = segments.Tokenizer()
 
@@ -39,6 +36,7 @@ def clean_segments(segment_string: t.List[str]) -> t.Iterable[pyclts.models.Symb
     ['t', 'a', '+', 'a', 't']
 
     """
+    bipa = get_bipa()
     segments = [bipa[x] for x in segment_string]
     segments.insert(0, bipa["#"])
     segments.append(bipa["#"])
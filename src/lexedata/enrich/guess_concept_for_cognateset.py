@@ -1,6 +1,8 @@
+import time
 import typing as t
 import collections
 from pathlib import Path
+import concurrent.futures
 
 from csvw.metadata import URITemplate
 import pycldf
@@ -45,10 +47,71 @@ def concepts_to_concepticon(dataset: pycldf.Wordlist) -> t.Mapping[ConceptID, in
     return concept_to_concepticon
 
 
+class CentralityCache:
+    """Betweenness centralities of CLICS subgraphs, cached per set of nodes
+
+    The same sets of concepts recur in many cognatesets, so the centralities
+    of the subgraph induced by each set of Concepticon IDs are kept in a cache
+    of at most `maxsize` entries, evicting the least recently used. For
+    subgraphs with more than `sample` nodes, betweenness is approximated using
+    `sample` randomly chosen (but reproducible) source nodes.
+
+    >>> clics = networkx.Graph([("1", "2"), ("2", "3"), ("3", "4")])
+    >>> centralities = CentralityCache(clics, maxsize=2)
+    >>> centralities(frozenset({"1", "2", "3"}))
+    {'1': 0.0, '2': 1.0, '3': 0.0}
+    >>> len(centralities.cache)
+    1
+
+    """
+
+    def __init__(
+        self,
+        clics: networkx.Graph,
+        maxsize: int = 2 ** 16,
+        sample: t.Optional[int] = None,
+    ):
+        self.clics = clics
+        self.maxsize = maxsize
+        self.sample = sample
+        self.cache: t.OrderedDict[
+            t.FrozenSet[str], t.Mapping[str, float]
+        ] = collections.OrderedDict()
+
+    def __call__(self, nodes: t.FrozenSet[str]) -> t.Mapping[str, float]:
+        try:
+            centralities = self.cache[nodes]
+            self.cache.move_to_end(nodes)
+            return centralities
+        except KeyError:
+            pass
+        subgraph = self.clics.subgraph(nodes)
+        if self.sample is not None and len(subgraph) > self.sample:
+            centralities = networkx.algorithms.centrality.betweenness_centrality(
+                subgraph, k=self.sample, seed=0
+            )
+        else:
+            centralities = networkx.algorithms.centrality.betweenness_centrality(
+                subgraph
+            )
+        self.cache[nodes] = centralities
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return centralities
+
+
+def concepticon_nodes(
+    concepts: t.Iterable[ConceptID],
+    concepts_to_concepticon: t.Mapping[ConceptID, int],
+) -> t.FrozenSet[str]:
+    """The CLICS nodes of the concepts that are linked to Concepticon"""
+    return frozenset(str(concepts_to_concepticon.get(c)) for c in concepts) - {"None"}
+
+
 def central_concept(
     concepts: t.Counter[ConceptID],
     concepts_to_concepticon: t.Mapping[ConceptID, int],
-    clics: t.Optional[networkx.Graph],
+    clics: t.Optional[t.Union[networkx.Graph, CentralityCache]],
 ):
     """Find the most central concept among a weighted set.
 
@@ -77,20 +140,21 @@ def central_concept(
     centrality within the disjoint subgraphs is considered, so in this example,
     'hand' would be considered the most central concept.
 
+    Instead of the CLICS graph, a CentralityCache wrapping it can be passed,
+    to re-use the centralities of concept sets seen before.
+
     """
     centralities: t.Mapping[ConceptID, float]
     if clics is None:
         centralities = {}
     else:
+        if not isinstance(clics, CentralityCache):
+            clics = CentralityCache(clics, maxsize=0)
         # In the extreme case, there is one concept in CLICS and one concept
         # without CLICS connection. Then there is no path, and the centralities
         # are 0 – including `endpoints=True` in `betweenness_centrality` does
         # not help with that, either.
-        centralities = networkx.algorithms.centrality.betweenness_centrality(
-            clics.subgraph(
-                {str(concepts_to_concepticon.get(c)) for c in concepts} - {"None"}
-            )
-        )
+        centralities = clics(concepticon_nodes(concepts, concepts_to_concepticon))
 
     def effective_centrality(cc):
         concept, count = cc
@@ -109,6 +173,114 @@ def central_concept(
     return concept
 
 
+# The centrality cache and Concepticon mapping used by the worker processes
+_centralities: t.Optional[CentralityCache] = None
+_concepts_to_concepticon: t.Mapping[ConceptID, int] = {}
+
+
+def _share_centralities(
+    centralities: t.Optional[CentralityCache],
+    concepts_to_concepticon: t.Mapping[ConceptID, int],
+) -> None:
+    global _centralities, _concepts_to_concepticon
+    _centralities = centralities
+    _concepts_to_concepticon = concepts_to_concepticon
+
+
+def _central_concepts_of_chunk(
+    chunk: t.Sequence[t.Tuple[CognatesetID, t.Counter[ConceptID]]]
+) -> t.List[ConceptID]:
+    return [
+        central_concept(concepts, _concepts_to_concepticon, _centralities)
+        for cognateset, concepts in chunk
+    ]
+
+
+def central_concepts(
+    concepts_of_cognateset: t.Mapping[CognatesetID, t.Counter[ConceptID]],
+    concepts_to_concepticon: t.Mapping[ConceptID, int],
+    centralities: t.Optional[CentralityCache],
+    jobs: int = 1,
+) -> t.Dict[CognatesetID, ConceptID]:
+    """Find the central concept of every cognateset, possibly in parallel
+
+    With more than one job, the cognatesets are sorted by their sets of CLICS
+    nodes, so that cognatesets with the same concepts end up in the same chunk,
+    and the chunks are distributed over a pool of worker processes, each
+    with its own copy of the centrality cache.
+
+    """
+    if jobs <= 1 or len(concepts_of_cognateset) <= 1:
+        return {
+            cognateset: central_concept(concepts, concepts_to_concepticon, centralities)
+            for cognateset, concepts in concepts_of_cognateset.items()
+        }
+    ordered = sorted(
+        concepts_of_cognateset.items(),
+        key=lambda cc: sorted(concepticon_nodes(cc[1], concepts_to_concepticon)),
+    )
+    size = max(1, len(ordered) // (4 * jobs))
+    chunks = [ordered[i : i + size] for i in range(0, len(ordered), size)]
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_share_centralities,
+        initargs=(centralities, concepts_to_concepticon),
+    ) as pool:
+        central = {}
+        for chunk, concepts in zip(
+            chunks, pool.map(_central_concepts_of_chunk, chunks)
+        ):
+            central.update(
+                (cognateset, concept)
+                for (cognateset, _), concept in zip(chunk, concepts)
+            )
+    return {cognateset: central[cognateset] for cognateset in concepts_of_cognateset}
+
+
+def benchmark(
+    concepts_of_cognateset: t.Mapping[CognatesetID, t.Counter[ConceptID]],
+    concepts_to_concepticon: t.Mapping[ConceptID, int],
+    clics: networkx.Graph,
+    jobs: int = 1,
+    sample: t.Optional[int] = None,
+    logger: cli.logging.Logger = cli.logger,
+) -> t.Dict[str, float]:
+    """Time finding the central concepts without cache, with cache, and in parallel
+
+    Return the time taken in seconds by each method.
+
+    """
+    times = {}
+    start = time.perf_counter()
+    for concepts in concepts_of_cognateset.values():
+        central_concept(concepts, concepts_to_concepticon, clics)
+    times["uncached"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    central_concepts(
+        concepts_of_cognateset,
+        concepts_to_concepticon,
+        CentralityCache(clics, sample=sample),
+    )
+    times["cached"] = time.perf_counter() - start
+
+    if jobs > 1:
+        start = time.perf_counter()
+        central_concepts(
+            concepts_of_cognateset,
+            concepts_to_concepticon,
+            CentralityCache(clics, sample=sample),
+            jobs=jobs,
+        )
+        times[f"cached, {jobs} jobs"] = time.perf_counter() - start
+
+    for method, duration in times.items():
+        logger.info(
+            f"{method}: {len(concepts_of_cognateset)} cognatesets in {duration:.2f}s"
+        )
+    return times
+
+
 def reshape_dataset(
     dataset: pycldf.Wordlist, add_column: bool = True
 ) -> pycldf.Dataset:
@@ -126,9 +298,8 @@ def reshape_dataset(
             c.propertyUrl = URITemplate(
                 "http://cldf.clld.org/v1.0/terms.rdf#parameterReference"
             )
-            fname = dataset.write_metadata()
-            # Reload dataset with new column definitions
-            dataset = pycldf.Wordlist.from_metadata(fname)
+            # The new column definition is written out together with the
+            # CognatesetTable, instead of writing and reloading the metadata.
     return dataset
 
 
@@ -137,22 +308,24 @@ def connected_concepts(
 ) -> t.Mapping[CognatesetID, t.Counter[ConceptID]]:
     """For each cognate set it the data set, check which concepts it is connected to.
 
-    >>>
-    """
-    concepts_by_form = load_concepts_by_form(dataset)
-    cognatesets_to_concepts: t.DefaultDict[
-        CognatesetID, t.Sequence[ConceptID]
-    ] = t.DefaultDict(list)
+    This is a single-pass hash join: The FormTable is read once, remembering
+    the concepts of each form as small integers, and then every cognate
+    judgement directly updates the concept counter of its cognateset. If the
+    cognate judgements live in the FormTable, even the first step is not
+    necessary.
 
+    """
     # Check whether cognate judgements live in the FormTable …
     c_cognateset = dataset.column_names.forms.cognatesetReference
     c_form = dataset.column_names.forms.id
     table = dataset["FormTable"]
+    judgements_in_forms = True
     # … or in a separate CognateTable
     if c_cognateset is None:
         c_cognateset = dataset.column_names.cognates.cognatesetReference
         c_form = dataset.column_names.cognates.formReference
         table = dataset["CognateTable"]
+        judgements_in_forms = False
 
     if c_cognateset is None:
         raise ValueError(
@@ -160,16 +333,43 @@ def connected_concepts(
             " or a FormTable and is thus not compatible with this script."
         )
 
+    c_f_id = dataset.column_names.forms.id
+    c_f_concept = dataset.column_names.forms.parameterReference
+    index_of_concept: t.Dict[ConceptID, int] = {}
+
+    def concept_indices(form: t.Mapping[str, t.Any]) -> t.Tuple[int, ...]:
+        concept = form.get(c_f_concept, [])
+        return tuple(
+            index_of_concept.setdefault(c, len(index_of_concept))
+            for c in (concept if isinstance(concept, list) else [concept])
+        )
+
+    concepts_by_form: t.Dict[FormID, t.Tuple[int, ...]] = {}
+    if not judgements_in_forms:
+        for form in cli.tq(
+            dataset["FormTable"],
+            total=dataset["FormTable"].common_props.get("dc:extent"),
+        ):
+            concepts_by_form[form[c_f_id]] = concept_indices(form)
+
+    counts: t.DefaultDict[CognatesetID, t.Counter[int]] = collections.defaultdict(
+        collections.Counter
+    )
     for judgement in cli.tq(
         table,
         total=table.common_props.get("dc:extent"),
     ):
-        cognatesets_to_concepts[judgement[c_cognateset]].extend(
-            concepts_by_form[judgement[c_form]]
-        )
+        if judgements_in_forms:
+            counts[judgement[c_cognateset]].update(concept_indices(judgement))
+        else:
+            counts[judgement[c_cognateset]].update(concepts_by_form[judgement[c_form]])
+
+    concept_of_index = list(index_of_concept)
     return {
-        cogset: collections.Counter(concepts)
-        for cogset, concepts in cognatesets_to_concepts.items()
+        cogset: collections.Counter(
+            {concept_of_index[c]: n for c, n in counter.items()}
+        )
+        for cogset, counter in counts.items()
     }
 
 
@@ -177,7 +377,17 @@ def add_central_concepts_to_cognateset_table(
     dataset: pycldf.Dataset,
     add_column: bool = True,
     overwrite_existing: bool = True,
+    jobs: int = 1,
+    sample: t.Optional[int] = None,
 ) -> pycldf.Dataset:
+    dataset = reshape_dataset(dataset, add_column=add_column)
+    c_core_concept = dataset.column_names.cognatesets.parameterReference
+    if c_core_concept is None:
+        raise ValueError(
+            f"Dataset {dataset:} had no parameterReference column in a CognatesetTable"
+            " and is thus not compatible with this script."
+        )
+
     # create mapping cognateset to central concept
     try:
         clics: t.Optional[networkx.Graph] = load_clics()
@@ -186,23 +396,16 @@ def add_central_concepts_to_cognateset_table(
     concepts_of_cognateset: t.Mapping[
         CognatesetID, t.Counter[ConceptID]
     ] = connected_concepts(dataset)
-    central: t.MutableMapping[str, str] = {}
+    central: t.MutableMapping[str, str]
     if clics and dataset.column_names.parameters.concepticonReference:
-        concept_to_concepticon = concepts_to_concepticon(dataset)
-        for cognateset, concepts in concepts_of_cognateset.items():
-            central[cognateset] = central_concept(
-                concepts, concept_to_concepticon, clics
-            )
-    else:
-        for cognateset, concepts in concepts_of_cognateset.items():
-            central[cognateset] = central_concept(concepts, {}, None)
-    dataset = reshape_dataset(dataset, add_column=add_column)
-    c_core_concept = dataset.column_names.cognatesets.parameterReference
-    if c_core_concept is None:
-        raise ValueError(
-            f"Dataset {dataset:} had no parameterReference column in a CognatesetTable"
-            " and is thus not compatible with this script."
+        central = central_concepts(
+            concepts_of_cognateset,
+            concepts_to_concepticon(dataset),
+            CentralityCache(clics, sample=sample),
+            jobs=jobs,
         )
+    else:
+        central = central_concepts(concepts_of_cognateset, {}, None)
 
     # write cognatesets with central concepts
     write_back = []
@@ -252,11 +455,45 @@ if __name__ == "__main__":
         default=False,
         help="Overwrite #parameterReference values of cognate sets already given in the dataset",
     )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Process cognatesets in this many parallel processes (default: 1)",
+    )
+    parser.add_argument(
+        "--sample",
+        type=int,
+        default=None,
+        help="Approximate the betweenness centrality of concept sets with more than "
+        "SAMPLE concepts, using SAMPLE source concepts (default: compute it exactly)",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        default=False,
+        help="Instead of writing central concepts, time finding them with and without caching",
+    )
+    cli.add_log_controls(parser)
     args = parser.parse_args()
+    logger = cli.setup_logging(args)
     dataset = pycldf.Wordlist.from_metadata(args.metadata)
 
-    add_central_concepts_to_cognateset_table(
-        dataset,
-        add_column=args.add_column,
-        overwrite_existing=args.overwrite,
-    )
+    if args.benchmark:
+        benchmark(
+            connected_concepts(dataset),
+            concepts_to_concepticon(dataset),
+            load_clics(),
+            jobs=args.jobs,
+            sample=args.sample,
+            logger=logger,
+        )
+    else:
+        add_central_concepts_to_cognateset_table(
+            dataset,
+            add_column=args.add_column,
+            overwrite_existing=args.overwrite,
+            jobs=args.jobs,
+            sample=args.sample,
+        )
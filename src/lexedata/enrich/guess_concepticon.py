@@ -6,15 +6,11 @@ from pathlib import Path
 from csvw.metadata import URITemplate
 
 import pycldf
-import cldfcatalog
-import cldfbench
 from pyconcepticon.glosses import concept_map2
 
+from lexedata.util import get_catalog
 from lexedata.enrich.add_status_column import add_status_column_to_table
 
-concepticon_path = cldfcatalog.Config.from_file().get_clone("concepticon")
-concepticon = cldfbench.catalogs.Concepticon(concepticon_path)
-
 
 def equal_separated(option: str) -> t.Tuple[str, str]:
     column, language = option.split("=")
@@ -32,6 +28,7 @@ def add_concepticon_names(
     except ValueError:
         pass
 
+    concepticon = get_catalog("concepticon")
     write_back = []
     for row in dataset["ParameterTable"]:
         try:
@@ -79,7 +76,7 @@ def add_concepticon_references(
             glosses.append(row[column] or "?")  # Concepticon abhors empty glosses.
 
     targets = {
-        language: concepticon.api._get_map_for_language(language, None)
+        language: get_catalog("concepticon").api._get_map_for_language(language, None)
         for language in gloss_languages.values()
     }
 
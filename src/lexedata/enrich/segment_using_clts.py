@@ -1,20 +1,20 @@
+import re
+import copy
 import logging
 import argparse
+import functools
+import concurrent.futures
 import typing as t
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, Counter
 
 from csvw.metadata import URITemplate
 
 import pycldf
 import pyclts
 import segments
-import cldfbench
-import cldfcatalog
 
-clts_path = cldfcatalog.Config.from_file().get_clone("clts")
-clts = cldfbench.catalogs.CLTS(clts_path)
-bipa = clts.api.bipa
+from lexedata.util import get_bipa
 
 tokenizer = segments.Tokenizer()
 
@@ -42,10 +42,84 @@ pre_replace = {
     "t͡ç": "c͡ç",
 }
 
+Replacer = t.Callable[[str], t.Tuple[str, t.Counter[str]]]
+
+
+def compile_replacements(table: t.Mapping[str, str]) -> Replacer:
+    """Compile a replacement table into a function applying it in a single pass
+
+    The returned function replaces every occurrence of a key of the table by
+    its value, and counts how often each key was replaced. Where keys overlap,
+    the longest one wins; the result of a replacement is never replaced again.
+
+    >>> replace = compile_replacements({"ts": "t͡s", "t": "T", "ʃ": "S"})
+    >>> form, hits = replace("tsatʃa")
+    >>> form
+    't͡saTSa'
+    >>> sorted(hits.items())
+    [('t', 1), ('ts', 1), ('ʃ', 1)]
+    >>> compile_replacements({})("tsa")
+    ('tsa', Counter())
+
+    """
+    if not table:
+        return lambda string: (string, Counter())
+    pattern = re.compile(
+        "|".join(re.escape(wrong) for wrong in sorted(table, key=len, reverse=True))
+    )
+
+    def replace(string: str) -> t.Tuple[str, t.Counter[str]]:
+        hits: t.Counter[str] = Counter()
+
+        def substitute(match: t.Match[str]) -> str:
+            hits[match.group()] += 1
+            return table[match.group()]
+
+        return pattern.sub(substitute, string), hits
+
+    return replace
+
+
+def read_replacements(path: Path) -> t.Dict[str, str]:
+    """Read a replacement table from a file
+
+    The file contains one replacement per line, the string to be replaced and
+    its replacement separated by a tab. Empty lines are ignored.
+
+    """
+    table = {}
+    for line in path.open(encoding="utf-8"):
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            continue
+        try:
+            wrong, right = line.split("\t")
+        except ValueError:
+            raise ValueError(
+                f"Line '{line}' in {path} is not of the form 'string<TAB>replacement'."
+            )
+        table[wrong] = right
+    return table
+
+
+# A problem found during segmentation: The warning message (without context),
+# and, if it is to be reported, the reported sound and the comment for it.
+SegmentationProblem = t.Tuple[str, t.Optional[str], t.Optional[str]]
+
+
+@functools.lru_cache(maxsize=2 ** 14)
+def sound(system, name: str) -> pyclts.models.Symbol:
+    """Look up a sound (by grapheme or feature description) in a transcription system
+
+    Lookups are cached, because forms consist mostly of the same few sounds.
+
+    """
+    return system[name]
+
 
 def segment_form(
     formstring: str,
-    system=bipa,
+    system=None,
     split_diphthongs: bool = True,
     context_for_warnings: str = "",
     report: t.Optional[t.Dict] = None,
@@ -64,17 +138,84 @@ def segment_form(
     pre-aspirated or pre-nasalized consonants showing up as post-aspirated
     resp. post-nasalized vowels, which BIPA does not accept).
 
-    >>> [str(x) for x in segment_form("iɾũndɨ")]
-    ['i', 'ɾ', 'ũ', 'n', 'd', 'ɨ']
-    >>> [str(x) for x in segment_form("mokõi")]
-    ['m', 'o', 'k', 'õ', 'i']
-    >>> segment_form("pan̥onoót͡síkoːʔú")  # doctest: +ELLIPSIS
+    The segmentation of each distinct form string is cached. Warnings and
+    entries in the `report` are produced again for every call, so they are the
+    same as without the cache.
+
+    >>> [str(x) for x in segment_form("iɾũndɨ")]
+    ['i', 'ɾ', 'ũ', 'n', 'd', 'ɨ']
+    >>> [str(x) for x in segment_form("mokõi")]
+    ['m', 'o', 'k', 'õ', 'i']
+    >>> segment_form("pan̥onoót͡síkoːʔú")  # doctest: +ELLIPSIS
     [<pyclts.models.Consonant: voiceless bilabial stop consonant>, <pyclts.models.Vowel: unrounded open front vowel>, <pyclts.models.Consonant: devoiced voiced alveolar nasal consonant>, <pyclts.models.Vowel: rounded close-mid back vowel>, <pyclts.models.Consonant: voiced alveolar nasal consonant>, <pyclts.models.Vowel: rounded close-mid back vowel>, <pyclts.models.Vowel: rounded close-mid back ... vowel>, <pyclts.models.Consonant: voiceless alveolar sibilant affricate consonant>, <pyclts.models.Vowel: unrounded close front ... vowel>, <pyclts.models.Consonant: voiceless velar stop consonant>, <pyclts.models.Vowel: long rounded close-mid back vowel>, <pyclts.models.Consonant: voiceless glottal stop consonant>, <pyclts.models.Vowel: rounded close back ... vowel>]
 
     """
+    if system is None:
+        system = get_bipa()
+    tokens, problems = _segment_form(formstring, system, split_diphthongs)
+    report_problems(problems, context_for_warnings, report)
+    return list(tokens)
+
+
+def report_problems(
+    problems: t.Iterable[SegmentationProblem],
+    context_for_warnings: str = "",
+    report: t.Optional[t.Dict] = None,
+) -> None:
+    """Log the problems found in segmenting a form, and add them to the report"""
+    for message, reported_sound, comment in problems:
+        logging.warning(f"{context_for_warnings}{message}")
+        if reported_sound is not None and report:
+            report[reported_sound]["count"] += 1
+            report[reported_sound]["comment"] = comment
+
+
+def _segment_to_strings(
+    formstring: str,
+) -> t.Tuple[t.List[str], t.Tuple[SegmentationProblem, ...]]:
+    tokens, problems = _segment_form(formstring, get_bipa(), True)
+    return [str(token) for token in tokens], problems
+
+
+def segment_forms(
+    formstrings: t.Sequence[str], jobs: int = 1
+) -> t.List[t.Tuple[t.List[str], t.Tuple[SegmentationProblem, ...]]]:
+    """Segment many forms using BIPA, possibly in parallel
+
+    Return the segments (as strings) and the segmentation problems of each
+    form, in the order of the input. Every distinct form string is segmented
+    only once. With more than one job, the distinct forms are segmented in a
+    pool of worker processes, each of which loads BIPA once.
+
+    """
+    distinct = list(dict.fromkeys(formstrings))
+    if jobs > 1 and len(distinct) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            segmented = list(
+                pool.map(
+                    _segment_to_strings,
+                    distinct,
+                    chunksize=max(1, len(distinct) // (4 * jobs)),
+                )
+            )
+    else:
+        segmented = [_segment_to_strings(form) for form in distinct]
+    by_form = dict(zip(distinct, segmented))
+    return [by_form[form] for form in formstrings]
+
+
+@functools.lru_cache(maxsize=2 ** 16)
+def _segment_form(
+    formstring: str,
+    system,
+    split_diphthongs: bool,
+) -> t.Tuple[t.Tuple[pyclts.models.Symbol, ...], t.Tuple[SegmentationProblem, ...]]:
+    """Segment the form, collecting the problems instead of reporting them"""
+    problems: t.List[SegmentationProblem] = []
+    bipa = get_bipa()
     # and with the syllable boundary marker '.', so we wrap it with special cases for those.
     raw_tokens = [
-        system[s]
+        sound(system, s)
         for s in tokenizer(
             formstring,
             ipa=True,
@@ -82,10 +223,8 @@ def segment_form(
     ]
     if system != bipa:
         if any(r.type == "unknownsound" for r in raw_tokens):
-            logging.warning(
-                f"{context_for_warnings}Unknown sound encountered in {formstring:}"
-            )
-        return raw_tokens
+            problems.append((f"Unknown sound encountered in {formstring:}", None, None))
+        return tuple(raw_tokens), tuple(problems)
     i = len(raw_tokens) - 1
     while i >= 0:
         if split_diphthongs and raw_tokens[i].type == "diphthong":
@@ -96,15 +235,16 @@ def segment_form(
             i -= 1
             continue
         if raw_tokens[i].source == "/":
-            if report:
-                report[str(raw_tokens[i])]["count"] += 1
-                report[str(raw_tokens[i])]["comment"] = "illegal symbol"
-            del raw_tokens[i]
-            logging.warning(
-                f"{context_for_warnings}Impossible sound '/' encountered in {formstring} – "
-                f"You cannot use CLTS extended normalization "
-                f"with this script. The slash was not taken over into the segments."
+            problems.append(
+                (
+                    f"Impossible sound '/' encountered in {formstring} – "
+                    f"You cannot use CLTS extended normalization "
+                    f"with this script. The slash was not taken over into the segments.",
+                    str(raw_tokens[i]),
+                    "illegal symbol",
+                )
             )
+            del raw_tokens[i]
             i -= 1
             continue
         grapheme = raw_tokens[i].grapheme
@@ -115,46 +255,51 @@ def segment_form(
         if grapheme == "ː":
             del raw_tokens[i]
             try:
-                raw_tokens[i - 1] = bipa["long " + raw_tokens[i - 1].name]
+                raw_tokens[i - 1] = sound(bipa, "long " + raw_tokens[i - 1].name)
             except TypeError:
+                # Don't modify a sound object that may be cached elsewhere.
+                raw_tokens[i - 1] = copy.copy(raw_tokens[i - 1])
                 raw_tokens[i - 1].grapheme += "ː"
             i -= 1
             continue
         if grapheme.endswith("ⁿ") or grapheme.endswith("ᵐ") or grapheme.endswith("ᵑ"):
             if raw_tokens[i + 1].preceding is not None:
-                logging.warning(
-                    f"{context_for_warnings}Unknown sound {raw_tokens[i]} encountered in {formstring}"
+                problems.append(
+                    (
+                        f"Unknown sound {raw_tokens[i]} encountered in {formstring}",
+                        str(raw_tokens[i]),
+                        "unknown pre-nasalization",
+                    )
                 )
-                if report:
-                    report[str(raw_tokens[i])]["count"] += 1
-                    report[str(raw_tokens[i])]["comment"] = "unknown pre-nasalization"
                 i -= 1
                 continue
-            raw_tokens[i + 1] = bipa["pre-nasalized " + raw_tokens[i + 1].name]
-            raw_tokens[i] = bipa[grapheme[:-1]]
+            raw_tokens[i + 1] = sound(bipa, "pre-nasalized " + raw_tokens[i + 1].name)
+            raw_tokens[i] = sound(bipa, grapheme[:-1])
             continue
         if grapheme.endswith("ʰ"):
             if raw_tokens[i + 1].preceding is not None:
-                logging.warning(
-                    f"{context_for_warnings}Unknown sound {raw_tokens[i]} encountered in {formstring}"
+                problems.append(
+                    (
+                        f"Unknown sound {raw_tokens[i]} encountered in {formstring}",
+                        str(raw_tokens[i]),
+                        "unknown pre-aspiration",
+                    )
                 )
-                if report:
-                    report[str(raw_tokens[i])]["count"] += 1
-                    report[str(raw_tokens[i])]["comment"] = "unknown pre-aspiration"
                 i -= 1
                 continue
-            raw_tokens[i + 1] = bipa["pre-aspirated " + raw_tokens[i + 1].name]
-            raw_tokens[i] = bipa[grapheme[:-1]]
+            raw_tokens[i + 1] = sound(bipa, "pre-aspirated " + raw_tokens[i + 1].name)
+            raw_tokens[i] = sound(bipa, grapheme[:-1])
             continue
-        logging.warning(
-            f"{context_for_warnings}Unknown sound {raw_tokens[i]} encountered in {formstring}"
+        problems.append(
+            (
+                f"Unknown sound {raw_tokens[i]} encountered in {formstring}",
+                str(raw_tokens[i]),
+                "unknown sound",
+            )
         )
-        if report:
-            report[str(raw_tokens[i])]["count"] += 1
-            report[str(raw_tokens[i])]["comment"] = "unknown sound"
         i -= 1
 
-    return raw_tokens
+    return tuple(raw_tokens), tuple(problems)
 
 
 def add_segments_to_dataset(
@@ -162,6 +307,8 @@ def add_segments_to_dataset(
     transcription: str,
     overwrite_existing: bool,
     replace_form: bool,
+    jobs: int = 1,
+    replacements: t.Mapping[str, str] = pre_replace,
 ):
     if dataset.column_names.forms.segments is None:
         # Create a Segments column in FormTable
@@ -171,38 +318,47 @@ def add_segments_to_dataset(
         c.propertyUrl = URITemplate("http://cldf.clld.org/v1.0/terms.rdf#segments")
         dataset.write_metadata()
 
-    write_back = []
     c_f_segments = dataset["FormTable", "segments"].name
     c_f_id = dataset["FormTable", "id"].name
     c_f_lan = dataset["FormTable", "languageReference"].name
     c_f_form = dataset["FormTable", "form"].name
+    rows = list(dataset["FormTable"])
     # report = t.Dict[str, t.Dict[str, t.Dict[str, str]]] = {}
     report = {
-        f[c_f_lan]: defaultdict(lambda: {"count": 0, "comment": ""})
-        for f in dataset["FormTable"]
+        f[c_f_lan]: defaultdict(lambda: {"count": 0, "comment": ""}) for f in rows
     }
-    for r, row in enumerate(dataset["FormTable"], 1):
+
+    # Apply the replacements, and collect the forms to be segmented.
+    replace = compile_replacements(replacements)
+    to_segment: t.List[t.Tuple[int, t.Dict[str, t.Any], t.Counter[str]]] = []
+    forms: t.List[str] = []
+    for r, row in enumerate(rows, 1):
         if row[c_f_segments] and not overwrite_existing:
             continue
-        else:
-            if row[transcription]:
-                form = row[transcription].strip()
-                for wrong, right in pre_replace.items():
-                    if wrong in form:
-                        report[row[c_f_lan]][wrong]["count"] += 1
-                        report[row[c_f_lan]][wrong][
-                            "comment"
-                        ] = f"'{wrong}' replaced by '{right}'"
-                        form = form.replace(wrong, right)
-                        # also replace symbol in #FormTable *form
-                        if replace_form:
-                            row[c_f_form] = row[c_f_form].replace(wrong, right)
-                row[dataset.column_names.forms.segments] = segment_form(
-                    form,
-                    context_for_warnings=f"In form {row[c_f_id]} (line {r}): ",
-                    report=report[row[c_f_lan]],
-                )
-            write_back.append(row)
+        if row[transcription]:
+            form, hits = replace(row[transcription].strip())
+            # also replace symbol in #FormTable *form
+            if replace_form and hits:
+                row[c_f_form], _ = replace(row[c_f_form])
+            to_segment.append((r, row, hits))
+            forms.append(form)
+
+    # Segment the forms, and report what happened, in the order of the rows.
+    for (r, row, hits), (segmented, problems) in zip(
+        to_segment, segment_forms(forms, jobs=jobs)
+    ):
+        for wrong, count in hits.items():
+            report[row[c_f_lan]][wrong]["count"] += count
+            report[row[c_f_lan]][wrong][
+                "comment"
+            ] = f"'{wrong}' replaced by '{replacements[wrong]}'"
+        report_problems(
+            problems,
+            context_for_warnings=f"In form {row[c_f_id]} (line {r}): ",
+            report=report[row[c_f_lan]],
+        )
+        row[c_f_segments] = segmented
+
     from tabulate import tabulate
 
     data = [
@@ -218,7 +374,7 @@ def add_segments_to_dataset(
             tablefmt="orgtbl",
         )
     )
-    dataset.write(FormTable=write_back)
+    dataset.write(FormTable=rows)
 
 
 if __name__ == "__main__":
@@ -250,13 +406,36 @@ if __name__ == "__main__":
         default=False,
         help="Apply the replacements performed on segments also to #form column of #FormTable",
     )
+    parser.add_argument(
+        "--replacements",
+        type=Path,
+        default=None,
+        help="File with additional replacements to apply to the transcriptions before segmenting, "
+        "one per line, each a string and its replacement separated by a tab. "
+        "These take precedence over the built-in replacements.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Segment forms in this many parallel processes (default: 1)",
+    )
     args = parser.parse_args()
 
     dataset = pycldf.Wordlist.from_metadata(args.metadata)
 
     if args.transcription is None:
         args.transcription = dataset.column_names.forms.form
+    replacements = dict(pre_replace)
+    if args.replacements is not None:
+        replacements.update(read_replacements(args.replacements))
     # add segments to FormTable
     add_segments_to_dataset(
-        dataset, args.transcription, args.overwrite, args.replace_form
+        dataset,
+        args.transcription,
+        args.overwrite,
+        args.replace_form,
+        jobs=args.jobs,
+        replacements=replacements,
     )
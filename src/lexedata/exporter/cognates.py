@@ -1,13 +1,19 @@
 # -*- coding: utf-8 -*-
 import re
+import time
 import typing as t
+import functools
+import itertools
+import collections
 import urllib.parse
+import concurrent.futures
 from pathlib import Path
 
 import pycldf
 import openpyxl as op
 
-from lexedata import types
+from lexedata import cli, types
+from lexedata.util import segment_slice_ranges
 
 WARNING = "\u26A0"
 
@@ -19,6 +25,50 @@ WARNING = "\u26A0"
 # Type aliases, for clarity
 CognatesetID = str
 
+# The writer used by worker processes to write shards to separate files
+_writer: t.Optional["ExcelWriter"] = None
+
+
+def _share_writer(writer: "ExcelWriter") -> None:
+    global _writer
+    _writer = writer
+
+
+def _write_workbook(arguments) -> None:
+    assert _writer is not None
+    _writer.write_workbook(*arguments)
+
+
+@functools.lru_cache(maxsize=2 ** 16)
+def render_transcription(
+    segments: t.Tuple[str, ...], segment_slices: t.Tuple[str, ...]
+) -> str:
+    """Render the segments of a form, with the judged morphemes in braces
+
+    Segment slices are parsed only once per distinct combination of segments
+    and slices, because the same form is usually rendered for each of its
+    judgements, and because the same morphemes recur across sheets. The slices
+    here are 0-based and end-exclusive, the way the cognate importer reads
+    them back.
+
+    >>> render_transcription(("t", "a", "k", "a", "s"), ("1:3",))
+    't{ a k }as'
+    >>> render_transcription(("t", "a", "k", "a", "s"), ("0:2", "3:5"))
+    '{ t a }k{ a s }'
+
+    """
+    parts = []
+    old_end = 0
+    for start, end in segment_slice_ranges(segment_slices):
+        parts.append("".join(s[0] for s in segments[old_end:start]))
+        # TODO: Find a sensible way to split the alignments instead – this
+        # is trivial for a single segment slice, but requires some fiddling
+        # for split morphemes.
+        parts.append("{ " + " ".join(segments[start:end]) + " }")
+        old_end = end
+    parts.append("".join(s[0] for s in segments[old_end:]))
+    return "".join(parts).strip()
+
 
 class ExcelWriter:
     """Class logic for cognateset Excel export."""
@@ -49,6 +99,32 @@ class ExcelWriter:
             self.URL_BASE = database_url
         else:
             self.URL_BASE = "https://example.org/{:s}"
+        self.set_columns()
+
+    def set_columns(self):
+        """Look up the names of the form and judgement columns once.
+
+        The exporter needs them for every single cell, and looking them up in
+        the dataset each time is expensive.
+
+        """
+
+        def optional(table: str, term: str) -> t.Optional[str]:
+            try:
+                return self.dataset[table, term].name
+            except KeyError:
+                return None
+
+        self.c_form_id = self.dataset["FormTable", "id"].name
+        self.c_form_language = self.dataset["FormTable", "languageReference"].name
+        self.c_form_concept = self.dataset["FormTable", "parameterReference"].name
+        self.c_form_comment = optional("FormTable", "comment")
+        self.c_form_segments = optional("FormTable", "segments")
+        self.c_cognate_form = self.dataset["CognateTable", "formReference"].name
+        self.c_cognate_cognateset = self.dataset[
+            "CognateTable", "cognatesetReference"
+        ].name
+        self.c_cognate_comment = optional("CognateTable", "comment")
 
     def set_header(self):
         c_id = self.dataset["CognatesetTable", "id"].name
@@ -71,6 +147,11 @@ class ExcelWriter:
         size_sort: bool = False,
         language_order="name",
         status_update: t.Optional[str] = None,
+        write_only: bool = False,
+        shard_by: t.Optional[str] = None,
+        shard_rows: int = 10000,
+        separate_files: bool = False,
+        jobs: int = 1,
     ) -> None:
         """Convert the initial CLDF into an Excel cognate view
 
@@ -93,15 +174,95 @@ class ExcelWriter:
 
         status_update: string, writen to status_column of singleton cognates.
 
+        write_only: If true, use a write-only workbook, which streams every
+            row to disk as soon as it is complete, instead of keeping the
+            whole sheet in memory until it is saved.
+
+        shard_by: If given, split the cognatesets over several sheets of at
+            most `shard_rows` rows each: "rows" keeps the order of the
+            cognatesets, "concept" keeps all cognatesets with the same central
+            concept together, and "size" separates cognatesets with 1, 2, 3–4,
+            5–8, … judgements. Singleton cognatesets get a sheet of their own.
+
+        separate_files: If true, write every shard to a separate file instead
+            of a separate sheet. The files are named like `out`, with the
+            number of the shard appended.
+
+        jobs: Write separate files in this many parallel processes.
+
         """
-        wb = op.Workbook()
-        ws: op.worksheet.worksheet.Worksheet = wb.active
+        self.load_forms_and_judgements(language_order, status_update)
+        c_cogset_id = self.dataset["CognatesetTable", "id"].name
+        if size_sort:
+            cogsets = sorted(
+                self.dataset["CognatesetTable"],
+                key=lambda x: len(self.all_judgements.get(x[c_cogset_id], ())),
+                reverse=True,
+            )
+        else:
+            cogsets = list(self.dataset["CognatesetTable"])
+        # possibly a cogset can appear without any judgment, if so ignore it
+        cogsets = [c for c in cogsets if c[c_cogset_id] in self.all_judgements]
+
+        # remaining forms go to singleton congatesets if switch is activated
+        singletons: t.Optional[t.Dict[str, types.Form]] = None
+        if self.singleton:
+            singletons = dict(self.all_forms)
+            # remove all forms that appear in judgements
+            for k in self.all_judgements:
+                for judgement in self.all_judgements[k]:
+                    singletons.pop(judgement[self.c_cognate_form], None)
+
+        if shard_by is None:
+            self.write_workbook(out, [(None, cogsets, singletons)], write_only)
+            return
+
+        shards: t.List[
+            t.Tuple[
+                t.Optional[str],
+                t.List[types.CogSet],
+                t.Optional[t.Dict[str, types.Form]],
+            ]
+        ] = [
+            (title, shard, None)
+            for title, shard in self.shard_cognatesets(cogsets, shard_by, shard_rows)
+        ]
+        if singletons:
+            shards.append(("Singletons", [], singletons))
+        if not separate_files:
+            self.write_workbook(out, shards, write_only)
+            return
+
+        out = Path(out)
+        digits = len(str(len(shards)))
+        files = [
+            (
+                out.with_name(f"{out.stem}-{i:0{digits}d}{out.suffix}"),
+                [shard],
+                write_only,
+            )
+            for i, shard in enumerate(shards, 1)
+        ]
+        if jobs <= 1:
+            for file in files:
+                self.write_workbook(*file)
+            return
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=jobs, initializer=_share_writer, initargs=(self,)
+        ) as pool:
+            list(pool.map(_write_workbook, files))
+
+    def load_forms_and_judgements(
+        self, language_order: t.Optional[str], status_update: t.Optional[str]
+    ) -> None:
+        """Load all forms and judgements, and define the columns of the sheets."""
         # if status update, add column to self.header
         if status_update and self.singleton:
             self.header.append(("", "Status_Column"))
-        # Define the columns, i.e. languages and write to excel
+        self.status_update = status_update
+        # Define the columns, i.e. languages
         self.lan_dict: t.Dict[str, int] = {}
-        excel_header = [name for cldf, name in self.header]
+        self.excel_header = [name for cldf, name in self.header]
         c_name = self.dataset["LanguageTable", "name"].name
         c_id = self.dataset["LanguageTable", "id"].name
         if language_order:
@@ -111,32 +272,160 @@ class ExcelWriter:
             )
         else:
             languages = self.dataset["LanguageTable"]
-        for col, lan in enumerate(languages, len(excel_header) + 1):
+        for col, lan in enumerate(languages, len(self.excel_header) + 1):
             self.lan_dict[lan[c_id]] = col
-            excel_header.append(lan[c_name])
-        ws.append(excel_header)
-
-        # load all forms
-        c_form_id = self.dataset["FormTable", "id"].name
-        c_language = self.dataset["FormTable", "languageReference"].name
-        all_forms = {f[c_form_id]: f for f in self.dataset["FormTable"]}
+            self.excel_header.append(lan[c_name])
 
-        # map form_id to id of associated concept
-        c_form_concept_reference = self.dataset["FormTable", "parameterReference"].name
-        concept_id_by_form_id = dict()
+        # load all forms, and map form_id to id of associated concept, in one
+        # pass through the FormTable
+        self.all_forms: t.Dict[str, types.Form] = {}
+        self.concept_id_by_form_id: t.Dict[str, str] = {}
         for f in self.dataset["FormTable"]:
-            concept = f[c_form_concept_reference]
+            self.all_forms[f[self.c_form_id]] = f
+            concept = f[self.c_form_concept]
             if isinstance(concept, str):
-                concept_id_by_form_id[f[c_form_id]] = concept
+                self.concept_id_by_form_id[f[self.c_form_id]] = concept
             else:
-                concept_id_by_form_id[f[c_form_id]] = concept[0]
+                self.concept_id_by_form_id[f[self.c_form_id]] = concept[0]
 
         # load all cognates by cognateset id
-        all_judgements: t.Dict[CognatesetID, t.List[types.CogSet]] = {}
-        c_cognate_cognateset = self.dataset["CognateTable", "cognatesetReference"].name
-        c_cognate_form = self.dataset["CognateTable", "formReference"].name
+        self.all_judgements: t.Dict[CognatesetID, t.List[types.Judgement]] = {}
         for j in self.dataset["CognateTable"]:
-            all_judgements.setdefault(j[c_cognate_cognateset], []).append(j)
+            self.all_judgements.setdefault(j[self.c_cognate_cognateset], []).append(j)
+
+    def shard_cognatesets(
+        self, cogsets: t.List[types.CogSet], by: str, rows: int
+    ) -> t.List[t.Tuple[str, t.List[types.CogSet]]]:
+        """Split the cognatesets into shards of at most `rows` Excel rows
+
+        Return the shards in order, each with a title for its sheet. A single
+        cognateset (or, when sharding by concept, the cognatesets of a single
+        concept) taller than `rows` gets a shard of its own.
+
+        """
+        c_cogset_id = self.dataset["CognatesetTable", "id"].name
+        try:
+            c_cogset_concept = self.dataset[
+                "CognatesetTable", "parameterReference"
+            ].name
+        except KeyError:
+            c_cogset_concept = None
+
+        def height(cogset: types.CogSet) -> int:
+            languages = collections.Counter(
+                self.all_forms[j[self.c_cognate_form]][self.c_form_language]
+                for j in self.all_judgements[cogset[c_cogset_id]]
+            )
+            return max(languages.values(), default=1)
+
+        def concept(cogset: types.CogSet) -> str:
+            if c_cogset_concept and cogset.get(c_cogset_concept):
+                return str(cogset[c_cogset_concept])
+            first = self.all_judgements[cogset[c_cogset_id]][0]
+            return self.concept_id_by_form_id[first[self.c_cognate_form]]
+
+        # Split the cognatesets into parts which never share a shard, each
+        # consisting of units which are never split over shards.
+        parts: t.List[t.Tuple[str, t.List[t.List[types.CogSet]]]]
+        if by == "rows":
+            parts = [("", [[c] for c in cogsets])]
+        elif by == "concept":
+            by_concept: t.Dict[str, t.List[types.CogSet]] = {}
+            for cogset in cogsets:
+                by_concept.setdefault(concept(cogset), []).append(cogset)
+            parts = [("", list(by_concept.values()))]
+        elif by == "size":
+            buckets: t.Dict[int, t.List[types.CogSet]] = {}
+            for cogset in cogsets:
+                size = len(self.all_judgements[cogset[c_cogset_id]])
+                buckets.setdefault((size - 1).bit_length(), []).append(cogset)
+            parts = [
+                (
+                    f"Size {2 ** b}" if b < 2 else f"Size {2 ** (b - 1) + 1}-{2 ** b}",
+                    [[c] for c in bucket],
+                )
+                for b, bucket in sorted(buckets.items())
+            ]
+        else:
+            raise ValueError(f"Cannot shard cognatesets by {by!r}.")
+
+        shards = []
+        for label, units in parts:
+            shard: t.List[types.CogSet] = []
+            shard_height = 0
+            for unit in units:
+                unit_height = sum(height(c) for c in unit)
+                if shard and shard_height + unit_height > rows:
+                    shards.append((label, shard))
+                    shard, shard_height = [], 0
+                shard.extend(unit)
+                shard_height += unit_height
+            if shard:
+                shards.append((label, shard))
+
+        titles = []
+        parts_of_label = collections.Counter(label for label, shard in shards)
+        part: t.Counter[str] = collections.Counter()
+        for label, shard in shards:
+            if by == "concept":
+                label = f"{concept(shard[0])}–{concept(shard[-1])}"
+            elif not label:
+                label = f"{shard[0][c_cogset_id]}–{shard[-1][c_cogset_id]}"
+            elif parts_of_label[label] > 1:
+                part[label] += 1
+                label = f"{label} ({part[label]})"
+            # Excel forbids some characters in sheet titles, and long titles
+            titles.append(re.sub(r"[][:*?/\\]", "", label)[:31])
+        return [(title, shard) for title, (_, shard) in zip(titles, shards)]
+
+    def write_workbook(
+        self,
+        out: Path,
+        shards: t.Sequence[
+            t.Tuple[
+                t.Optional[str],
+                t.List[types.CogSet],
+                t.Optional[t.Dict[str, types.Form]],
+            ]
+        ],
+        write_only: bool = False,
+    ) -> None:
+        """Write a workbook with one sheet per shard of cognatesets
+
+        Each shard consists of the sheet title (None for the default title),
+        the cognatesets, and the forms to be written as singleton cognatesets
+        (or None).
+
+        """
+        if write_only:
+            wb = op.Workbook(write_only=True)
+        else:
+            wb = op.Workbook()
+        for i, (title, cogsets, singletons) in enumerate(shards):
+            if write_only or i > 0:
+                ws = wb.create_sheet(title)
+            else:
+                ws = wb.active
+                if title is not None:
+                    ws.title = title
+            self.write_sheet(ws, cogsets, singletons, write_only)
+        wb.save(filename=out)
+
+    def write_sheet(
+        self,
+        ws: op.worksheet.worksheet.Worksheet,
+        cogsets: t.Iterable[types.CogSet],
+        singletons: t.Optional[t.Dict[str, types.Form]] = None,
+        write_only: bool = False,
+    ) -> None:
+        """Write the header, the cognatesets, and the singletons to one sheet"""
+        ws.append(self.excel_header)
+        c_language = self.c_form_language
+        c_cognate_form = self.c_cognate_form
+        all_forms = self.all_forms
+        all_judgements = self.all_judgements
+        concept_id_by_form_id = self.concept_id_by_form_id
+        status_update = self.status_update
         try:
             c_comment = self.dataset["CognatesetTable", "comment"].name
         except KeyError:
@@ -145,20 +434,48 @@ class ExcelWriter:
 
         # Again, row_index 2 is indeed row 2, row 1 is header
         row_index = 1 + 1
-        if size_sort:
-            cogsets = sorted(
-                self.dataset["CognatesetTable"],
-                key=lambda x: len(all_judgements[x[c_cogset_id]]),
-                reverse=True,
-            )
-        else:
-            cogsets = self.dataset["CognatesetTable"]
+
+        # Look up the separators of the cognateset columns once. db_name is ''
+        # for columns that do not come from the cognateset table.
+        separators = {
+            db_name: self.dataset["CognatesetTable", db_name].separator
+            for db_name, header in self.header
+            if db_name
+        }
 
         # iterate over all cogsets
         for cogset in cogsets:
-            # possibly a cogset can appear without any judgment, if so ignore it
-            if cogset[c_cogset_id] not in all_judgements:
+            values = []
+            for db_name, header in self.header:
+                # db_name is '' when add_central_concepts is activated
+                # and there is no concept column in cognateset table
+                # else read value from cognateset table
+                if header == "Central_Concept" and db_name == "":
+                    # this is the concept associated to the first cognate in this cognateset
+                    values.append(
+                        concept_id_by_form_id[
+                            all_judgements[cogset[c_cogset_id]][0][c_cognate_form]
+                        ]
+                    )
+                elif db_name == "":
+                    values.append("")
+                elif separators[db_name] is None:
+                    values.append(cogset[db_name])
+                else:
+                    values.append(
+                        separators[db_name].join([str(v) for v in cogset[db_name]])
+                    )
+            comment = None
+            if c_comment and cogset.get(c_comment):
+                comment = re.sub(f"-?{__package__}", "", cogset["Comment"]).strip()
+
+            if write_only:
+                for row in self.formrows_for_cogset(
+                    all_judgements[cogset[c_cogset_id]], ws, all_forms
+                ):
+                    ws.append(self.metadata_cells(ws, values, comment) + row)
                 continue
+
             # write all forms of this cognateset to excel
             new_row_index = self.create_formcells_for_cogset(
                 all_judgements[cogset[c_cogset_id]],
@@ -168,42 +485,15 @@ class ExcelWriter:
             )
             # write rows for cognatesets
             for row in range(row_index, new_row_index):
-                for col, (db_name, header) in enumerate(self.header, 1):
-                    # db_name is '' when add_central_concepts is activated
-                    # and there is no concept column in cognateset table
-                    # else read value from cognateset table
-                    if header == "Central_Concept" and db_name == "":
-                        # this is the concept associated to the first cognate in this cognateset
-                        value = concept_id_by_form_id[
-                            all_judgements[cogset[c_cogset_id]][0][c_cognate_form]
-                        ]
-                    else:
-                        column = self.dataset["CognatesetTable", db_name]
-                        if column.separator is None:
-                            value = cogset[db_name]
-                        else:
-                            value = column.separator.join(
-                                [str(v) for v in cogset[db_name]]
-                            )
+                for col, value in enumerate(values, 1):
                     cell = ws.cell(row=row, column=col, value=value)
                     # Transfer the cognateset comment to the first Excel cell.
-                    if c_comment and col == 1 and cogset.get(c_comment):
-                        cell.comment = op.comments.Comment(
-                            re.sub(f"-?{__package__}", "", cogset["Comment"]).strip(),
-                            "lexedata.exporter",
-                        )
+                    if comment and col == 1:
+                        cell.comment = op.comments.Comment(comment, "lexedata.exporter")
 
             row_index = new_row_index
-        # write remaining forms to singleton congatesets if switch is activated
-        if self.singleton:
-            # remove all forms that appear in judgements
-            for k in all_judgements:
-                for judgement in all_judgements[k]:
-                    form_id = judgement[c_cognate_form]
-                    try:
-                        del all_forms[form_id]
-                    except KeyError:
-                        continue
+        # write remaining forms to singleton congatesets
+        if singletons:
             # create for remaining forms singleton cognatesets and write to file
             c_cogset_name = self.dataset["CognatesetTable", "name"].name
             try:
@@ -212,14 +502,10 @@ class ExcelWriter:
                 ].name
             except KeyError:
                 c_cogset_concept = None
-            for i, form_id in enumerate(all_forms):
-                # write form to file
-                form = all_forms[form_id]
-                self.create_formcell(
-                    (form, dict()), ws, self.lan_dict[form[c_language]], row_index
-                )
+            for i, (form_id, form) in enumerate(singletons.items()):
                 # write singleton cognateset to excel
-                for col, (db_name, header) in enumerate(self.header, 1):
+                values = []
+                for db_name, header in self.header:
                     if db_name == c_cogset_id:
                         value = f"X{i+1}_{form[c_language]}"
                     elif db_name == c_cogset_name:
@@ -234,9 +520,71 @@ class ExcelWriter:
                         value = status_update
                     else:
                         value = ""
+                    values.append(value)
+                # write form to file
+                if write_only:
+                    row = [None] * len(self.lan_dict)
+                    row[
+                        self.lan_dict[form[c_language]] - len(self.header) - 1
+                    ] = self.formcell(ws, (form, dict()))
+                    ws.append(values + row)
+                    continue
+                self.create_formcell(
+                    (form, dict()), ws, self.lan_dict[form[c_language]], row_index
+                )
+                for col, value in enumerate(values, 1):
                     ws.cell(row=row_index, column=col, value=value)
                 row_index += 1
-        wb.save(filename=out)
+
+    def metadata_cells(
+        self,
+        ws: op.worksheet._write_only.WriteOnlyWorksheet,
+        values: t.List[t.Any],
+        comment: t.Optional[str],
+    ) -> t.List[t.Any]:
+        """Make the cognateset metadata cells of one row of a write-only sheet.
+
+        Like in a normal sheet, the cognateset comment becomes a comment on the
+        first cell of every row of the cognateset.
+
+        """
+        if not comment:
+            return list(values)
+        first = op.cell.WriteOnlyCell(ws, value=values[0])
+        first.comment = op.comments.Comment(comment, "lexedata.exporter")
+        # The write-only sheet would put plain values following a cell object
+        # into that same cell object, comment included, so wrap them, too.
+        return [first] + [op.cell.WriteOnlyCell(ws, value=v) for v in values[1:]]
+
+    def formrows_for_cogset(
+        self,
+        cogset: types.CogSet,
+        ws: op.worksheet._write_only.WriteOnlyWorksheet,
+        all_forms: t.Dict[str, types.Form],
+    ) -> t.List[t.List[t.Optional[op.cell.Cell]]]:
+        """Assemble the form cells of a cognate set as complete rows.
+
+        This is the write-only counterpart of create_formcells_for_cogset:
+        Instead of writing each form to its cell, return the language columns
+        of every row of this cognate set, in order, so that they can be
+        appended to a write-only sheet. A cognate set without forms still gets
+        one (empty) row.
+
+        """
+        c_form = self.c_cognate_form
+        c_language = self.c_form_language
+        offset = len(self.header) + 1
+        rows: t.List[t.List[t.Optional[op.cell.Cell]]] = []
+        # Fill the rows top to bottom, one language column after the other
+        filled = [0] * len(self.lan_dict)
+        for judgement in cogset:
+            form = all_forms[judgement[c_form]]
+            column = self.lan_dict[form[c_language]] - offset
+            if filled[column] == len(rows):
+                rows.append([None] * len(self.lan_dict))
+            rows[filled[column]][column] = self.formcell(ws, (form, judgement))
+            filled[column] += 1
+        return rows or [[None] * len(self.lan_dict)]
 
     def create_formcells_for_cogset(
         self,
@@ -255,8 +603,8 @@ class ExcelWriter:
         which can then be filled by the following cognate set.
 
         """
-        c_form = self.dataset["CognateTable", "formReference"].name
-        c_language = self.dataset["FormTable", "languageReference"].name
+        c_form = self.c_cognate_form
+        c_language = self.c_form_language
         # Read the forms from the database and group them by language
         forms = t.DefaultDict[int, t.List[types.Form]](list)
         for judgement in cogset:
@@ -289,12 +637,23 @@ class ExcelWriter:
         """
         cell_value = self.form_to_cell_value(judgement[0], judgement[1])
         form_cell = ws.cell(row=row, column=column, value=cell_value)
-        c_id = self.dataset["FormTable", "id"].name
-        c_comment = self.dataset["CognateTable", "comment"].name
-        comment = judgement[1].get(c_comment, None)
+        self.annotate_formcell(judgement, form_cell)
+
+    def formcell(
+        self, ws: op.worksheet._write_only.WriteOnlyWorksheet, judgement
+    ) -> op.cell.Cell:
+        """Create a cell with the form's data for a write-only sheet."""
+        cell_value = self.form_to_cell_value(judgement[0], judgement[1])
+        form_cell = op.cell.WriteOnlyCell(ws, value=cell_value)
+        self.annotate_formcell(judgement, form_cell)
+        return form_cell
+
+    def annotate_formcell(self, judgement, form_cell: op.cell.Cell) -> None:
+        """Add the judgement comment and the link to the form to a form cell."""
+        comment = judgement[1].get(self.c_cognate_comment, None)
         if comment:
             form_cell.comment = op.comments.Comment(comment, __package__)
-        link = self.URL_BASE.format(urllib.parse.quote(judgement[0][c_id]))
+        link = self.URL_BASE.format(urllib.parse.quote(judgement[0][self.c_form_id]))
         form_cell.hyperlink = link
 
     def form_to_cell_value(self, form: types.Form, meta: types.Judgement) -> str:
@@ -314,49 +673,80 @@ class ExcelWriter:
         if segments is None:
             transcription = form["Form"]
         else:
-            transcription = ""
-            old_end = 0
             if not meta.get("Segment_Slice"):
                 meta["Segment_Slice"] = ["0:{:d}".format(len(segments))]
-            for startend in meta["Segment_Slice"]:
-                start, end = startend.split(":")
-                start = int(start)
-                end = int(end)
-                transcription += "".join(s[0] for s in segments[old_end:start])
-                transcription += "{ "
-                transcription += " ".join(segments[start:end])
-                # TODO: Find a sensible way to split the alignments instead – this
-                # is trivial for a single segment slice, but requires some fiddling
-                # for split morphemes.
-                transcription += " }"
-                old_end = end
-            transcription += "".join(
-                s[0] for s in segments[old_end : len(segments) + 1]
+            transcription = render_transcription(
+                tuple(segments), tuple(meta["Segment_Slice"])
             )
-            transcription = transcription.strip()
         translations = []
 
         suffix = ""
-        try:
-            c_comment = self.dataset["FormTable", "comment"].name
-            if form.get(c_comment):
-                suffix = f" {WARNING:}"
-        except KeyError:
-            pass
+        if self.c_form_comment and form.get(self.c_form_comment):
+            suffix = f" {WARNING:}"
 
         # corresponding concepts
         # (multiple concepts) and others (single concept)
-        c_concept = self.dataset["FormTable", "parameterReference"].name
+        c_concept = self.c_form_concept
         if isinstance(form[c_concept], list):
-            for f in form[c_concept]:
-                translations.append(f)
+            translations.extend(form[c_concept])
         else:
             translations.append(form[c_concept])
-        return "{:} ‘{:}’{:}".format(transcription, ", ".join(translations), suffix)
+        return "".join((transcription, " ‘", ", ".join(translations), "’", suffix))
 
     def get_segments(self, form):
-        c_segments = self.dataset["FormTable", "Segments"].name
-        return form[c_segments]
+        if self.c_form_segments is None:
+            return None
+        return form[self.c_form_segments]
+
+
+def benchmark(
+    writer: ExcelWriter,
+    judgements: int = 1_000_000,
+    logger: cli.logging.Logger = cli.logger,
+) -> t.Dict[str, float]:
+    """Time rendering the cell texts of many judgements
+
+    The judgements of the dataset are repeated until there are `judgements` of
+    them. Time rendering their cell texts, and rendering only their
+    transcriptions with and without the cache, and return the times taken in
+    seconds.
+
+    """
+    writer.load_forms_and_judgements(None, None)
+    pairs = [
+        (writer.all_forms[j[writer.c_cognate_form]], j)
+        for cogset in writer.all_judgements.values()
+        for j in cogset
+    ]
+    if not pairs:
+        return {}
+    sample = list(itertools.islice(itertools.cycle(pairs), judgements))
+
+    times = {}
+    render_transcription.cache_clear()
+    start = time.perf_counter()
+    for form, judgement in sample:
+        writer.form_to_cell_value(form, judgement)
+    times["cell texts"] = time.perf_counter() - start
+
+    # form_to_cell_value has filled in the missing segment slices by now
+    transcriptions = [
+        (tuple(writer.get_segments(form)), tuple(judgement["Segment_Slice"]))
+        for form, judgement in sample
+        if writer.get_segments(form) is not None
+    ]
+    start = time.perf_counter()
+    for segments, segment_slices in transcriptions:
+        render_transcription(segments, segment_slices)
+    times["transcriptions, cached"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for segments, segment_slices in transcriptions:
+        render_transcription.__wrapped__(segments, segment_slices)
+    times["transcriptions, uncached"] = time.perf_counter() - start
+
+    for method, duration in times.items():
+        logger.info(f"{method}: {len(sample)} judgements in {duration:.2f}s")
+    return times
 
 
 if __name__ == "__main__":
@@ -406,6 +796,42 @@ if __name__ == "__main__":
         help="Output all forms that don't belong to a cognateset. "
         "For each form, a singleton cognateset is created.",
     )
+    parser.add_argument(
+        "--low-memory",
+        action="store_true",
+        default=False,
+        help="Stream the rows to a write-only workbook, instead of building the "
+        "whole sheet in memory. Use this for very large datasets.",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=("rows", "concept", "size"),
+        default=None,
+        help="Split the cognatesets over several sheets of at most SHARD_ROWS rows: "
+        "in their normal order (rows), keeping the cognatesets of each central "
+        "concept together (concept), or by number of judgements (size). "
+        "(default: Write a single sheet)",
+    )
+    parser.add_argument(
+        "--shard-rows",
+        type=int,
+        default=10000,
+        help="Maximum number of rows per shard (default: 10000)",
+    )
+    parser.add_argument(
+        "--separate-files",
+        action="store_true",
+        default=False,
+        help="Write each shard to a separate file, named like EXCEL with the shard "
+        "number appended, instead of a separate sheet",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Write separate files in this many parallel processes (default: 1)",
+    )
     parser.add_argument(
         "--status-update",
         type=str,
@@ -413,11 +839,20 @@ if __name__ == "__main__":
         help="Text written to Status_Column. Set to 'None' for no status update. "
         "(default: automatic singleton)",
     )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        default=False,
+        help="Instead of writing the Excel file, time rendering the cells of "
+        "1000000 judgements, cycling through the judgements of the dataset",
+    )
+    cli.add_log_controls(parser)
     # TODO: Derive URL template from the "special:domain" property of the
     # wordlist, where it exists? So something like
     # 'https://{special:domain}/values/{{:}}'? It would work for Lexibank and
     # for LexiRumah, is it robust enough?
     args = parser.parse_args()
+    logger = cli.setup_logging(args)
     if args.status_update == "None":
         args.status_update = None
     E = ExcelWriter(
@@ -426,9 +861,17 @@ if __name__ == "__main__":
         add_central_concepts=args.add_concepts,
         singleton_cognate=args.add_singletons,
     )
-    E.create_excel(
-        args.excel,
-        size_sort=args.size_sort,
-        language_order=args.language_sort_column,
-        status_update=args.status_update,
-    )
+    if args.benchmark:
+        benchmark(E, logger=logger)
+    else:
+        E.create_excel(
+            args.excel,
+            size_sort=args.size_sort,
+            language_order=args.language_sort_column,
+            status_update=args.status_update,
+            write_only=args.low_memory,
+            shard_by=args.shard_by,
+            shard_rows=args.shard_rows,
+            separate_files=args.separate_files,
+            jobs=args.jobs,
+        )
@@ -1,11 +1,204 @@
+"""Summarise the coverage of concepts by languages
+
+Count the forms of every language for every concept in a single pass over the
+FormTable, and report for every language how many concepts it covers, and how
+many synonyms it has on average per concept.
+
+"""
+import sys
+import csv
+import json
 import argparse
+import contextlib
 import typing as t
 from pathlib import Path
 
+import attr
+import numpy
 import pycldf
 
+from lexedata import cli
+from lexedata.util import raw_columns
+
+
+@attr.s(auto_attribs=True)
+class CoverageMatrix:
+    """A sparse matrix of the number of forms for each language and concept
+
+    The matrix is stored in coordinate format: `rows[i]` indexes `languages`,
+    `columns[i]` indexes `concepts`, and `counts[i]` is the number of forms of
+    that language for that concept. Cells without forms are not stored.
+
+    >>> matrix = CoverageMatrix.from_pairs(
+    ...     [("l1", "c1"), ("l1", "c1"), ("l1", "c2"), ("l2", "c1")])
+    >>> matrix.concepts_per_language().tolist()
+    [2, 1]
+    >>> matrix.synonymy().tolist()
+    [1.5, 1.0]
+    >>> matrix.dense().tolist()
+    [[2, 1], [1, 0]]
+
+    """
+
+    languages: t.List[str]
+    concepts: t.List[str]
+    rows: numpy.ndarray
+    columns: numpy.ndarray
+    counts: numpy.ndarray
+
+    @classmethod
+    def from_pairs(
+        cls,
+        pairs: t.Iterable[t.Tuple[str, str]],
+        languages: t.Iterable[str] = (),
+    ) -> "CoverageMatrix":
+        """Count (language, concept) pairs
+
+        Languages given in `languages` come first, in that order, even if they
+        have no forms; all others follow in order of appearance.
+
+        """
+        language_index = {language: i for i, language in enumerate(languages)}
+        concept_index: t.Dict[str, int] = {}
+        rows = []
+        columns = []
+        for language, concept in pairs:
+            rows.append(language_index.setdefault(language, len(language_index)))
+            columns.append(concept_index.setdefault(concept, len(concept_index)))
+        # Sum duplicate cells, by sorting the flattened cell indices.
+        cells, counts = numpy.unique(
+            numpy.array(rows, dtype=numpy.int64) * max(len(concept_index), 1)
+            + numpy.array(columns, dtype=numpy.int64),
+            return_counts=True,
+        )
+        rows_, columns_ = numpy.divmod(cells, max(len(concept_index), 1))
+        return cls(
+            languages=list(language_index),
+            concepts=list(concept_index),
+            rows=rows_,
+            columns=columns_,
+            counts=counts,
+        )
+
+    @classmethod
+    def from_dataset(
+        cls, dataset: pycldf.Dataset, missing: bool = False
+    ) -> "CoverageMatrix":
+        """Read the coverage matrix from the FormTable of the dataset
+
+        With `missing`, ignore forms marked as missing with the form '?'.
+
+        """
+        try:
+            languages = [
+                id
+                for (id,) in raw_columns(
+                    dataset["LanguageTable"], dataset["LanguageTable", "id"].name
+                )
+            ]
+        except KeyError:
+            languages = []
+        separator = dataset["FormTable", "parameterReference"].separator
+
+        def pairs() -> t.Iterator[t.Tuple[str, str]]:
+            for language, concepts, form in raw_columns(
+                dataset["FormTable"],
+                dataset["FormTable", "languageReference"].name,
+                dataset["FormTable", "parameterReference"].name,
+                dataset["FormTable", "form"].name,
+            ):
+                if missing and form == "?":
+                    continue
+                if separator:
+                    for concept in concepts.split(separator):
+                        if concept:
+                            yield language, concept
+                elif concepts:
+                    yield language, concepts
+
+        return cls.from_pairs(pairs(), languages)
+
+    def dense(self) -> numpy.ndarray:
+        """The full language × concept matrix of form counts"""
+        matrix = numpy.zeros((len(self.languages), len(self.concepts)), dtype=int)
+        matrix[self.rows, self.columns] = self.counts
+        return matrix
+
+    def concepts_per_language(self) -> numpy.ndarray:
+        return numpy.bincount(self.rows, minlength=len(self.languages))
+
+    def forms_per_language(self) -> numpy.ndarray:
+        return numpy.bincount(
+            self.rows, weights=self.counts, minlength=len(self.languages)
+        ).astype(int)
+
+    def synonymy(self) -> numpy.ndarray:
+        """The average number of forms per concept of each language
+
+        Languages without any concepts have a synonymy of 0.
+
+        """
+        concepts = self.concepts_per_language()
+        return numpy.divide(
+            self.forms_per_language(),
+            concepts,
+            out=numpy.zeros(len(self.languages)),
+            where=concepts > 0,
+        )
+
+    def languages_with_concept(self, concept: str) -> numpy.ndarray:
+        """A boolean mask of the languages with a form for the concept"""
+        mask = numpy.zeros(len(self.languages), dtype=bool)
+        try:
+            column = self.concepts.index(concept)
+        except ValueError:
+            return mask
+        mask[self.rows[self.columns == column]] = True
+        return mask
+
+
+def coverage_report(
+    matrix: CoverageMatrix,
+    min_concepts: int = 0,
+    with_concepts: t.Iterable[str] = (),
+) -> t.List[t.Dict[str, t.Any]]:
+    """Report concepts and synonymy of the languages passing the filters
+
+    A language is included if it has forms for at least `min_concepts`
+    concepts, and for each of the concepts in `with_concepts`.
+
+    """
+    concepts = matrix.concepts_per_language()
+    include = concepts >= min_concepts
+    for concept in with_concepts:
+        include &= matrix.languages_with_concept(concept)
+    forms = matrix.forms_per_language()
+    synonymy = matrix.synonymy()
+    return [
+        {
+            "Language_ID": matrix.languages[i],
+            "Concepts": int(concepts[i]),
+            "Forms": int(forms[i]),
+            "Synonymy": float(synonymy[i]),
+        }
+        for i in numpy.flatnonzero(include)
+    ]
+
+
+def write_report(
+    report: t.List[t.Dict[str, t.Any]], out: t.TextIO, format: str = "csv"
+) -> None:
+    if format == "json":
+        json.dump(report, out, ensure_ascii=False, indent=2)
+        out.write("\n")
+    else:
+        writer = csv.DictWriter(out, ["Language_ID", "Concepts", "Forms", "Synonymy"])
+        writer.writeheader()
+        writer.writerows(report)
+
+
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Summarise coverage data")
+    parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
         "--min-concepts",
         default=0,
@@ -47,48 +240,56 @@ if __name__ == "__main__":
         default=False,
         help="Ignore missing forms, i.e. FormTable entries with CLDF #form '?'",
     )
+    parser.add_argument(
+        "--format",
+        choices=("csv", "json"),
+        default="csv",
+        help="Output format of the statistics (default: csv)",
+    )
+    parser.add_argument(
+        "--matrix",
+        action="store_true",
+        default=False,
+        help="Instead of the statistics, output the language × concept matrix of "
+        "form counts of the matching languages as CSV",
+    )
+    parser.add_argument(
+        "--output-file",
+        "-o",
+        type=Path,
+        help="File to write the output to (default: Write to stdout)",
+    )
+    cli.add_log_controls(parser)
     args = parser.parse_args()
+    cli.setup_logging(args)
 
     if args.metadata_or_forms.name == "forms.csv":
         dataset = pycldf.Wordlist.from_data(args.metadata_or_forms)
     else:
         dataset = pycldf.Wordlist.from_metadata(args.metadata)
 
-    languages = {}
-    try:
-        c_l_id = dataset["LanguageTable", "id"].name
-        for language in dataset["LanguageTable"]:
-            languages[language[c_l_id]] = language
-    except KeyError:
-        pass
-
-    concepts: t.DefaultDict[str, t.Counter[str]] = t.DefaultDict(t.Counter)
-    multiple_concepts = bool(dataset["FormTable", "parameterReference"].separator)
-    c_concept = dataset["FormTable", "parameterReference"].name
-    c_language = dataset["FormTable", "languageReference"].name
-    c_form = dataset["FormTable", "form"].name
-    for form in dataset["FormTable"]:
-        languages.setdefault(form[c_language], {})
-        if form[c_form] == "?" and args.missing:
-            continue
-        if multiple_concepts:
-            for c in form[c_concept]:
-                concepts[form[c_language]][c] += 1
+    matrix = CoverageMatrix.from_dataset(dataset, missing=args.missing)
+    report = coverage_report(matrix, args.min_concepts, args.with_concept)
+
+    with contextlib.ExitStack() as stack:
+        if args.output_file is None:
+            out: t.TextIO = sys.stdout
         else:
-            concepts[form[c_language]][form[c_concept]] += 1
-
-    for language, metadata in languages.items():
-        conceptlist = concepts[language]
-        synonyms = sum(conceptlist.values()) / len(conceptlist)
-        include = True
-        if len(conceptlist) < args.min_concepts:
-            include = False
-        for c in args.with_concept:
-            if c not in conceptlist:
-                include = False
-        if not include:
-            continue
+            out = stack.enter_context(
+                args.output_file.open("w", encoding="utf-8", newline="")
+            )
         if args.l:
-            print(language)
+            for language in report:
+                print(language["Language_ID"], file=out)
+        elif args.matrix:
+            dense = matrix.dense()
+            index = {language: i for i, language in enumerate(matrix.languages)}
+            writer = csv.writer(out)
+            writer.writerow(["Language_ID"] + matrix.concepts)
+            for language in report:
+                writer.writerow(
+                    [language["Language_ID"]]
+                    + dense[index[language["Language_ID"]]].tolist()
+                )
         else:
-            print(metadata, len(conceptlist), synonyms)
+            write_report(report, out, format=args.format)
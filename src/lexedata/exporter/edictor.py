@@ -8,7 +8,8 @@ import typing as t
 
 import pycldf
 
-from lexedata.util import parse_segment_slices as segment_slices_to_segment_list
+from lexedata import cli
+from lexedata.util import parse_segment_slices
 
 
 def rename(form_column, dataset):
@@ -44,16 +45,103 @@ def ensure_list(maybe_string: t.Union[t.List[str], str]) -> t.List[str]:
         return [maybe_string]
 
 
+def segment_cognatesets(
+    form_id: str,
+    segments: t.Sequence[str],
+    judgements: t.Iterable[t.Tuple[str, t.Sequence[str]]],
+    logger: cli.logging.Logger = cli.logger,
+) -> t.List[t.Optional[str]]:
+    """Find the cognateset each segment of a form belongs to
+
+    Judgements are (cognateset, segment slices) pairs. Segments that belong to
+    no cognateset are None.
+
+    >>> segment_cognatesets("f", "kitab", [("KI", ["1:2"]), ("TAB", ["3:5"])])
+    ['KI', 'KI', 'TAB', 'TAB', 'TAB']
+    >>> segment_cognatesets("f", "kitab", [("KI", ["1:2"]), ("B", ["5:5"])])
+    ['KI', 'KI', None, None, 'B']
+
+    """
+    owners: t.List[t.Optional[str]] = [None for _ in segments]
+    for cognateset, segment_slice in judgements:
+        for s in parse_segment_slices(segment_slice):
+            if not 0 <= s < len(owners):
+                logger.warning(
+                    f"In judgement of form {form_id} into {cognateset}, segment slice "
+                    f"point outside valid range 1:{len(owners)}."
+                )
+                continue
+            elif s > 0 and cognateset != owners[s - 1] and cognateset in owners:
+                raise ValueError(
+                    f"ERROR: In judgement of form {form_id} into {cognateset}, "
+                    "encountered non-concatenative morphology: Segments of "
+                    "judgement are not contiguous."
+                )
+            elif owners[s]:
+                raise ValueError(
+                    f"ERROR: In judgement of form {form_id} into {cognateset}, "
+                    "encountered non-concatenative morphology: Segments overlap "
+                    f"with cognate set {owners[s]}."
+                )
+            else:
+                owners[s] = cognateset
+    return owners
+
+
+def morphemes(
+    segments: t.Sequence[str],
+    owners: t.Sequence[t.Optional[str]],
+    alignments: t.Mapping[str, t.Sequence[str]],
+) -> t.Tuple[t.List[str], t.List[str], t.List[t.Optional[str]]]:
+    """Split a form into morphemes, the way EDICTOR represents them
+
+    Return the segments and the alignment, with morphemes separated by "+",
+    and the cognateset of each morpheme.
+
+    >>> morphemes("tão", ["TA", "TA", "NO"], {"TA": ["t", "ã"], "NO": ["o"]})
+    (['t', 'ã', '+', 'o'], ['t', 'ã', '+', 'o'], ['TA', 'NO'])
+    >>> morphemes("ab", [None, None], {})
+    (['a', 'b'], ['a', 'b'], [None])
+
+    """
+    out_segments: t.List[str] = []
+    out_alignment: t.List[str] = []
+    out_cognatesets: t.List[t.Optional[str]] = []
+    for segment, cognateset in zip(segments, owners):
+        if not out_cognatesets or out_cognatesets[-1] != cognateset:
+            if out_cognatesets:
+                out_segments.append("+")
+                out_alignment.append("+")
+            out_cognatesets.append(cognateset)
+            if cognateset is not None:
+                out_alignment.extend(alignments[cognateset])
+        if cognateset is None:
+            out_alignment.append(segment)
+        out_segments.append(segment)
+    return out_segments, out_alignment, out_cognatesets or [None]
+
+
 def forms_to_tsv(
     dataset: pycldf.Dataset,
-    languages: t.Iterable[str],
+    languages: t.Container[str],
     concepts: t.Set[str],
-    cognatesets: t.Iterable[str],
+    cognatesets: t.Container[str],
     output_file: Path,
+    logger: cli.logging.Logger = cli.logger,
 ):
+    """Write the selected forms and their cognate judgements to a TSV for EDICTOR
+
+    The cognate judgements are indexed by form first, so that each form can be
+    written as soon as it is read. The language, concept, and cognateset
+    filters are applied while reading the tables.
+
+    """
     # required fields
+    c_cognateset_id = dataset["CognatesetTable", "id"].name
     c_cognate_cognateset = dataset["CognateTable", "cognatesetReference"].name
     c_cognate_form = dataset["CognateTable", "formReference"].name
+    c_cognate_slice = dataset.column_names.cognates.segmentSlice
+    c_cognate_alignment = dataset.column_names.cognates.alignment
     c_form_language = dataset["FormTable", "languageReference"].name
     c_form_concept = dataset["FormTable", "parameterReference"].name
     c_form_id = dataset["FormTable", "id"].name
@@ -66,6 +154,8 @@ def forms_to_tsv(
 
     tsv_header.insert(0, "LINGPY_ID")
     tsv_header.append("cognatesetReference")
+    if "alignment" not in tsv_header:
+        tsv_header.append("alignment")
 
     delimiters = {
         c.name: c.separator
@@ -73,131 +163,105 @@ def forms_to_tsv(
         if c.separator
     }
 
-    # select forms and cognates given restriction of languages and concepts, cognatesets respectively
-    forms = {}
-    for form in dataset["FormTable"]:
-        if form[c_form_language] in languages:
-            if concepts.intersection(ensure_list(form[c_form_concept])):
-                # Normalize the form:
-                # 1. No list-valued entries
-                for c, d in delimiters.items():
-                    if c == c_form_segments:
-                        continue
-                    form[c] = d.join(form[c])
-                # 2. No tabs, newlines in entries
-                for c, v in form.items():
-                    if type(v) == str:
-                        form[c] = form[c].replace("\t", "!t").replace("\n", "!n")
-                forms[form[c_form_id]] = form
-
-    cognateset_cache: t.Dict[t.Optional[str], int] = {
-        cognateset["ID"]: c
+    # EDICTOR needs integer cognateset IDs, 0 meaning no cognateset
+    cognateset_cache: t.Dict[str, int] = {
+        cognateset[c_cognateset_id]: c
         for c, cognateset in enumerate(dataset["CognatesetTable"], 1)
-        if cognateset["ID"] in cognatesets
+        if cognateset[c_cognateset_id] in cognatesets
     }
-    cognateset_cache[None] = 0
-    alignments: t.Dict[t.Tuple[str, str], t.List[str]] = {}
-
-    # load all cognates corresponding to those forms
-    which_segment_belongs_to_which_cognateset: t.Dict[str, t.List[t.Optional[str]]] = {}
-    for j in dataset["CognateTable"]:
-        if j[c_cognate_form] in forms and j[c_cognate_cognateset] in cognateset_cache:
-            form = forms[j[c_cognate_form]]
-            if j[c_cognate_form] not in which_segment_belongs_to_which_cognateset:
-                which_segment_belongs_to_which_cognateset[j[c_cognate_form]] = [
-                    None for _ in form[c_form_segments]
-                ]
-            segments_judged = segment_slices_to_segment_list(
-                segments=form[c_form_segments], judgement=j
-            )
-            for s in segments_judged:
-                if s >= len(
-                    which_segment_belongs_to_which_cognateset[j[c_cognate_form]]
-                ):
-                    print(
-                        f"WARNING: In judgement {j}, segment slice point outside valid range 0:{len(form[c_form_segments])}."
-                    )
-                    continue
-                elif (
-                    s > 0
-                    and j[c_cognate_cognateset]
-                    != which_segment_belongs_to_which_cognateset[j[c_cognate_form]][
-                        s - 1
-                    ]
-                    and j[c_cognate_cognateset]
-                    in which_segment_belongs_to_which_cognateset[j[c_cognate_form]]
-                ):
-                    raise ValueError(
-                        f"ERROR: In judgement {j}, encountered non-concatenative morphology: Segments of judgement are not contiguous."
-                    )
 
-                elif which_segment_belongs_to_which_cognateset[j[c_cognate_form]][s]:
-                    raise ValueError(
-                        f"ERROR: In judgement {j}, encountered non-concatenative morphology: Segments overlap with cognate set {which_segment_belongs_to_which_cognateset[j[c_cognate_form]][s]}."
-                    )
-                else:
-                    which_segment_belongs_to_which_cognateset[j[c_cognate_form]][s] = j[
-                        c_cognate_cognateset
-                    ]
-            alignments[j[c_cognate_form], j[c_cognate_cognateset]] = j["Alignment"] or [
-                s for i, s in enumerate(form[c_form_segments]) if i in segments_judged
-            ]
-
-    # write output to tsv
-    out = csv.DictWriter(
-        output_file.open("w", encoding="utf-8"),
-        fieldnames=tsv_header,
-        delimiter="\t",
-    )
-    out.writerow({column: rename(column, dataset) for column in tsv_header})
-    out_cognatesets: t.List[t.Optional[str]]
-    for c, (form, judgements) in enumerate(
-        which_segment_belongs_to_which_cognateset.items(), 1
+    # Index the judgements of the selected cognatesets by form
+    judgements_by_form: t.Dict[
+        str, t.List[t.Tuple[str, t.Sequence[str], t.Sequence[str]]]
+    ] = {}
+    for j in cli.tq(
+        dataset["CognateTable"],
+        total=dataset["CognateTable"].common_props.get("dc:extent"),
     ):
-        for s, segment_cognateset in enumerate(judgements):
-            if s == 0:
-                if segment_cognateset is None:
-                    out_segments = [forms[form][c_form_segments][s]]
-                    out_alignment = [forms[form][c_form_segments][s]]
-                    out_cognatesets = [None]
-                else:
-                    out_segments = [forms[form][c_form_segments][s]]
-                    out_alignment = alignments[form, segment_cognateset]
-                    out_cognatesets = [segment_cognateset]
-            else:
-                if out_cognatesets[-1] == segment_cognateset:
-                    pass
-                elif out_cognatesets[-1] is None and segment_cognateset is None:
-                    out_alignment.append(forms[form][c_form_segments][s])
-                    pass
-                elif segment_cognateset is None:
-                    out_segments.append("+")
-                    out_alignment.append("+")
-                    out_alignment.append(forms[form][c_form_segments][s])
-                    out_cognatesets.append(None)
-                else:
-                    out_segments.append("+")
-                    out_alignment.append("+")
-                    out_alignment.extend(alignments[form, segment_cognateset])
-                    out_cognatesets.append(segment_cognateset)
-                out_segments.append(forms[form][c_form_segments][s])
-        if out_segments != [s for s in out_alignment if s != "-"]:
-            print(
-                f"WARNING: In form {form}, alignment {out_alignment} did not match segments {out_segments}!"
+        if j[c_cognate_cognateset] not in cognateset_cache:
+            continue
+        judgements_by_form.setdefault(j[c_cognate_form], []).append(
+            (
+                j[c_cognate_cognateset],
+                (j[c_cognate_slice] if c_cognate_slice else None) or [],
+                (j[c_cognate_alignment] if c_cognate_alignment else None) or [],
             )
-        # store original form id in other field and get cogset integer id
-        this_form = forms[form]
-        this_form["LINGPY_ID"] = c
-        # if there is a cogset, add its integer id. otherwise set id to 0
-        this_form["cognatesetReference"] = " ".join(
-            str(cognateset_cache[e]) for e in out_cognatesets
         )
-        this_form["alignment"] = " ".join(out_alignment)
-        this_form[c_form_segments] = " ".join(out_segments)
 
-        # add integer form id
-        this_form["ID"] = c
-        out.writerow(this_form)
+    # write output to tsv, one form at a time
+    with output_file.open("w", encoding="utf-8", newline="") as tsv:
+        out = csv.DictWriter(
+            tsv,
+            fieldnames=tsv_header,
+            delimiter="\t",
+        )
+        out.writerow({column: rename(column, dataset) for column in tsv_header})
+        c = 0
+        for form in cli.tq(
+            dataset["FormTable"],
+            total=dataset["FormTable"].common_props.get("dc:extent"),
+        ):
+            if form[c_form_language] not in languages:
+                continue
+            if not concepts.intersection(ensure_list(form[c_form_concept])):
+                continue
+            segments = form[c_form_segments] or []
+            judgements = judgements_by_form.get(form[c_form_id], [])
+            owners = segment_cognatesets(
+                form[c_form_id],
+                segments,
+                [
+                    # A judgement without segment slice covers the whole form
+                    (cognateset, slice or [f"1:{len(segments)}"])
+                    for cognateset, slice, _ in judgements
+                ],
+                logger=logger,
+            )
+            alignments = {
+                cognateset: alignment
+                or [s for s, owner in zip(segments, owners) if owner == cognateset]
+                for cognateset, _, alignment in judgements
+            }
+            out_segments, out_alignment, out_cognatesets = morphemes(
+                segments, owners, alignments
+            )
+            if not segments and judgements:
+                # Without segments, the form can only be one single morpheme.
+                if len(judgements) > 1:
+                    logger.warning(
+                        f"Form {form[c_form_id]} has no segments, but belongs to "
+                        f"{len(judgements)} cognatesets. Only exporting the first one."
+                    )
+                out_cognatesets = [judgements[0][0]]
+            if [s for s in out_segments if s != "+"] != [
+                s for s in out_alignment if s not in ("-", "+")
+            ]:
+                logger.warning(
+                    f"In form {form[c_form_id]}, alignment {out_alignment} did not "
+                    f"match segments {out_segments}!"
+                )
+
+            # Normalize the form:
+            # 1. No list-valued entries
+            for column, d in delimiters.items():
+                if column == c_form_segments:
+                    continue
+                form[column] = d.join(form[column] or [])
+            # 2. No tabs, newlines in entries
+            for column, v in form.items():
+                if isinstance(v, str):
+                    form[column] = v.replace("\t", "!t").replace("\n", "!n")
+
+            c += 1
+            # store integer form id in other field and get cogset integer id
+            form["LINGPY_ID"] = c
+            # if there is a cogset, add its integer id. otherwise set id to 0
+            form["cognatesetReference"] = " ".join(
+                str(cognateset_cache.get(e, 0)) for e in out_cognatesets
+            )
+            form["alignment"] = " ".join(out_alignment)
+            form[c_form_segments] = " ".join(out_segments)
+            out.writerow(form)
 
 
 if __name__ == "__main__":
@@ -212,27 +276,26 @@ if __name__ == "__main__":
         default="Wordlist-metadata.json",
         help="Path to the JSON metadata file describing the dataset (default: ./Wordlist-metadata.json)",
     )
-    # TODO: set these arguments correctly
     parser.add_argument(
         "--languages",
         type=str,
         nargs="*",
         default=[],
-        help="Language references for form selection",
+        help="Language references for form selection (default: all languages)",
     )
     parser.add_argument(
         "--concepts",
         type=str,
         nargs="*",
         default=[],
-        help="",
+        help="Concept references for form selection (default: all concepts)",
     )
     parser.add_argument(
         "--cognatesets",
         type=str,
         nargs="*",
         default=[],
-        help="",
+        help="Cognateset references to export judgements for (default: all cognatesets)",
     )
     parser.add_argument(
         "--output-file",
@@ -241,13 +304,16 @@ if __name__ == "__main__":
         default="cognate.tsv",
         help="Path to the output file",
     )
+    cli.add_log_controls(parser)
     args = parser.parse_args()
+    logger = cli.setup_logging(args)
     forms_to_tsv(
         dataset=pycldf.Dataset.from_metadata(args.metadata),
-        languages=args.languages or WorldSet(),
-        concepts=args.concepts or WorldSet(),
-        cognatesets=args.cognatesets or WorldSet(),
+        languages=set(args.languages) or WorldSet(),
+        concepts=set(args.concepts) or WorldSet(),
+        cognatesets=set(args.cognatesets) or WorldSet(),
         output_file=args.output_file,
+        logger=logger,
     )
 
 # NON-RUNNING EXAMPLE NOTES FOLLOW
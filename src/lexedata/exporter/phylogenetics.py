@@ -4,11 +4,17 @@ from pathlib import Path
 
 import pycldf
 
-from lexedata import util
 from lexedata import types
 from lexedata import cli
 
-import xml.etree.ElementTree as ET
+import io
+import json
+import array
+import struct
+import xml.sax
+import xml.sax.handler
+from xml.sax.saxutils import XMLGenerator
+from xml.sax.xmlreader import AttributesImpl
 
 try:
     from typing import Literal
@@ -33,6 +39,9 @@ def read_cldf_dataset(
     dataset: pycldf.Dataset,
     code_column: t.Optional[str] = None,
     logger: cli.logging.Logger = cli.logger,
+    cache_file: t.Optional[Path] = None,
+    languages: t.Optional[t.Container[types.Language_ID]] = None,
+    exclude_concepts: t.Container[types.Parameter_ID] = (),
 ) -> t.Mapping[
     types.Language_ID, t.Mapping[types.Parameter_ID, t.Set[types.Cognateset_ID]]
 ]:
@@ -65,6 +74,14 @@ def read_cldf_dataset(
     ----------
     fname : str or Path
         Path to a CLDF dataset
+    cache_file : Path, optional
+        For wordlists, a file to store the parsed cognate data in, so that
+        later runs on the unchanged dataset can skip parsing the tables. See
+        `read_wordlist`.
+    languages : container, optional
+        Only read data of these languages (default: all languages)
+    exclude_concepts : container
+        Skip data for these concepts
 
     Returns
     -------
@@ -82,9 +99,21 @@ def read_cldf_dataset(
 
     # Build actual data dictionary, based on dataset type
     if dataset.module == "Wordlist":
-        return read_wordlist(dataset, code_column, logger=logger)
+        return read_wordlist(
+            dataset,
+            code_column,
+            logger=logger,
+            cache_file=cache_file,
+            languages=languages,
+            exclude_concepts=exclude_concepts,
+        )
     elif dataset.module == "StructureDataset":
-        return read_structure_dataset(dataset, logger=logger)
+        return read_structure_dataset(
+            dataset,
+            logger=logger,
+            languages=languages,
+            exclude_concepts=exclude_concepts,
+        )
     else:
         raise ValueError("Module {:} not supported".format(dataset.module))
 
@@ -99,17 +128,43 @@ def read_wordlist(
     ],
     code_column: t.Optional[str],
     logger: cli.logging.Logger = cli.logger,
+    cache_file: t.Optional[Path] = None,
+    languages: t.Optional[t.Container[types.Language_ID]] = None,
+    exclude_concepts: t.Container[types.Parameter_ID] = (),
 ) -> t.MutableMapping[types.Language_ID, t.MutableMapping[types.Parameter_ID, t.Set]]:
+    """Load the cognate classes of a wordlist
+
+    Return a mapping {Language ID: {Concept ID: {Cognateset ID}}}.
+
+    Only forms of the given `languages` (default: all languages) are read, and
+    concepts in `exclude_concepts` are skipped. Cognate judgements are only
+    kept for forms that pass these filters.
+
+    If `cache_file` is given and it contains the data of an unchanged version
+    of the relevant tables (compared by file size and modification time), load
+    the data from there instead of parsing the dataset. Otherwise, parse the
+    dataset and (re-)write the cache file. The cache always contains the whole
+    dataset, the filters are applied afterwards.
+
+    """
+    if cache_file is not None:
+        cache_key = wordlist_cache_key(dataset, code_column)
+        data = load_wordlist_cache(cache_file, cache_key)
+        if data is None:
+            data = read_wordlist(dataset, code_column, logger=logger)
+            write_wordlist_cache(cache_file, cache_key, data)
+        else:
+            logger.info(f"Loaded cognate data from cache {cache_file}.")
+        return filter_wordlist(data, languages, exclude_concepts)
+
     col_map = dataset.column_names
 
+    judgements_column: t.Optional[str] = None
     if code_column:
         # Just in case that column was specified by property URL. We
         # definitely want the name. In any case, this will also throw a
         # helpful KeyError when the column does not exist.
-        cognatesets = util.cache_table(
-            dataset,
-            {"form": col_map.forms.id, "code": dataset["FormTable", code_column].name},
-        )
+        code_column = dataset["FormTable", code_column].name
         target = col_map.forms.id
     else:
         # We search for cognatesetReferences in the FormTable or a separate
@@ -123,9 +178,6 @@ def read_wordlist(
             logger.warning(
                 "Your dataset has a cognatesetReference in the FormTable. Consider running lexedata.enrich.explict_cognate_judgements to create an explicit cognate table, if this is your dataset."
             )
-            cognatesets = util.cache_table(
-                dataset, {"form": col_map.forms.id, "code": code_column}
-            )
             target = col_map.forms.id
         else:
             # There was no cognatesetReference in the form table. If we
@@ -136,19 +188,14 @@ def read_wordlist(
                 and col_map.cognates.cognatesetReference
                 and col_map.cognates.formReference
             ):
-                code_column = col_map.cognates.cognatesetReference
+                judgements_column = col_map.cognates.cognatesetReference
                 form_reference = col_map.cognates.formReference
                 (foreign_key,) = [
                     key
                     for key in dataset["CognateTable"].tableSchema.foreignKeys
-                    if key.columnReference == [code_column]
+                    if key.columnReference == [judgements_column]
                 ]
                 (target,) = foreign_key.reference.columnReference
-                cognatesets = util.cache_table(
-                    dataset,
-                    {"form": form_reference, "code": code_column},
-                    "CognateTable",
-                )
             else:
                 raise ValueError(
                     "Dataset {:} has no cognatesetReference column in its "
@@ -157,12 +204,6 @@ def read_wordlist(
                     "specify code_column explicitly?".format(dataset.tableSchema._fname)
                 )
 
-    # Cognate sets have been loaded. Consolidate.
-    cognates_by_form: t.MutableMapping[
-        types.Form_ID, t.Set[types.Cognateset_ID]
-    ] = t.DefaultDict(set)
-    for judgement in cognatesets.values():
-        cognates_by_form[judgement["form"]].add(judgement["code"])
     parameter_column = col_map.forms.parameterReference
 
     # If one form can have multiple concepts,
@@ -176,18 +217,175 @@ def read_wordlist(
         def all_parameters(parameter):
             return [parameter]
 
+    # Stream the FormTable, keeping only the forms that pass the filters. If
+    # the codes are in the FormTable, they are read in the same pass;
+    # otherwise, remember where each form's cognate sets need to go.
     data: t.MutableMapping[
         types.Language_ID, t.MutableMapping[types.Parameter_ID, t.Set]
     ] = t.DefaultDict(lambda: t.DefaultDict(set))
+    targets: t.MutableMapping[
+        types.Form_ID, t.List[t.Set[types.Cognateset_ID]]
+    ] = t.DefaultDict(list)
     for row in dataset["FormTable"].iterdicts():
         language = row[col_map.forms.languageReference]
+        if languages is not None and language not in languages:
+            continue
+        lexicon = data[language]
         for parameter in all_parameters(row[parameter_column]):
-            data[language][parameter] |= cognates_by_form[row[target]]
+            if parameter in exclude_concepts:
+                continue
+            if judgements_column is None:
+                lexicon[parameter].add(row[code_column])
+            else:
+                targets[row[target]].append(lexicon[parameter])
+
+    # Read judgements, but only for forms we kept.
+    if judgements_column is not None:
+        for judgement in dataset["CognateTable"].iterdicts():
+            for cognatesets in targets.get(judgement[form_reference], ()):
+                cognatesets.add(judgement[judgements_column])
+    return data
+
+
+def filter_wordlist(
+    data: t.MutableMapping[
+        types.Language_ID, t.MutableMapping[types.Parameter_ID, t.Set]
+    ],
+    languages: t.Optional[t.Container[types.Language_ID]] = None,
+    exclude_concepts: t.Container[types.Parameter_ID] = (),
+) -> t.MutableMapping[types.Language_ID, t.MutableMapping[types.Parameter_ID, t.Set]]:
+    """Restrict loaded data to some languages, without some concepts
+
+    >>> filter_wordlist(
+    ...     {"l1": {"m1": {"c1"}, "m2": {"c2"}}, "l2": {"m1": {"c3"}}},
+    ...     languages={"l1"}, exclude_concepts={"m2"})
+    {'l1': {'m1': {'c1'}}}
+
+    """
+    if languages is None and not exclude_concepts:
+        return data
+    return {
+        language: {
+            concept: cognatesets
+            for concept, cognatesets in lexicon.items()
+            if concept not in exclude_concepts
+        }
+        for language, lexicon in data.items()
+        if languages is None or language in languages
+    }
+
+
+# A cache file consists of the magic bytes, the length of the header, the JSON
+# header (cache key and string table), and then a flat array of (language,
+# concept, cognateset) integer triples indexing the string table.
+CACHE_MAGIC = b"lexedata-wordlist-cache-1\n"
+CACHE_TYPECODE = "i"
+NO_COGNATESET = -1
+
+
+def wordlist_cache_key(
+    dataset: pycldf.Wordlist, code_column: t.Optional[str] = None
+) -> t.List[t.Any]:
+    """Describe the state of the files a wordlist's cognate data is read from
+
+    The key contains size and modification time of the metadata file, the
+    FormTable and the CognateTable (if it exists), and the code column.
+
+    """
+    files = [
+        dataset[component].url.resolve(dataset.directory)
+        for component in ("FormTable", "CognateTable")
+        if dataset.get(component) is not None
+    ]
+    if dataset.tablegroup._fname:
+        files.append(dataset.tablegroup._fname)
+    key: t.List[t.Any] = [code_column]
+    for file in files:
+        stat = Path(file).stat()
+        key.append([str(file), stat.st_size, stat.st_mtime_ns])
+    return key
+
+
+def write_wordlist_cache(
+    cache_file: Path,
+    key: t.List[t.Any],
+    data: t.Mapping[
+        types.Language_ID, t.Mapping[types.Parameter_ID, t.Set[types.Cognateset_ID]]
+    ],
+) -> None:
+    """Write cognate data to a cache file, as interned integer triples"""
+    strings: t.Dict[t.Hashable, int] = {}
+
+    def intern(string: t.Hashable) -> int:
+        return strings.setdefault(string, len(strings))
+
+    triples = array.array(CACHE_TYPECODE)
+    for language, lexicon in data.items():
+        for concept, cognatesets in lexicon.items():
+            if not cognatesets:
+                triples.extend((intern(language), intern(concept), NO_COGNATESET))
+            for cognateset in cognatesets:
+                triples.extend((intern(language), intern(concept), intern(cognateset)))
+
+    header = json.dumps({"key": key, "strings": list(strings)}).encode("utf-8")
+    temporary = Path(cache_file).with_name(Path(cache_file).name + ".tmp")
+    with temporary.open("wb") as cache:
+        cache.write(CACHE_MAGIC)
+        cache.write(struct.pack("<Q", len(header)))
+        cache.write(header)
+        triples.tofile(cache)
+    temporary.replace(cache_file)
+
+
+def load_wordlist_cache(
+    cache_file: Path, key: t.List[t.Any]
+) -> t.Optional[
+    t.MutableMapping[types.Language_ID, t.MutableMapping[types.Parameter_ID, t.Set]]
+]:
+    """Load cognate data from a cache file, if it matches the key
+
+    Return None if the cache file is missing, unreadable, or stale.
+
+    >>> import tempfile
+    >>> cache_file = Path(tempfile.mkdtemp()) / "cache"
+    >>> write_wordlist_cache(cache_file, ["k"], {"l1": {"m1": {"c1"}, "m2": set()}})
+    >>> data = load_wordlist_cache(cache_file, ["k"])
+    >>> {language: dict(lexicon) for language, lexicon in data.items()}
+    {'l1': {'m1': {'c1'}, 'm2': set()}}
+    >>> load_wordlist_cache(cache_file, ["other key"]) is None
+    True
+
+    """
+    try:
+        with Path(cache_file).open("rb") as cache:
+            if cache.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+                return None
+            (header_length,) = struct.unpack("<Q", cache.read(8))
+            header = json.loads(cache.read(header_length).decode("utf-8"))
+            if header["key"] != key:
+                return None
+            triples = array.array(CACHE_TYPECODE)
+            triples.frombytes(cache.read())
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+    strings = header["strings"]
+    data: t.MutableMapping[
+        types.Language_ID, t.MutableMapping[types.Parameter_ID, t.Set]
+    ] = t.DefaultDict(lambda: t.DefaultDict(set))
+    entries = iter(triples)
+    for language, concept, cognateset in zip(entries, entries, entries):
+        cognatesets = data[strings[language]][strings[concept]]
+        if cognateset != NO_COGNATESET:
+            cognatesets.add(strings[cognateset])
     return data
 
 
 def read_structure_dataset(
-    dataset: pycldf.Wordlist, logger: cli.logging.Logger = cli.logger
+    dataset: pycldf.Wordlist,
+    logger: cli.logging.Logger = cli.logger,
+    languages: t.Optional[t.Container[types.Language_ID]] = None,
+    exclude_concepts: t.Container[types.Parameter_ID] = (),
 ) -> t.MutableMapping[types.Language_ID, t.MutableMapping[types.Parameter_ID, t.Set]]:
     col_map = dataset.column_names
     data: t.MutableMapping[
@@ -196,7 +394,11 @@ def read_structure_dataset(
     code_column = col_map.values.codeReference or col_map.values.value
     for row in dataset["ValueTable"]:
         lang_id = row[col_map.values.languageReference]
+        if languages is not None and lang_id not in languages:
+            continue
         feature_id = row[col_map.values.parameterReference]
+        if feature_id in exclude_concepts:
+            continue
         if row[code_column]:
             data[lang_id][feature_id].add(row[code_column])
     return data
@@ -248,6 +450,110 @@ def root_meaning_code(
     >>> list(zip(*sorted(zip(*alignment.values()))))
     [('0', '0', '1', '?', '?'), ('0', '1', '0', '1', '1')]
 
+    """
+    sparse, blocks = root_meaning_code_sparse(dataset, core_concepts, ascertainment)
+    alignment: t.Dict[types.Language_ID, t.List[Literal["0", "1", "?"]]] = {
+        language: list(sequence) for language, sequence in sparse.items()
+    }
+    return alignment, blocks
+
+
+class SparseBinaryAlignment(t.Mapping[types.Language_ID, str]):
+    """A binary alignment consisting of blocks of characters, stored sparsely
+
+    For every language and every block of characters (eg. all roots of one
+    concept), the block is either entirely missing ('?'), or it is attested
+    with '1' at some positions and '0' everywhere else in the block. Only the
+    attested blocks and the '1' positions are stored. The dense sequence of a
+    language is built when it is accessed.
+
+    >>> alignment = SparseBinaryAlignment(
+    ...     ["0"], {"m1": (1, 2), "m2": (3, 3)},
+    ...     {"l1": {"m1": [2]}, "l2": {"m1": [], "m2": [3, 5]}})
+    >>> dict(alignment)
+    {'l1': '001???', 'l2': '000101'}
+    >>> alignment.n_characters
+    6
+    >>> alignment.counts()
+    {'1': 3, '0': 6, '?': 3}
+
+    """
+
+    def __init__(
+        self,
+        ascertainment: t.Sequence[Literal["0", "1", "?"]],
+        blocks: t.Mapping[t.Hashable, t.Tuple[int, int]],
+        rows: t.Mapping[types.Language_ID, t.Mapping[t.Hashable, t.Sequence[int]]],
+    ) -> None:
+        self.ascertainment = "".join(ascertainment)
+        self.blocks = blocks
+        self.rows = rows
+        self.n_characters = len(self.ascertainment) + sum(
+            length for start, length in blocks.values()
+        )
+
+    def __getitem__(self, language: types.Language_ID) -> str:
+        sequence = bytearray(b"?" * self.n_characters)
+        sequence[: len(self.ascertainment)] = self.ascertainment.encode("ascii")
+        for block, ones in self.rows[language].items():
+            start, length = self.blocks[block]
+            sequence[start : start + length] = b"0" * length
+            for i in ones:
+                sequence[i] = ord("1")
+        return sequence.decode("ascii")
+
+    def __iter__(self) -> t.Iterator[types.Language_ID]:
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def counts(self) -> t.Dict[Literal["0", "1", "?"], int]:
+        """Count the characters of each kind in the alignment
+
+        This only looks at the stored entries, not at the dense sequences.
+
+        """
+        counts: t.Dict[Literal["0", "1", "?"], int] = {"1": 0, "0": 0, "?": 0}
+        for character in self.ascertainment:
+            counts[character] += len(self.rows)  # type: ignore
+        for row in self.rows.values():
+            attested = 0
+            for block, ones in row.items():
+                attested += self.blocks[block][1]
+                counts["1"] += len(ones)
+                counts["0"] -= len(ones)
+            counts["0"] += attested
+            counts["?"] += self.n_characters - len(self.ascertainment) - attested
+        return counts
+
+
+def root_meaning_code_sparse(
+    dataset: t.Mapping[
+        types.Language_ID, t.Mapping[types.Parameter_ID, t.Set[types.Cognateset_ID]]
+    ],
+    core_concepts: t.Optional[t.Set[types.Parameter_ID]] = None,
+    ascertainment: t.Sequence[Literal["0", "1", "?"]] = ["0"],
+) -> t.Tuple[
+    SparseBinaryAlignment,
+    t.Mapping[types.Parameter_ID, t.Mapping[types.Cognateset_ID, int]],
+]:
+    """Create a root-meaning coding, as block-sparse alignment
+
+    This is the same coding as `root_meaning_code`, but the alignment is a
+    SparseBinaryAlignment, which stores only the attested concepts of each
+    language and the positions of the roots used for them.
+
+    >>> alignment, concepts = root_meaning_code_sparse(
+    ...   {"l1": {"m1": {"c1"}},
+    ...    "l2": {"m1": {"c2"}, "m2": {"c1", "c3"}}})
+    >>> alignment.n_characters
+    5
+    >>> alignment.rows["l1"] == {"m1": [concepts["m1"]["c1"]]}
+    True
+    >>> sorted(alignment.rows["l2"]["m2"]) == sorted(concepts["m2"].values())
+    True
+
     """
     roots: t.Dict[types.Parameter_ID, t.Set[types.Cognateset_ID]] = {}
     for language, lexicon in dataset.items():
@@ -256,26 +562,22 @@ def root_meaning_code(
                 roots.setdefault(concept, set()).update(cognatesets)
 
     blocks = {}
-    sorted_roots: t.Dict[types.Parameter_ID, t.List[types.Cognateset_ID]] = {}
+    spans: t.Dict[types.Parameter_ID, t.Tuple[int, int]] = {}
     c = len(ascertainment)
     for concept in sorted(roots, key=hash):
         possible_roots = sorted(roots[concept], key=hash)
-        sorted_roots[concept] = possible_roots
         blocks[concept] = {root: r for r, root in enumerate(possible_roots, c)}
+        spans[concept] = (c, len(possible_roots))
         c += len(possible_roots)
 
-    alignment: t.Dict[types.Language_ID, t.List[Literal["0", "1", "?"]]] = {}
+    rows: t.Dict[types.Language_ID, t.Dict[types.Parameter_ID, t.List[int]]] = {}
     for language, lexicon in dataset.items():
-        alignment[language] = list(ascertainment)
-        for concept, possible_roots in sorted_roots.items():
-            entries = lexicon.get(concept)
-            if entries is None:
-                alignment[language].extend(["?" for _ in possible_roots])
-            else:
-                alignment[language].extend(
-                    ["1" if k in entries else "0" for k in possible_roots]
-                )
-    return alignment, blocks
+        rows[language] = {
+            concept: sorted(blocks[concept][root] for root in entries)
+            for concept, entries in lexicon.items()
+            if concept in blocks
+        }
+    return SparseBinaryAlignment(ascertainment, spans, rows), blocks
 
 
 def root_presence_code(
@@ -528,27 +830,320 @@ End;
     )
 
 
-def fill_beast(data_object: ET.Element):
-    data_object.clear()
-    data_object.attrib = {
-        "id": "vocabulary",
-        "dataType": "integer",
-        "spec": "Alignment",
-    }
-    data_object.text = "\n"
-    for language, sequence in alignment.items():
-        seq = "".join(sequence)
-        ET.SubElement(
-            data_object,
-            "sequence",
-            id=f"language_data_vocabulary:{language:}",
-            taxon=f"{language:}",
-            value=f"{seq:}",
-        ).tail = "\n"
-
-    taxa = ET.SubElement(data_object, "taxonset", id="taxa", spec="TaxonSet")
-    for lang in alignment:
-        ET.SubElement(taxa, "taxon", id=f"{lang:}", spec="Taxon")
+class BeastDataInjector(XMLGenerator):
+    """Copy a BEAST XML file, replacing its first <data> element.
+
+    This is a SAX handler: The template is streamed from the parser to the
+    output, and the new alignment is written element by element, so neither is
+    ever held in memory as a tree. If the template contains no <data> element,
+    the alignment is added at the end of the root element.
+
+    """
+
+    def __init__(
+        self, out: t.TextIO, write_data: t.Callable[[XMLGenerator], None]
+    ) -> None:
+        super().__init__(out, encoding="utf-8", short_empty_elements=True)
+        self.write_data = write_data
+        self.replaced = False
+        self.depth = 0
+        self.skip_depth = 0
+
+    def startElement(self, name, attrs):
+        self.depth += 1
+        if self.skip_depth:
+            self.skip_depth += 1
+        elif name == "data" and not self.replaced:
+            self.replaced = True
+            self.write_data(self)
+            self.skip_depth = 1
+        else:
+            super().startElement(name, attrs)
+
+    def endElement(self, name):
+        self.depth -= 1
+        if self.skip_depth:
+            self.skip_depth -= 1
+            return
+        if self.depth == 0 and not self.replaced:
+            self.replaced = True
+            self.write_data(self)
+            self.characters("\n")
+        super().endElement(name)
+
+    def characters(self, content):
+        if not self.skip_depth:
+            super().characters(content)
+
+    def ignorableWhitespace(self, content):
+        if not self.skip_depth:
+            super().ignorableWhitespace(content)
+
+    def processingInstruction(self, target, data):
+        if not self.skip_depth:
+            super().processingInstruction(target, data)
+
+    # Lexical handler interface, so comments in the template survive.
+    def comment(self, content):
+        if not self.skip_depth:
+            # ignorableWhitespace writes its argument unescaped.
+            super().ignorableWhitespace("<!--{:}-->".format(content))
+
+    def startDTD(self, name, public_id, system_id):
+        pass
+
+    def endDTD(self):
+        pass
+
+    def startCDATA(self):
+        pass
+
+    def endCDATA(self):
+        pass
+
+
+def write_beast_data(
+    writer: XMLGenerator,
+    sequences: t.Mapping[types.Language_ID, str],
+    datatype: str = "binary",
+    partitions: t.Optional[t.Mapping[str, t.Iterable[int]]] = None,
+    id: str = "vocabulary",
+) -> None:
+    """Write the alignment as BEAST <data> element(s) to an XML stream
+
+    Without partitions, write one <data> element containing the whole
+    sequences. With partitions, write one <data> element per partition,
+    containing for each language only the characters at the given indices.
+    Partitioning assumes a coding with one character per site.
+
+    """
+    if partitions is None:
+        blocks: t.List[t.Tuple[str, t.Optional[t.Iterable[int]]]] = [(id, None)]
+    else:
+        # Every partition needs every sequence, so expand lazily built
+        # sequences (like those of a SparseBinaryAlignment) only once.
+        sequences = dict(sequences)
+        blocks = [
+            ("{:}:{:}".format(id, partition), list(indices))
+            for partition, indices in partitions.items()
+        ]
+    for b, (block_id, indices) in enumerate(blocks):
+        writer.startElement(
+            "data",
+            AttributesImpl(
+                {
+                    "id": block_id,
+                    "dataType": "binary" if datatype == "binary" else "integer",
+                    "spec": "Alignment",
+                }
+            ),
+        )
+        writer.characters("\n")
+        for language, sequence in sequences.items():
+            if indices is not None:
+                sequence = "".join(sequence[i] for i in indices)
+            writer.startElement(
+                "sequence",
+                AttributesImpl(
+                    {
+                        "id": f"language_data_{block_id:}:{language:}",
+                        "taxon": f"{language:}",
+                        "value": f"{sequence:}",
+                    }
+                ),
+            )
+            writer.endElement("sequence")
+            writer.characters("\n")
+        # The taxon set is only defined once, otherwise the IDs would clash.
+        if b == 0:
+            writer.startElement(
+                "taxonset", AttributesImpl({"id": "taxa", "spec": "TaxonSet"})
+            )
+            for language in sequences:
+                writer.startElement(
+                    "taxon", AttributesImpl({"id": f"{language:}", "spec": "Taxon"})
+                )
+                writer.endElement("taxon")
+            writer.endElement("taxonset")
+            writer.characters("\n")
+        writer.endElement("data")
+
+
+def fill_beast(
+    template: t.Optional[t.Union[Path, t.BinaryIO]],
+    output: t.TextIO,
+    sequences: t.Mapping[types.Language_ID, str],
+    datatype: str = "binary",
+    partitions: t.Optional[t.Mapping[str, t.Iterable[int]]] = None,
+) -> None:
+    """Inject an alignment into a BEAST XML template, streaming the output
+
+    Copy the template to `output`, replacing the first <data> element by the
+    alignment. Without a template, write a minimal <beast> document.
+
+    >>> import io
+    >>> out = io.StringIO()
+    >>> fill_beast(
+    ...     io.BytesIO(b"<beast><!-- c --><data id='old'><sequence/></data><run/></beast>"),
+    ...     out, {"l1": "011", "l2": "0?0"}, partitions={"m1": [0, 1], "m2": [0, 2]})
+    >>> print(out.getvalue())
+    <?xml version="1.0" encoding="utf-8"?>
+    <beast><!-- c --><data id="vocabulary:m1" dataType="binary" spec="Alignment">
+    <sequence id="language_data_vocabulary:m1:l1" taxon="l1" value="01"/>
+    <sequence id="language_data_vocabulary:m1:l2" taxon="l2" value="0?"/>
+    <taxonset id="taxa" spec="TaxonSet"><taxon id="l1" spec="Taxon"/><taxon id="l2" spec="Taxon"/></taxonset>
+    </data><data id="vocabulary:m2" dataType="binary" spec="Alignment">
+    <sequence id="language_data_vocabulary:m2:l1" taxon="l1" value="01"/>
+    <sequence id="language_data_vocabulary:m2:l2" taxon="l2" value="00"/>
+    </data><run/></beast>
+
+    """
+    handler = BeastDataInjector(
+        output,
+        lambda writer: write_beast_data(
+            writer, sequences, datatype=datatype, partitions=partitions
+        ),
+    )
+    parser = xml.sax.make_parser()
+    parser.setContentHandler(handler)
+    parser.setProperty(xml.sax.handler.property_lexical_handler, handler)
+    if template is None:
+        template = io.BytesIO(b"<beast>\n</beast>")
+    elif isinstance(template, Path):
+        template = str(template)
+    parser.parse(template)
+
+
+def export_alignment(
+    ds: t.Mapping[
+        types.Language_ID, t.Mapping[types.Parameter_ID, t.Set[types.Cognateset_ID]]
+    ],
+    coding: Literal["rootmeaning", "rootpresence", "multistate"] = "rootmeaning",
+    format: Literal["raw", "nexus", "beast"] = "raw",
+    output_file: t.Optional[Path] = None,
+    partitioned: bool = False,
+    stats_file: t.Optional[Path] = None,
+) -> None:
+    """Code loaded cognate data and write the alignment to a file
+
+    Write to stdout if `output_file` is None. For the `beast` format, an
+    existing output file is used as template, and its first <data> tag is
+    replaced.
+
+    """
+    n_symbols, datatype = 2, "binary"
+    partitions = None
+
+    # Step 1: Code the data
+    alignment: t.Mapping[types.Language_ID, str]
+    if coding == "rootpresence":
+        binal, cogset_indices = root_presence_code(ds)
+        n_characters = len(next(iter(binal.values())))
+        alignment = {key: "".join(value) for key, value in binal.items()}
+    elif coding == "rootmeaning":
+        # The sparse alignment expands each language's sequence only when it
+        # is written.
+        sparse, concept_cogset_indices = root_meaning_code_sparse(ds)
+        n_characters = sparse.n_characters
+        alignment = sparse
+        partitions = {
+            concept: cogsets.values()
+            for concept, cogsets in concept_cogset_indices.items()
+        }
+    elif coding == "multistate":
+        multial, concept_indices = multistate_code(ds)
+        n_characters = len(next(iter(multial.values())))
+        sequences, n_symbols = raw_multistate_alignment(multial, long_sep=",")
+        alignment = dict(zip(multial, sequences))
+        datatype = "multistate"
+    else:
+        raise ValueError("Coding schema {:} unknown.".format(coding))
+
+    # Step 2: Format the data for output
+    if format == "raw":
+        max_length = max([len(str(lang)) for lang in alignment])
+        with cli.open_output(output_file) as out:
+            for language, sequence in alignment.items():
+                print(
+                    language,
+                    " " * (max_length - len(language)),
+                    sequence,
+                    file=out,
+                )
+
+    elif format == "nexus":
+        with cli.open_output(output_file) as out:
+            out.write(
+                format_nexus(
+                    list(alignment),
+                    alignment.values(),
+                    n_symbols=n_symbols,
+                    n_characters=n_characters,
+                    datatype=datatype,
+                    partitions=partitions,
+                )
+            )
+
+    elif format == "beast":
+        if partitioned and partitions:
+            # Keep the constant ascertainment column in every partition.
+            beast_partitions = {
+                concept: [0, *indices] for concept, indices in partitions.items()
+            }
+        else:
+            beast_partitions = None
+        if output_file is None:
+            fill_beast(
+                None,
+                sys.stdout,
+                alignment,
+                datatype=datatype,
+                partitions=beast_partitions,
+            )
+        else:
+            template = output_file if output_file.exists() else None
+            temporary = output_file.with_name(output_file.name + ".tmp")
+            with temporary.open("w", encoding="utf-8") as out:
+                fill_beast(
+                    template,
+                    out,
+                    alignment,
+                    datatype=datatype,
+                    partitions=beast_partitions,
+                )
+            temporary.replace(output_file)
+
+    # Step 3: Maybe print some statistics to file.
+    if stats_file:
+        countlects = len(ds)
+        countconcepts = len(next(iter(ds.values())))
+        if isinstance(alignment, SparseBinaryAlignment):
+            counts = alignment.counts()
+        elif datatype == "binary":
+            counts = {
+                c: sum(sequence.count(c) for sequence in alignment.values())
+                for c in "10?"
+            }
+        else:
+            counts = None
+        with stats_file.open("w") as s:
+            print(
+                f"""
+            \\newcommand{{\\countlects}}{{{countlects}}}
+            \\newcommand{{\\countconcepts}}{{{countconcepts}}}
+            \\newcommand{{\\ncharacters}}{{{n_characters}}}
+            """,
+                file=s,
+            )
+            if counts is not None:
+                print(
+                    f"""
+            \\newcommand{{\\countpresent}}{{{counts["1"]}}}
+            \\newcommand{{\\countabsent}}{{{counts["0"]}}}
+            \\newcommand{{\\countmissing}}{{{counts["?"]}}}
+            """,
+                    file=s,
+                )
 
 
 if __name__ == "__main__":
@@ -616,111 +1211,47 @@ if __name__ == "__main__":
             each character describes, possibly including uniform ambiguities,
             the cognate class of a meaning.""",
     )
+    parser.add_argument(
+        "--partitioned",
+        action="store_true",
+        default=False,
+        help="""With --format=beast and --coding=rootmeaning, write one <data> tag
+            per concept instead of a single alignment.""",
+    )
+    parser.add_argument(
+        "--cache-file",
+        type=Path,
+        default=None,
+        help="""Store the cognate data parsed from the dataset in this file, and load it
+            from there in later runs as long as the dataset is unchanged.""",
+    )
     parser.add_argument("--stats-file", type=Path, help="A file to write statistics to")
     args = parser.parse_args()
     cli.setup_logging(args)
 
-    # Step 1: Prepare the output file. This only matters if the output is beast.
-    if args.format == "beast":
-        if args.output_file is None:
-            root = ET.fromstring("<beast><data /></beast>")
-            et = ET.ElementTree(root)
-        elif args.output_file.exists():
-            et = ET.parse(args.output_file)
-            root = et.getroot()
-        else:
-            root = ET.fromstring("<beast><data /></beast>")
-            et = ET.ElementTree(root)
-        datas = list(root.iter("data"))
-        data_object = datas[0]
-    # Otherwise, it's just making the file accessible.
-    elif args.output_file is None:
-        args.output_file = sys.stdout
-    else:
-        args.output_file = args.output_file.open("w")
-
-    # Step 2: Load the raw data.
-    ds: t.Mapping[
-        Language_ID, t.Mapping[Language_ID, t.Set[Language_ID]]
-    ] = read_cldf_dataset(args.metadata, code_column=args.code_column)
-
-    languages: t.Set[str]
+    # Step 1: Load the raw data, filtering languages and concepts while reading.
+    languages: t.Optional[t.Set[str]]
     if args.languages_list:
         languages = {lg.strip() for lg in args.languages_list.open().read().split("\n")}
     else:
-        languages = set(ds.keys())
-
-    # Step 3: Filter the data.
-    ds = {
-        language: {k: v for k, v in sequence.items() if k not in args.exclude_concept}
-        for language, sequence in ds.items()
-        if (languages is None) or (language in languages)
-    }
-
-    n_symbols, datatype = 2, "binary"
-    partitions = None
+        languages = None
 
-    # Step 3: Code the data
-    alignment: t.Mapping[Language_ID, str]
-    if args.coding == "rootpresence":
-        binal, cogset_indices = root_presence_code(ds)
-        n_characters = len(next(iter(binal.values())))
-        alignment = {key: "".join(value) for key, value in binal.items()}
-        sequences = raw_binary_alignment(alignment)
-    elif args.coding == "rootmeaning":
-        binal, concept_cogset_indices = root_meaning_code(ds)
-        n_characters = len(next(iter(binal.values())))
-        alignment = {key: "".join(value) for key, value in binal.items()}
-        sequences = raw_binary_alignment(alignment)
-        partitions = {
-            concept: cogsets.values()
-            for concept, cogsets in concept_cogset_indices.items()
-        }
-    elif args.coding == "multistate":
-        multial, concept_indices = multistate_code(ds)
-        n_characters = len(next(iter(multial.values())))
-        sequences, n_symbols = raw_multistate_alignment(multial, long_sep=",")
-        datatype = "multistate"
-    else:
-        raise ValueError("Coding schema {:} unknown.".format(args.coding))
-
-    # Step 4: Format the data for output
-    if args.format == "raw":
-        max_length = max([len(str(lang)) for lang in ds])
-        for language, sequence in zip(ds, sequences):
-            print(
-                language,
-                " " * (max_length - len(language)),
-                sequence,
-                file=args.output_file,
-            )
-
-    elif args.format == "nexus":
-        args.output_file.write(
-            format_nexus(
-                ds,
-                sequences,
-                n_symbols=n_symbols,
-                n_characters=n_characters,
-                datatype=datatype,
-                partitions=partitions,
-            )
-        )
-
-    elif args.format == "beast":
-        et = fill_beast(data_object)
-        et.write(args.output_file, encoding="unicode")
+    ds: t.Mapping[
+        Language_ID, t.Mapping[Language_ID, t.Set[Language_ID]]
+    ] = read_cldf_dataset(
+        pycldf.Dataset.from_metadata(args.metadata),
+        code_column=args.code_column,
+        cache_file=args.cache_file,
+        languages=languages,
+        exclude_concepts=set(args.exclude_concept),
+    )
 
-    # Step 5: Maybe print some statistics to file.
-    if args.stats_file:
-        countlects = len(ds)
-        countconcepts = len(next(iter(ds.values())))
-        with args.stats_file.open("w") as s:
-            print(
-                f"""
-            \\newcommand{{\\countlects}}{{{countlects}}}
-            \\newcommand{{\\countconcepts}}{{{countconcepts}}}
-            \\newcommand{{\\ncharacters}}{{{n_characters}}}
-            """,
-                file=s,
-            )
+    # Step 2: Code the data and write it in the target format.
+    export_alignment(
+        ds,
+        coding=args.coding,
+        format=args.format,
+        output_file=args.output_file,
+        partitioned=args.partitioned,
+        stats_file=args.stats_file,
+    )
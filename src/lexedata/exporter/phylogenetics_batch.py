@@ -0,0 +1,193 @@
+"""Run several phylogenetic exports of one dataset in one go
+
+The job list is a JSON file containing a list of objects, one per export, such
+as
+
+    [{"coding": "rootmeaning", "format": "nexus", "output_file": "rm.nex"},
+     {"coding": "multistate", "format": "beast", "output_file": "ms.xml",
+      "languages": ["ache", "kaiwa"], "exclude_concepts": ["one"]}]
+
+Each job accepts the keys `coding`, `format`, `output_file`, `partitioned`,
+`stats_file`, `languages` (a list of language IDs, or the name of a file with
+one language ID per line, like --languages-list) and `exclude_concepts`.
+Relative paths are interpreted relative to the job file.
+
+"""
+import sys
+import json
+import time
+import typing as t
+from pathlib import Path
+import concurrent.futures
+
+import pycldf
+
+from lexedata import cli
+from lexedata import types
+from lexedata.exporter.phylogenetics import (
+    read_cldf_dataset,
+    filter_wordlist,
+    export_alignment,
+)
+
+JOB_KEYS = {
+    "coding",
+    "format",
+    "output_file",
+    "partitioned",
+    "stats_file",
+    "languages",
+    "exclude_concepts",
+}
+
+# The loaded dataset, shared by all jobs running in one process.
+_data: t.Mapping[
+    types.Language_ID, t.Mapping[types.Parameter_ID, t.Set[types.Cognateset_ID]]
+] = {}
+
+
+def read_jobs(job_file: Path) -> t.List[t.Dict[str, t.Any]]:
+    """Load and check a JSON job list"""
+    with job_file.open(encoding="utf-8") as f:
+        jobs = json.load(f)
+    if not isinstance(jobs, list):
+        raise ValueError(f"{job_file} must contain a JSON list of export jobs.")
+    for j, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            raise ValueError(f"Job {j} in {job_file} is not a JSON object.")
+        unknown = set(job) - JOB_KEYS
+        if unknown:
+            raise ValueError(
+                f"Job {j} in {job_file} has unknown keys: {', '.join(sorted(unknown))}"
+            )
+        for key in ("output_file", "stats_file"):
+            if job.get(key) is not None:
+                job[key] = job_file.parent / job[key]
+        if isinstance(job.get("languages"), str):
+            language_file = job_file.parent / job["languages"]
+            with language_file.open(encoding="utf-8") as f:
+                job["languages"] = [lg.strip() for lg in f.read().split("\n")]
+    return jobs
+
+
+def _share_data(
+    data: t.Mapping[
+        types.Language_ID, t.Mapping[types.Parameter_ID, t.Set[types.Cognateset_ID]]
+    ]
+) -> None:
+    global _data
+    _data = data
+
+
+def run_job(job: t.Mapping[str, t.Any]) -> float:
+    """Run one export job on the shared data, and return its duration"""
+    start = time.perf_counter()
+    languages = job.get("languages")
+    ds = filter_wordlist(
+        _data,
+        languages=None if languages is None else set(languages),
+        exclude_concepts=set(job.get("exclude_concepts", ())),
+    )
+    export_alignment(
+        ds,
+        coding=job.get("coding", "rootmeaning"),
+        format=job.get("format", "raw"),
+        output_file=job.get("output_file"),
+        partitioned=job.get("partitioned", False),
+        stats_file=job.get("stats_file"),
+    )
+    return time.perf_counter() - start
+
+
+def run_batch(
+    dataset: pycldf.Dataset,
+    jobs: t.Sequence[t.Mapping[str, t.Any]],
+    code_column: t.Optional[str] = None,
+    cache_file: t.Optional[Path] = None,
+    max_workers: t.Optional[int] = None,
+    logger: cli.logging.Logger = cli.logger,
+) -> t.List[float]:
+    """Load the dataset once, then run all export jobs in a process pool
+
+    Jobs without an output file write to stdout, so they are run one at a
+    time in this process instead.
+
+    Return the duration of every job, in seconds.
+
+    """
+    start = time.perf_counter()
+    data = read_cldf_dataset(dataset, code_column=code_column, cache_file=cache_file)
+    # Plain dicts, so that the data can be sent to the worker processes.
+    data = {language: dict(lexicon) for language, lexicon in data.items()}
+    logger.info(f"Loaded dataset in {time.perf_counter() - start:.2f}s.")
+
+    durations: t.List[float] = [0.0] * len(jobs)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_share_data, initargs=(data,)
+    ) as pool:
+        futures = {
+            j: pool.submit(run_job, job)
+            for j, job in enumerate(jobs)
+            if job.get("output_file") is not None
+        }
+        # Jobs writing to stdout run one after the other in this process, so
+        # that their outputs do not get interleaved.
+        _share_data(data)
+        for j, job in enumerate(jobs):
+            if j not in futures:
+                durations[j] = run_job(job)
+        for j, future in futures.items():
+            durations[j] = future.result()
+    return durations
+
+
+if __name__ == "__main__":
+    parser = cli.parser(
+        description="Run a list of phylogenetic exports on one CLDF dataset, loading it only once"
+    )
+    parser.add_argument(
+        "job_file",
+        type=Path,
+        help="JSON file with the list of export jobs (see module documentation)",
+    )
+    parser.add_argument(
+        "--code-column",
+        type=str,
+        help="Name of the code column for metadata-free wordlists",
+    )
+    parser.add_argument(
+        "--cache-file",
+        type=Path,
+        default=None,
+        help="""Store the cognate data parsed from the dataset in this file, and load it
+            from there in later runs as long as the dataset is unchanged.""",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        dest="max_workers",
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    args = parser.parse_args()
+    logger = cli.setup_logging(args)
+    jobs = read_jobs(args.job_file)
+    durations = run_batch(
+        pycldf.Dataset.from_metadata(args.metadata),
+        jobs,
+        code_column=args.code_column,
+        cache_file=args.cache_file,
+        max_workers=args.max_workers,
+        logger=logger,
+    )
+    for job, duration in zip(jobs, durations):
+        print(
+            "{:8.2f}s  {:} {:} → {:}".format(
+                duration,
+                job.get("coding", "rootmeaning"),
+                job.get("format", "raw"),
+                job.get("output_file") or "stdout",
+            ),
+            file=sys.stderr,
+        )
@@ -1,4 +1,5 @@
 import typing as t
+from pathlib import Path
 
 import pycldf
 import openpyxl
@@ -77,15 +78,31 @@ def header_from_cognate_excel(
 
 
 def import_cognates_from_excel(
-    excel: str, dataset: pycldf.Dataset, logger: cli.logging.Logger = cli.logger
+    excel: t.Union[str, Path, t.Sequence[t.Union[str, Path]]],
+    dataset: pycldf.Dataset,
+    all_sheets: bool = False,
+    logger: cli.logging.Logger = cli.logger,
 ) -> None:
-    logger.info("Loading sheet…")
-    ws = openpyxl.load_workbook(excel).active
-    logger.info(
-        f"Importing cognate sets from {excel}, sheet {ws.title}, into {dataset.tablegroup._fname}…"
-    )
-
-    row_header, _ = header_from_cognate_excel(ws, dataset)
+    """Import cognate sets and judgements from one or more Excel files
+
+    By default, only the active sheet of each file is imported. With
+    `all_sheets`, all sheets of the files are imported, so a cognate export
+    that was sharded into several sheets can be read back in one run. All
+    sheets must have the same cognateset columns as the first one.
+
+    """
+    if isinstance(excel, (str, Path)):
+        excel = [excel]
+    logger.info("Loading sheets…")
+    sheets = []
+    for file in excel:
+        wb = openpyxl.load_workbook(file)
+        if all_sheets:
+            sheets.extend((file, ws) for ws in wb.worksheets)
+        else:
+            sheets.append((file, wb.active))
+
+    row_header, _ = header_from_cognate_excel(sheets[0][1], dataset)
     excel_parser_cognate = CognateEditParser(
         dataset,
         top=2,
@@ -104,7 +121,11 @@ def import_cognates_from_excel(
     excel_parser_cognate.db.cache_dataset()
     excel_parser_cognate.db.drop_from_cache("CognatesetTable")
     excel_parser_cognate.db.drop_from_cache("CognateTable")
-    excel_parser_cognate.parse_cells(ws, status_update=None)
+    for file, ws in sheets:
+        logger.info(
+            f"Importing cognate sets from {file}, sheet {ws.title}, into {dataset.tablegroup._fname}…"
+        )
+        excel_parser_cognate.parse_cells(ws, status_update=None)
     excel_parser_cognate.db.write_dataset_from_cache(
         ["CognateTable", "CognatesetTable"]
     )
@@ -116,14 +137,22 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "cogsets",
-        nargs="?",
-        default="cognates.xlsx",
-        help="Path to an Excel file containing cogsets and cognatejudgements (default: cognates.xlsx). The data will be imported from the *active sheet* (probably the last one you had open in Excel) of that spreadsheet.",
+        nargs="*",
+        default=["cognates.xlsx"],
+        help="Paths to Excel files containing cogsets and cognatejudgements (default: cognates.xlsx). The data will be imported from the *active sheet* (probably the last one you had open in Excel) of each spreadsheet, unless --all-sheets is given. Pass all shards of a sharded cognate export together.",
+    )
+    parser.add_argument(
+        "--all-sheets",
+        action="store_true",
+        default=False,
+        help="Import all sheets of the spreadsheets, not only the active one, eg. to read back a cognate export that was sharded over several sheets",
     )
 
     args = parser.parse_args()
     cli.setup_logging(args)
 
     import_cognates_from_excel(
-        args.cogsets, pycldf.Dataset.from_metadata(args.metadata)
+        args.cogsets,
+        pycldf.Dataset.from_metadata(args.metadata),
+        all_sheets=args.all_sheets,
     )
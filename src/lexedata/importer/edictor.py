@@ -1,27 +1,111 @@
 from pathlib import Path
 import csv
-from tqdm import tqdm
+import os
 import collections
+import typing as t
+from tqdm import tqdm
 
 import pycldf
 
+from lexedata import cli
 
-def load_forms_from_tsv(dataset: pycldf.Dataset, input_file: Path):
-    input = csv.DictReader(
-        input_file.open(encoding="utf-8"),
-        delimiter="\t",
-    )
+#: A morpheme of a form in an EDICTOR cognateset: The form ID, the start and
+#: end of the morpheme in the segments of the form (as Python slice
+#: boundaries), and its alignment, if any.
+EdictorMorpheme = t.Tuple[str, int, int, t.Optional[t.List[str]]]
 
-    c_form_id = dataset["FormTable", "id"].name
-    c_form_segments = dataset["FormTable", "segments"].name
-    forms = {
-        # These days, all dicts are ordered by default. Still, maybe make this explicit.
-        form[c_form_id]: form
-        for form in dataset["FormTable"]
-    }
 
-    edictor_cognatesets = collections.defaultdict(list)
+def split_at_boundaries(
+    tokens: t.Sequence[str], n: int, boundary: str = "+"
+) -> t.List[t.List[str]]:
+    """Split tokens into n morphemes at the first n-1 morpheme boundaries
+
+    Any further morpheme boundaries stay part of the last morpheme.
+
+    >>> split_at_boundaries("h i m + a u + g e".split(), 2)
+    [['h', 'i', 'm'], ['a', 'u', '+', 'g', 'e']]
+    >>> split_at_boundaries("a u".split(), 2)
+    Traceback (most recent call last):
+    ...
+    ValueError: Expected 2 morphemes, found 1 in ['a', 'u']
+
+    """
+    morphemes: t.List[t.List[str]] = [[]]
+    for token in tokens:
+        if token == boundary and len(morphemes) < n:
+            morphemes.append([])
+        else:
+            morphemes[-1].append(token)
+    if len(morphemes) < n:
+        raise ValueError(
+            f"Expected {n} morphemes, found {len(morphemes)} in {list(tokens)}"
+        )
+    return morphemes
+
+
+def edictor_morphemes(
+    form_id: str,
+    tokens: t.Sequence[str],
+    alignment: t.Sequence[str],
+    cognatesets: t.Sequence[str],
+    logger: cli.logging.Logger = cli.logger,
+) -> t.Tuple[t.List[str], t.List[t.Tuple[str, EdictorMorpheme]]]:
+    """Split the EDICTOR tokens of a form into morphemes in a single pass
+
+    Return the segments of the form, without morpheme boundaries, and the
+    morphemes of the form together with their cognatesets.
 
+    >>> segments, morphemes = edictor_morphemes(
+    ...     "f", "h i m + a u".split(), "h i m + a - u".split(), ["1", "2"])
+    >>> segments
+    ['h', 'i', 'm', 'a', 'u']
+    >>> morphemes
+    [('1', ('f', 0, 3, ['h', 'i', 'm'])), ('2', ('f', 3, 5, ['a', '-', 'u']))]
+
+    """
+    cognatesets = cognatesets or ["0"]
+    segments: t.List[str] = []
+    morphemes = []
+    aligned: t.Iterable[t.Optional[t.List[str]]]
+    if alignment:
+        aligned = split_at_boundaries(alignment, len(cognatesets))
+    else:
+        aligned = [None] * len(cognatesets)
+    for cognateset, morpheme, morpheme_alignment in zip(
+        cognatesets, split_at_boundaries(tokens, len(cognatesets)), aligned
+    ):
+        if morpheme_alignment is not None and morpheme != [
+            c for c in morpheme_alignment if c != "-"
+        ]:
+            logger.warning(
+                f"In form {form_id}, alignment {morpheme_alignment} did not "
+                f"match segments {morpheme}"
+            )
+        morphemes.append(
+            (
+                cognateset,
+                (
+                    form_id,
+                    len(segments),
+                    len(segments) + len(morpheme),
+                    morpheme_alignment,
+                ),
+            )
+        )
+        segments.extend(morpheme)
+    return segments, morphemes
+
+
+def edictor_rows(
+    dataset: pycldf.Dataset, input_file: Path
+) -> t.Iterator[t.Dict[str, t.Any]]:
+    """Read an EDICTOR TSV file line by line
+
+    Rename the EDICTOR columns to the columns of the FormTable, split
+    list-valued entries, and skip EDICTOR's comment rows.
+
+    """
+    c_form_segments = dataset["FormTable", "segments"].name
     form_table_upper = {
         column.name.upper(): column.name
         for column in dataset["FormTable"].tableSchema.columns
@@ -34,129 +118,175 @@ def load_forms_from_tsv(dataset: pycldf.Dataset, input_file: Path):
             "COGID": "cognatesetReference",
             "ALIGNMENT": "alignment",
             "TOKENS": c_form_segments,
-            "CLDF_ID": c_form_id,
+            "CLDF_ID": dataset["FormTable", "id"].name,
             "ID": "",
         }
     )
-    separators = [None for _ in input.fieldnames]
-    for i in range(len(input.fieldnames) - 1, -1, -1):
-        lingpy = input.fieldnames[i]
-        try:
-            input.fieldnames[i] = form_table_upper[lingpy]
-        except KeyError:
-            pass
-
-        if input.fieldnames[i] == "cognatesetReference":
-            separators[i] = " "
-        elif input.fieldnames[i] == "alignment":
-            separators[i] = " "
-
-        try:
-            separators[i] = dataset["FormTable", input.fieldnames[i]].separator
-        except KeyError:
-            pass
-
-    for line in tqdm(input, total=len(forms)):
-        if line[""].startswith("#"):
-            # One of Edictor's comment rows, storing settings
-            continue
-
-        for (key, value), sep in zip(line.items(), separators):
-            if sep is not None:
-                if not value:
-                    line[key] = []
-                else:
-                    line[key] = value.split(sep)
-
-        morpheme_boundary = 0
-        alignment_morpheme_boundary = 0
-        for cognateset in line["cognatesetReference"][:-1]:
-            next_morpheme_boundary = line[c_form_segments].index("+", morpheme_boundary)
-            del line[c_form_segments][next_morpheme_boundary]
-            if line["alignment"]:
-                next_alignment_morpheme_boundary = line["alignment"].index(
-                    "+", alignment_morpheme_boundary
-                )
-                alignment = line["alignment"][
-                    alignment_morpheme_boundary:next_alignment_morpheme_boundary
-                ]
-                if line[c_form_segments][morpheme_boundary:next_morpheme_boundary] != [
-                    c for c in alignment if c != "-"
-                ]:
-                    print(
-                        "Alignment {:} did not match segments {:}".format(
-                            alignment,
-                            line[c_form_segments][
-                                morpheme_boundary:next_morpheme_boundary
-                            ],
-                        )
-                    )
-                alignment_morpheme_boundary = next_alignment_morpheme_boundary + 1
-            else:
-                alignment = None
-            edictor_cognatesets[cognateset].append(
-                (line[c_form_id], morpheme_boundary, next_morpheme_boundary, alignment)
+    separators = {
+        column.name: column.separator
+        for column in dataset["FormTable"].tableSchema.columns
+        if column.separator
+    }
+    separators["cognatesetReference"] = " "
+    separators["alignment"] = " "
+    separators[c_form_segments] = " "
+
+    with input_file.open(encoding="utf-8", newline="") as tsv:
+        input = csv.DictReader(tsv, delimiter="\t")
+        if input.fieldnames is None:
+            return
+        input.fieldnames = [
+            form_table_upper.get(lingpy.upper(), lingpy) for lingpy in input.fieldnames
+        ]
+        for line in input:
+            if (line.get("") or "").startswith("#"):
+                # One of Edictor's comment rows, storing settings
+                continue
+            for key, value in line.items():
+                if key in separators:
+                    line[key] = value.split(separators[key]) if value else []
+                elif isinstance(value, str):
+                    line[key] = value.replace("!t", "\t").replace("!n", "\n")
+            yield line
+
+
+def load_forms_from_tsv(
+    dataset: pycldf.Dataset,
+    input_file: Path,
+    logger: cli.logging.Logger = cli.logger,
+) -> t.Dict[str, t.List[EdictorMorpheme]]:
+    """Update the FormTable from an EDICTOR TSV file, and read its cognatesets
+
+    The TSV file is processed line by line. Updated forms are merged into the
+    FormTable while streaming it to a new file: EDICTOR exports list the forms
+    in FormTable order, so in general no form has to be held back. Forms of the
+    TSV that are not in the FormTable are appended. Of several lines with the
+    same form ID, only the first one is imported.
+
+    Return the EDICTOR cognatesets, mapping each (EDICTOR) cognateset ID to
+    its morphemes.
+
+    """
+    c_form_id = dataset["FormTable", "id"].name
+    c_form_segments = dataset["FormTable", "segments"].name
+    segments_separator = dataset["FormTable", "segments"].separator
+
+    # A first, cheap pass to know which forms of the FormTable will be updated
+    tsv_ids: t.Set[str] = set()
+    for line in edictor_rows(dataset, input_file):
+        if line[c_form_id] in tsv_ids:
+            logger.warning(
+                f"Form {line[c_form_id]} appears several times in {input_file}. Only its first line is imported."
             )
-            morpheme_boundary = next_morpheme_boundary
-        next_morpheme_boundary = len(line[c_form_segments])
-        if line["alignment"]:
-            next_alignment_morpheme_boundary = len(line["alignment"])
-            alignment = line["alignment"][
-                alignment_morpheme_boundary:next_alignment_morpheme_boundary
-            ]
-            if line[c_form_segments][morpheme_boundary:next_morpheme_boundary] != [
-                c for c in alignment if c != "-"
-            ]:
-                print(
-                    "Alignment {:} did not match segments {:}".format(
-                        alignment,
-                        line[c_form_segments][morpheme_boundary:next_morpheme_boundary],
-                    )
-                )
-        else:
-            alignment = None
-        edictor_cognatesets[line["cognatesetReference"][-1]].append(
-            (line[c_form_id], morpheme_boundary, next_morpheme_boundary, alignment)
-        )
+        tsv_ids.add(line[c_form_id])
 
-        forms[line[c_form_id]] = line
-    del edictor_cognatesets["0"]
+    edictor_cognatesets: t.Dict[str, t.List[EdictorMorpheme]] = {}
 
-    dataset["FormTable"].write(forms.values())
+    def edictor_forms() -> t.Iterator[t.Dict[str, t.Any]]:
+        seen: t.Set[str] = set()
+        for line in edictor_rows(dataset, input_file):
+            if line[c_form_id] in seen:
+                continue
+            seen.add(line[c_form_id])
+            line[c_form_segments], morphemes = edictor_morphemes(
+                line[c_form_id],
+                line[c_form_segments],
+                line.get("alignment") or [],
+                line.get("cognatesetReference") or [],
+                logger=logger,
+            )
+            if not segments_separator:
+                line[c_form_segments] = " ".join(line[c_form_segments])
+            for cognateset, morpheme in morphemes:
+                if cognateset != "0":
+                    edictor_cognatesets.setdefault(cognateset, []).append(morpheme)
+            yield line
+
+    def updated_forms() -> t.Iterator[t.Dict[str, t.Any]]:
+        lines = edictor_forms()
+        # Lines read ahead of the FormTable, if the TSV is not in FormTable order
+        pending: t.Dict[str, t.Dict[str, t.Any]] = {}
+        for form in tqdm(
+            dataset["FormTable"],
+            total=dataset["FormTable"].common_props.get("dc:extent"),
+        ):
+            if form[c_form_id] in tsv_ids:
+                while form[c_form_id] not in pending:
+                    line = next(lines)
+                    pending[line[c_form_id]] = line
+                form.update(pending.pop(form[c_form_id]))
+            yield form
+        yield from pending.values()
+        yield from lines
+
+    table = dataset["FormTable"]
+    fname = Path(table.url.resolve(table.base))
+    tmp_fname = fname.with_name(fname.name + ".tmp")
+    table.write(updated_forms(), fname=tmp_fname)
+    os.replace(tmp_fname, fname)
     return edictor_cognatesets
 
 
-def match_cognatesets(new_cognatesets, reference_cognatesets):
-    new_cognateset_ids = sorted(
-        new_cognatesets, key=lambda x: len(new_cognatesets[x]), reverse=True
+def match_cognatesets(
+    new_cognatesets: t.Mapping[str, t.Sequence[t.Sequence[t.Any]]],
+    reference_cognatesets: t.Mapping[str, t.Sequence[t.Sequence[t.Any]]],
+    logger: cli.logging.Logger = cli.logger,
+) -> t.Dict[str, t.Optional[str]]:
+    """Match new cognatesets to reference cognatesets sharing the most forms
+
+    The members of both kinds of cognatesets are sequences starting with the
+    form ID, like the morphemes returned by load_forms_from_tsv. An inverted
+    index from forms to reference cognatesets gives, in a single pass over the
+    new cognatesets, the overlap of every pair of cognatesets that share at
+    least one form. Pairs without shared forms are never compared.
+
+    The pairs are then matched greedily, largest overlap first, so every
+    reference cognateset is matched at most once. New cognatesets without a
+    match map to None.
+
+    >>> new = {"a": [("f1",), ("f2",)], "b": [("f3",)], "c": [("f4",)]}
+    >>> reference = {"X": [("f1",), ("f2",), ("f3",)], "Y": [("f3",)]}
+    >>> match_cognatesets(new, reference)
+    {'a': 'X', 'b': 'Y', 'c': None}
+
+    """
+    reference_by_form: t.Dict[str, t.List[str]] = {}
+    for reference, members in reference_cognatesets.items():
+        for form in {member[0] for member in members}:
+            reference_by_form.setdefault(form, []).append(reference)
+
+    comparisons = 0
+    # (overlap, new cognateset, reference cognateset)
+    candidates: t.List[t.Tuple[int, str, str]] = []
+    for new, members in tqdm(new_cognatesets.items(), total=len(new_cognatesets)):
+        overlaps: t.Counter[str] = collections.Counter()
+        for form in {member[0] for member in members}:
+            references = reference_by_form.get(form, ())
+            comparisons += len(references)
+            overlaps.update(references)
+        candidates.extend(
+            (overlap, new, reference) for reference, overlap in overlaps.items()
+        )
+    logger.info(
+        f"Compared {len(new_cognatesets)} new with {len(reference_cognatesets)} "
+        f"reference cognatesets in {comparisons} comparisons, "
+        f"finding {len(candidates)} overlapping pairs."
     )
-    matching = {}
-    unassigned_reference_cognateset_ids = [
-        (len(forms), c) for c, forms in reference_cognatesets.items()
-    ]
-    unassigned_reference_cognateset_ids.sort(reverse=True)
-    cut = 0
-    for n in tqdm(new_cognateset_ids):
-        new_cognateset = new_cognatesets[n]
-        forms = {s[0] for s in new_cognateset}
-        best_intersection = 0
-        index, best_reference = None, None
-        for i, (left, right) in enumerate(
-            unassigned_reference_cognateset_ids[cut:], cut
-        ):
-            if left <= best_intersection:
-                break
-            if left > 2 * len(forms):
-                cut = i
-                continue
-            reference_cognateset = reference_cognatesets[right]
-            intersection = len(forms & {s[0] for s in reference_cognateset})
-            if intersection > best_intersection:
-                index, best_reference = (i, right)
-                best_intersection = intersection
-        matching[n] = best_reference
-        if index is not None:
-            del unassigned_reference_cognateset_ids[index]
+
+    # Match greedily, preferring large overlaps, and among them, large cognatesets.
+    candidates.sort(
+        key=lambda c: (
+            -c[0],
+            -len(new_cognatesets[c[1]]),
+            -len(reference_cognatesets[c[2]]),
+        )
+    )
+    matching: t.Dict[str, t.Optional[str]] = {new: None for new in new_cognatesets}
+    assigned: t.Set[str] = set()
+    for overlap, new, reference in candidates:
+        if matching[new] is None and reference not in assigned:
+            matching[new] = reference
+            assigned.add(reference)
     return matching
 
 
@@ -183,15 +313,16 @@ if __name__ == "__main__":
         default="cognate.tsv",
         help="Path to the input file",
     )
+    cli.add_log_controls(parser)
     args = parser.parse_args()
+    logger = cli.setup_logging(args)
     load_forms_from_tsv(
         dataset=pycldf.Dataset.from_metadata(args.metadata),
         input_file=args.input_file,
+        logger=logger,
     )
 
 if False:
-    import os
-
     os.chdir("/home/gereon/Develop/lexedata/Arawak")
     dataset = pycldf.Wordlist.from_metadata("Wordlist-metadata.json")
     input_file = Path("./from_edictor.tsv")
@@ -215,7 +346,7 @@ if False:
                     "ID": f"{form}-{cognateset}",
                     "Form_ID": form,
                     "Cognateset_ID": cognateset,
-                    "Segment_Slice": [f"{start}:{end}"],
+                    "Segment_Slice": [f"{start + 1}:{end}"],
                     "Alignment": alignment,
                     "Source": ["EDICTOR"],
                     "Comment": comments.get((cognateset, form)),
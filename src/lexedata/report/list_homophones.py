@@ -7,6 +7,8 @@ accidental homophones
 """
 
 from lexedata.util import load_clics
+import csv
+import json
 import typing as t
 import logging
 from pathlib import Path
@@ -14,61 +16,201 @@ from pathlib import Path
 import networkx as nx
 import pycldf
 
+from lexedata import cli
+
 logger = logging.getLogger(__name__)
 
+FormID = str
+ConceptID = str
+LanguageID = str
+
+COLUMNS = ["Language_ID", "Form", "Connectivity", "Incomplete", "Concepts", "Form_IDs"]
+
+
+class SubgraphConnectivity:
+    """Check whether sets of CLICS nodes induce connected subgraphs
+
+    The answer for each set of nodes is computed once, by a union-find over the
+    edges of CLICS among these nodes, and then cached. Homophone groups are
+    small and the same sets of concepts recur often, so this avoids building a
+    subgraph view and searching it for every group.
+
+    >>> clics = nx.Graph([("1", "2"), ("2", "3"), ("4", "5")])
+    >>> connected = SubgraphConnectivity(clics)
+    >>> connected(frozenset({"1", "2", "3"}))
+    True
+    >>> connected(frozenset({"1", "3"}))
+    False
+    >>> connected(frozenset({"3", "2", "1"}))
+    True
+    >>> len(connected.cache)
+    2
+
+    """
+
+    def __init__(self, clics: nx.Graph):
+        self.adjacency = clics.adj
+        self.cache: t.Dict[t.FrozenSet[str], bool] = {}
+
+    def __call__(self, nodes: t.FrozenSet[str]) -> bool:
+        try:
+            return self.cache[nodes]
+        except KeyError:
+            pass
+        parent = {node: node for node in nodes}
+
+        def root(node: str) -> str:
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        components = len(nodes)
+        for node in nodes:
+            neighbours = self.adjacency[node]
+            # Iterate over whichever is smaller, the neighbours or the nodes.
+            if len(neighbours) < len(nodes):
+                others: t.Iterable[str] = (n for n in neighbours if n in parent)
+            else:
+                others = (n for n in nodes if n in neighbours)
+            for other in others:
+                a, b = root(node), root(other)
+                if a != b:
+                    parent[a] = b
+                    components -= 1
+        self.cache[nodes] = components == 1
+        return components == 1
+
+
+def homophone_groups(
+    dataset: pycldf.Dataset,
+) -> t.Iterator[t.Tuple[LanguageID, str, t.List[t.Tuple[ConceptID, FormID]]]]:
+    """Group the forms of the dataset by language and form in a single pass
+
+    Yield every group of forms that has more than one meaning, as the
+    language, the form, and the (concept, form ID) pairs of the group.
 
-def list_homophones(dataset: pycldf.Dataset) -> None:
-    clics = load_clics()
+    """
+    f_id = dataset.column_names.forms.id
+    f_lang = dataset.column_names.forms.languageReference
+    f_concept = dataset.column_names.forms.parameterReference
+    f_form = dataset.column_names.forms.form
+
+    groups: t.Dict[
+        t.Tuple[LanguageID, str], t.Dict[t.Tuple[ConceptID, FormID], None]
+    ] = {}
+    for form in cli.tq(
+        dataset["FormTable"],
+        total=dataset["FormTable"].common_props.get("dc:extent"),
+    ):
+        concepts = form[f_concept]
+        if not isinstance(concepts, list):
+            concepts = [concepts]
+        meanings = groups.setdefault((form[f_lang], form[f_form]), {})
+        for concept in concepts:
+            meanings[concept, form[f_id]] = None
+
+    for (language, form), meanings in groups.items():
+        if len(meanings) > 1:
+            yield language, form, list(meanings)
+
+
+def list_homophones(
+    dataset: pycldf.Dataset,
+    output_file: t.Optional[Path] = None,
+    format: str = "csv",
+) -> t.List[t.Dict[str, t.Any]]:
+    """List all groups of homophones and whether CLICS connects their concepts
+
+    Every group is classified as `connected` if the concepts of the group form
+    a connected subgraph of CLICS, `unconnected` if they do not, and `unknown`
+    if fewer than two of them are in CLICS. `Incomplete` marks groups where at
+    least one concept is not linked to a CLICS node. The groups are written to
+    `output_file` (default: stdout) as CSV or JSON, and returned.
+
+    """
+    try:
+        clics: t.Optional[nx.Graph] = load_clics()
+    except FileNotFoundError:
+        clics = None
     # warn if clics cannot be loaded
     if not clics:
         logger.warning("Clics could not be loaded. Using an empty graph instead")
         clics = nx.Graph()
+    connected = SubgraphConnectivity(clics)
 
-    c_id = dataset["ParameterTable", "id"].name
-    c_concepticon = dataset["ParameterTable", "concepticonReference"].name
-    concepticon = {}
-    for concept in dataset["ParameterTable"]:
-        concepticon[concept[c_id]] = concept[c_concepticon]
-
-    f_id = dataset["FormTable", "id"].name
-    f_lang = dataset["FormTable", "languageReference"].name
-    f_concept = dataset["FormTable", "parameterReference"].name
-    f_form = dataset["FormTable", "form"].name
-
-    homophones: t.DefaultDict[
-        str, t.DefaultDict[str, t.Set[t.Tuple[str, str]]]
-    ] = t.DefaultDict(lambda: t.DefaultDict(set))
-
-    for form in dataset["FormTable"]:
-        homophones[form[f_lang]][form[f_form]].add((form[f_concept], form[f_id]))
-
-    for lang, forms in homophones.items():
-        for form, meanings in forms.items():
-            if len(meanings) == 1:
-                continue
-            clics_nodes = [concepticon.get(concept) for concept, form_id in meanings]
-            if None in clics_nodes:
-                clics_nodes = [c for c in clics_nodes if c]
-                x = "(but at least one concept not found)"
-            else:
-                x = ""
-            if len(clics_nodes) <= 1:
-                print("Unknown:", lang, form, meanings)
-            elif nx.is_connected(clics.subgraph(clics_nodes)):
-                print("Connected:", x, lang, form, meanings)
-            else:
-                print("Unconnected:", x, lang, form, meanings)
+    c_id = dataset.column_names.parameters.id
+    c_concepticon = dataset.column_names.parameters.concepticonReference
+    concepticon: t.Dict[ConceptID, str] = {}
+    if c_concepticon is not None:
+        for concept in dataset["ParameterTable"]:
+            if concept[c_concepticon] is not None:
+                concepticon[concept[c_id]] = str(concept[c_concepticon])
 
+    report = []
+    for language, form, meanings in homophone_groups(dataset):
+        concepts = dict.fromkeys(concept for concept, form_id in meanings)
+        clics_nodes = frozenset(
+            concepticon[concept]
+            for concept in concepts
+            if concepticon.get(concept) in clics
+        )
+        if len(clics_nodes) <= 1:
+            connectivity = "unknown"
+        elif connected(clics_nodes):
+            connectivity = "connected"
+        else:
+            connectivity = "unconnected"
+        report.append(
+            {
+                "Language_ID": language,
+                "Form": form,
+                "Connectivity": connectivity,
+                "Incomplete": any(
+                    concepticon.get(concept) not in clics for concept in concepts
+                ),
+                "Concepts": list(concepts),
+                "Form_IDs": list(dict.fromkeys(form_id for _, form_id in meanings)),
+            }
+        )
 
-if __name__ == "__main__":
-    import argparse
+    with cli.open_output(output_file) as out:
+        if format == "json":
+            json.dump(report, out, ensure_ascii=False, indent=2)
+            out.write("\n")
+        else:
+            writer = csv.DictWriter(out, COLUMNS)
+            writer.writeheader()
+            for row in report:
+                writer.writerow(
+                    {
+                        **row,
+                        "Concepts": ";".join(row["Concepts"]),
+                        "Form_IDs": ";".join(row["Form_IDs"]),
+                    }
+                )
+    return report
 
-    parser = argparse.ArgumentParser(description=__doc__)
+
+if __name__ == "__main__":
+    parser = cli.parser(description=__doc__)
     parser.add_argument(
-        "--metadata",
+        "--format",
+        choices=("csv", "json"),
+        default="csv",
+        help="Output format: a CSV table with one homophone group per row, "
+        "or a JSON list of groups (default: csv)",
+    )
+    parser.add_argument(
+        "--output-file",
+        "-o",
         type=Path,
-        default="Wordlist-metadata.json",
-        help="Path to the JSON metadata file describing the dataset (default: ./Wordlist-metadata.json)",
+        help="File to write the report to (default: Write to stdout)",
     )
     args = parser.parse_args()
-    list_homophones(dataset=pycldf.Dataset.from_metadata(args.metadata))
+    cli.setup_logging(args)
+    list_homophones(
+        dataset=pycldf.Dataset.from_metadata(args.metadata),
+        output_file=args.output_file,
+        format=args.format,
+    )
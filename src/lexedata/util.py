@@ -1,25 +1,36 @@
 # -*- coding: utf-8 -*-
+import os
 import re
+import contextlib
+import csv
+import json
+import array
+import struct
+import hashlib
 import zipfile
+import functools
 import typing as t
 from pathlib import Path
 
 import unicodedata
 import unidecode as uni
 import pycldf
+from pycldf.terms import TERMS
 import openpyxl as op
 import networkx
 from lingpy.compare.strings import ldn_swap
 
 import csvw
 
+from lexedata import cli
+
 ID_FORMAT = re.compile("[a-z0-9_]+")
 
 
 def cldf_property(url: csvw.metadata.URITemplate) -> t.Optional[str]:
     if url.uri.startswith("http://cldf.clld.org/v1.0/terms.rdf#"):
         # len("http://cldf.clld.org/v1.0/terms.rdf#") == 36
-        return url[36:]
+        return url.uri[36:]
     else:
         return None
 
@@ -128,7 +139,97 @@ def edit_distance(text1: str, text2: str) -> float:
     return ldn_swap(text1, text2, normalized=False) / length
 
 
+GRAPH_CACHE_MAGIC = b"lexedata-graph-cache-1\n"
+GRAPH_CACHE_TYPECODE = "i"
+
+
+def file_hash(path: Path) -> str:
+    """Compute the SHA-256 hash of a file"""
+    sha = hashlib.sha256()
+    with path.open("rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def write_graph_cache(cache_file: Path, key: t.List[t.Any], graph: networkx.Graph):
+    """Write the structure of a graph to a cache file
+
+    The graph is stored as a table of node IDs and the adjacency of every node
+    in compressed sparse row form. Node and edge attributes are not stored.
+
+    """
+    nodes = list(graph.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    indptr = array.array(GRAPH_CACHE_TYPECODE, [0])
+    indices = array.array(GRAPH_CACHE_TYPECODE)
+    for node in nodes:
+        indices.extend(index[neighbor] for neighbor in graph.adj[node])
+        indptr.append(len(indices))
+
+    header = json.dumps(
+        {"key": key, "directed": graph.is_directed(), "nodes": nodes}
+    ).encode("utf-8")
+    temporary = Path(cache_file).with_name(Path(cache_file).name + ".tmp")
+    with temporary.open("wb") as cache:
+        cache.write(GRAPH_CACHE_MAGIC)
+        cache.write(struct.pack("<Q", len(header)))
+        cache.write(header)
+        indptr.tofile(cache)
+        indices.tofile(cache)
+    temporary.replace(cache_file)
+
+
+def load_graph_cache(
+    cache_file: Path, key: t.List[t.Any]
+) -> t.Optional[networkx.Graph]:
+    """Load a graph from a cache file, if it matches the key
+
+    Return None if the cache file is missing, unreadable, or stale.
+
+    >>> import tempfile
+    >>> cache_file = Path(tempfile.mkdtemp()) / "cache"
+    >>> write_graph_cache(cache_file, ["k"], networkx.Graph([("1", "2"), ("2", "3")]))
+    >>> graph = load_graph_cache(cache_file, ["k"])
+    >>> sorted(graph.nodes), sorted(sorted(edge) for edge in graph.edges)
+    (['1', '2', '3'], [['1', '2'], ['2', '3']])
+    >>> load_graph_cache(cache_file, ["other key"]) is None
+    True
+
+    """
+    try:
+        with Path(cache_file).open("rb") as cache:
+            if cache.read(len(GRAPH_CACHE_MAGIC)) != GRAPH_CACHE_MAGIC:
+                return None
+            (header_length,) = struct.unpack("<Q", cache.read(8))
+            header = json.loads(cache.read(header_length).decode("utf-8"))
+            if header["key"] != key:
+                return None
+            nodes = header["nodes"]
+            indptr = array.array(GRAPH_CACHE_TYPECODE)
+            indptr.fromfile(cache, len(nodes) + 1)
+            indices = array.array(GRAPH_CACHE_TYPECODE)
+            indices.frombytes(cache.read())
+    except (OSError, ValueError, KeyError, EOFError, struct.error):
+        return None
+
+    graph = networkx.DiGraph() if header["directed"] else networkx.Graph()
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from(
+        (node, nodes[indices[k]])
+        for i, node in enumerate(nodes)
+        for k in range(indptr[i], indptr[i + 1])
+    )
+    return graph
+
+
 def load_clics():
+    """Load the CLICS³ colexification network
+
+    Parsing the GML file takes a long time, so the graph structure is cached
+    next to it, keyed on the hash of the zipped GML file.
+
+    """
     gml_file = (
         Path(__file__).parent / "data/clics-clics3-97832b5/clics3-network.gml.zip"
     )
@@ -143,8 +244,60 @@ def load_clics():
             "clics-clics3-97832b5/clics3-network.gml.zip",
             Path(__file__).parent / "data/",
         )
-    gml = zipfile.ZipFile(gml_file).open("graphs/network-3-families.gml", "r")
-    return networkx.parse_gml(line.decode("utf-8") for line in gml)
+    network = "graphs/network-3-families.gml"
+    cache_file = gml_file.with_name(gml_file.name + ".cache")
+    key = [file_hash(gml_file), network]
+    graph = load_graph_cache(cache_file, key)
+    if graph is None:
+        gml = zipfile.ZipFile(gml_file).open(network, "r")
+        graph = networkx.parse_gml(line.decode("utf-8") for line in gml)
+        try:
+            write_graph_cache(cache_file, key, graph)
+        except OSError:
+            pass
+    return graph
+
+
+@functools.lru_cache(maxsize=None)
+def get_catalog(name: str):
+    """Load a reference catalog, such as CLTS or Concepticon
+
+    The catalog is located through the cldfcatalog configuration and loaded
+    only on first use, and then kept for the rest of the process, so that
+    importing a module that may need a catalog stays cheap.
+
+    """
+    import cldfbench
+    import cldfcatalog
+
+    catalog = {
+        "clts": cldfbench.catalogs.CLTS,
+        "concepticon": cldfbench.catalogs.Concepticon,
+    }[name]
+    return catalog(cldfcatalog.Config.from_file().get_clone(name))
+
+
+@functools.lru_cache(maxsize=None)
+def get_bipa():
+    """Load the BIPA transcription system from the CLTS catalog, once"""
+    return get_catalog("clts").api.bipa
+
+
+def segment_slice_ranges(segment_slices: t.Sequence[str]) -> t.List[t.Tuple[int, int]]:
+    """Parse segment slice strings into pairs of integers
+
+    The numbers are returned as they are written, without interpreting them as
+    indices.
+
+    >>> segment_slice_ranges(["1:3", "5:7"])
+    [(1, 3), (5, 7)]
+
+    """
+    ranges = []
+    for startend in segment_slices:
+        start, end = startend.split(":")
+        ranges.append((int(start), int(end)))
+    return ranges
 
 
 def parse_segment_slices(
@@ -168,10 +321,7 @@ def parse_segment_slices(
 
     """
     i = -1  # Set it to the value before the first possible segment slice start
-    for startend in segment_slices:
-        start, end = startend.split(":")
-        start = int(start)
-        end = int(end)
+    for start, end in segment_slice_ranges(segment_slices):
         if enforce_ordered and start <= i:
             raise ValueError("Segment slices are not ordered as required.")
         for i in range(start - 1, end):
@@ -198,6 +348,209 @@ def cache_table(
     }
 
 
+def foreign_key_graph(dataset: pycldf.Dataset) -> t.Dict[str, t.Dict[str, str]]:
+    """Find, for every table, the columns that reference the ID of some table
+
+    Both explicit foreign keys and CLDF reference properties (like
+    #languageReference, which references the LanguageTable) count. Tables are
+    identified by their URL.
+
+    >>> import tempfile
+    >>> dataset = pycldf.Wordlist.in_dir(tempfile.mkdtemp())
+    >>> _ = dataset.add_component("LanguageTable")
+    >>> foreign_key_graph(dataset)["forms.csv"]
+    {'Language_ID': 'languages.csv'}
+
+    """
+    graph: t.Dict[str, t.Dict[str, str]] = {}
+    for table in dataset.tables:
+        references = graph.setdefault(table.url.string, {})
+        for foreign_key in table.tableSchema.foreignKeys:
+            if len(foreign_key.columnReference) != 1:
+                continue
+            (column,) = foreign_key.columnReference
+            if column in table.tableSchema.columndict:
+                references[column] = foreign_key.reference.resource.string
+        for column in table.tableSchema.columns:
+            term = cldf_property(column.propertyUrl) if column.propertyUrl else None
+            component = getattr(TERMS.get(term), "references", None)
+            if component is None or column.name in references:
+                continue
+            try:
+                references[column.name] = dataset[component].url.string
+            except KeyError:
+                continue
+    return graph
+
+
+def substitute_ids(
+    dataset: pycldf.Dataset,
+    mappings: t.Mapping[str, t.Mapping[str, str]],
+    status_update: t.Optional[str] = None,
+    merge: bool = False,
+    logger: cli.logging.Logger = cli.logger,
+) -> None:
+    """Apply mappings of IDs to all tables of the dataset
+
+    `mappings` maps table URLs to mappings from old to new IDs. The ID column
+    of each of these tables is changed, and so is every column of any table
+    that references them. Every affected table is streamed once, with all
+    mappings applied, into a new file which then replaces the original. Only
+    the affected cells are parsed, and the tables are not validated, so the
+    mappings should be checked before. Tables that no non-empty mapping
+    applies to are not rewritten.
+
+    If a new ID is already taken by an earlier row of the same table, the
+    later row is dropped with `merge`, merging the two rows into one.
+    Otherwise, both rows are kept, and a warning is logged.
+
+    """
+    graph = foreign_key_graph(dataset)
+    for table in dataset.tables:
+        url = table.url.string
+        columns = {
+            column: mappings[target]
+            for column, target in graph[url].items()
+            if mappings.get(target)
+        }
+        c_id = None
+        if mappings.get(url):
+            id_column = table.get_column("http://cldf.clld.org/v1.0/terms.rdf#id")
+            if id_column is not None:
+                c_id = id_column.name
+                columns[c_id] = mappings[url]
+        if not columns:
+            continue
+        logger.info(f"Changing columns {sorted(columns)} in {url}…")
+        _substitute_in_table(table, columns, c_id, status_update, merge, logger)
+
+
+def _substitute_in_table(
+    table: csvw.Table,
+    columns: t.Mapping[str, t.Mapping[str, str]],
+    c_id: t.Optional[str],
+    status_update: t.Optional[str],
+    merge: bool,
+    logger: cli.logging.Logger,
+) -> None:
+    dialect = _dialect(table)
+    fname = Path(table.url.resolve(table.base))
+    tmp_fname = fname.with_name(fname.name + ".tmp")
+    with _raw_reader(table) as reader:
+        with csvw.dsv.UnicodeWriter(tmp_fname, dialect=dialect) as writer:
+            header = _header(table, reader)
+            columndict = table.tableSchema.columndict
+            # A status column that was added to the metadata, but not yet to
+            # the file, is appended to the header and to every row.
+            status_column = columndict.get("Status_Column")
+            if status_column is None:
+                i_status = None
+            elif status_column.header in header:
+                i_status = header.index(status_column.header)
+            else:
+                i_status = len(header)
+                header.append(status_column.header)
+            if dialect.header:
+                writer.writerow(header)
+            substitutions = [
+                (
+                    header.index(columndict[column].header),
+                    columndict[column].separator,
+                    columndict[column].null,
+                    mapping,
+                )
+                for column, mapping in columns.items()
+            ]
+            i_id = None if c_id is None else header.index(columndict[c_id].header)
+
+            ids: t.Set[str] = set()
+            for row in reader:
+                if i_status is not None and len(row) == i_status:
+                    row.append("")
+                changed = False
+                for i, separator, null, mapping in substitutions:
+                    value = row[i]
+                    if value in null:
+                        continue
+                    if separator:
+                        new = separator.join(
+                            mapping.get(v, v) for v in value.split(separator)
+                        )
+                    else:
+                        new = mapping.get(value, value)
+                    if new != value:
+                        row[i] = new
+                        changed = True
+                if changed and status_update and i_status is not None:
+                    row[i_status] = status_update
+                if i_id is not None:
+                    if row[i_id] not in ids:
+                        ids.add(row[i_id])
+                    elif merge:
+                        logger.info(
+                            f"Merged row {row[i_id]} of {table.url} into an earlier row."
+                        )
+                        continue
+                    else:
+                        logger.warning(
+                            f"Table {table.url} has several rows with ID {row[i_id]}."
+                        )
+                writer.writerow(row)
+    os.replace(tmp_fname, fname)
+
+
+def _dialect(table: csvw.Table) -> csvw.dsv.Dialect:
+    return table.dialect or table._parent.dialect or csvw.dsv.Dialect()
+
+
+@contextlib.contextmanager
+def _raw_reader(table: csvw.Table) -> t.Iterator[t.Iterator[t.List[str]]]:
+    # csvw's own reader keeps track of line numbers, comments, and trimming,
+    # which makes it several times slower than the plain csv module.
+    dialect = _dialect(table)
+    encoding = dialect.python_encoding
+    with Path(table.url.resolve(table.base)).open(
+        encoding="utf-8-sig" if encoding == "utf-8" else encoding, newline=""
+    ) as file:
+        yield csv.reader(file, **dialect.as_python_formatting_parameters())
+
+
+def _header(table: csvw.Table, reader: t.Iterator[t.List[str]]) -> t.List[str]:
+    if _dialect(table).header:
+        return next(reader)
+    return [c.header for c in table.tableSchema.columns if not c.virtual]
+
+
+def raw_columns(table: csvw.Table, *columns: str) -> t.Iterator[t.Tuple[str, ...]]:
+    """Stream the raw values of some columns of a table
+
+    The values are not parsed, so this is much faster than iterating over the
+    table when only a few columns are needed.
+
+    """
+    with _raw_reader(table) as reader:
+        header = _header(table, reader)
+        indices = [
+            header.index(table.tableSchema.columndict[column].header)
+            for column in columns
+        ]
+        for row in reader:
+            yield tuple(row[i] for i in indices)
+
+
+def read_id_mapping(mapping_file: Path) -> t.Dict[str, str]:
+    """Read a mapping of old to new IDs from a CSV file
+
+    The first two columns of the file contain the old and the new IDs. The
+    first row is a header.
+
+    """
+    with mapping_file.open(encoding="utf-8", newline="") as file:
+        rows = csv.reader(file)
+        next(rows, None)
+        return {row[0]: row[1] for row in rows if row}
+
+
 class KeyKeyDict(t.Mapping[str, str]):
     def __len__(self):
         return 0
@@ -0,0 +1,99 @@
+from pathlib import Path
+
+import pytest
+import pycldf
+
+from lexedata.enrich.align import (
+    Aligner,
+    align_cognatesets,
+    aligne_cognate_table,
+    aligne_cognate_table_streaming,
+)
+
+COGNATESETS = {
+    "one": [
+        (("paraguayan_guarani", ["p", "e", "t", "e", "ĩ"]), "j1"),
+        (("paraguayan_guarani", ["p", "e", "t", "e", "ĩ", "h", "a"]), "j2"),
+        (("kaiwa", ["p", "e", "t", "ẽ", "ʔ", "ĩ"]), "j3"),
+    ],
+    "two": [
+        (("paraguayan_guarani", ["m", "o", "k", "õ", "i"]), "j4"),
+        (("kaiwa", ["m", "õ", "k", "õ", "j̃"]), "j5"),
+        (("ache", ["m", "ĩ", "ɾ", "õ", "¹"]), "j6"),
+    ],
+    "three": [
+        (("paraguayan_guarani", ["m", "b", "o", "h", "a", "p", "y"]), "j7"),
+        (("kaiwa", []), "j8"),
+    ],
+    "four": [(("kaiwa", ["i", "ɾ", "ũ", "n", "d", "ɨ"]), "j9")],
+}
+
+
+def test_alignments_are_consistent():
+    for cognateset, alignments in align_cognatesets(COGNATESETS):
+        assert len({len(alignment) for alignment, _ in alignments}) == 1
+        for (alignment, id), ((language, segments), j) in zip(
+            alignments, COGNATESETS[cognateset]
+        ):
+            assert id == j
+            assert [s for s in alignment if s != "-"] == segments
+
+
+def test_identical_morphemes_align_identically():
+    aligner = Aligner()
+    alignments = aligner.align(
+        [("a", ["t", "a", "k", "a"]), ("b", ["t", "a", "k", "a"]), ("c", ["t", "a"])]
+    )
+    assert alignments[0] == alignments[1] == ["t", "a", "k", "a"]
+    assert aligner.pairwise_cache
+
+
+def test_parallel_alignment_matches_serial():
+    assert list(align_cognatesets(COGNATESETS, jobs=2)) == list(
+        align_cognatesets(COGNATESETS)
+    )
+
+
+@pytest.fixture
+def cognate_dataset(tmp_path):
+    dataset = pycldf.Wordlist.in_dir(tmp_path)
+    dataset.add_component("CognateTable")
+    dataset["FormTable", "segments"].separator = " "
+    forms = []
+    judgements = []
+    for cognateset, morphemes in COGNATESETS.items():
+        for (language, segments), id in morphemes:
+            forms.append(
+                {
+                    "ID": id,
+                    "Language_ID": language,
+                    "Parameter_ID": cognateset,
+                    "Form": "".join(segments) or "-",
+                    "Segments": segments,
+                }
+            )
+            judgements.append(
+                {
+                    "ID": id,
+                    "Form_ID": id,
+                    "Cognateset_ID": cognateset,
+                    "Segment_Slice": [f"1:{len(segments)}"],
+                }
+            )
+    # Shuffle the judgements, so that cognatesets are not contiguous.
+    judgements = judgements[::2] + judgements[1::2]
+    dataset.write(FormTable=forms, CognateTable=judgements)
+    return dataset
+
+
+def test_streaming_alignment_matches_in_memory(cognate_dataset):
+    table = cognate_dataset["CognateTable"]
+    fname = Path(table.url.resolve(table.base))
+    aligne_cognate_table(cognate_dataset)
+    in_memory = fname.read_text()
+    aligne_cognate_table_streaming(cognate_dataset)
+    assert fname.read_text() == in_memory
+    assert [j["Alignment"] for j in cognate_dataset["CognateTable"]][:2] == [
+        ["p", "e", "t", "e", "-", "-", "ĩ"],
+        ["p", "e", "t", "ẽ", "-", "ʔ", "ĩ"],
+    ]
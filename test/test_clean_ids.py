@@ -0,0 +1,59 @@
+from pathlib import Path
+
+import pytest
+
+from lexedata.change.clean_ids import clean_ids
+from lexedata.change.rename_language import rename
+from test_excel_conversion import copy_to_temp
+
+SMALL = Path(__file__).parent / "data/cldf/smallmawetiguarani/cldf-metadata.json"
+
+
+@pytest.mark.parametrize("integer", [False, True])
+def test_clean_ids_keeps_references(integer):
+    dataset, _ = copy_to_temp(SMALL)
+    dataset["LanguageTable", "id"].datatype.format = None
+    dataset.write_metadata()
+    rename(dataset, {"ache": "Aché (1)"}, status_update=None)
+    names = {lang["ID"]: lang["Name"] for lang in dataset["LanguageTable"]}
+    forms = {(f["Form"], names[f["Language_ID"]]) for f in dataset["FormTable"]}
+
+    clean_ids(dataset, integer=integer)
+
+    new_names = {lang["ID"]: lang["Name"] for lang in dataset["LanguageTable"]}
+    if integer:
+        assert sorted(new_names) == [str(i) for i in range(1, len(names) + 1)]
+    else:
+        assert new_names["ache_1"] == names["Aché (1)"]
+        assert new_names["kaiwa"] == names["kaiwa"]
+    assert {
+        (f["Form"], new_names[f["Language_ID"]]) for f in dataset["FormTable"]
+    } == forms
+    form_ids = {f["ID"] for f in dataset["FormTable"]}
+    assert all(j["Form_ID"] in form_ids for j in dataset["CognateTable"])
+    c_cognateset = dataset["CognateTable", "cognatesetReference"].name
+    cognateset_ids = {c["ID"] for c in dataset["CognatesetTable"]}
+    assert all(j[c_cognateset] in cognateset_ids for j in dataset["CognateTable"])
+
+
+def test_clean_ids_leaves_clean_tables_untouched():
+    dataset, target = copy_to_temp(SMALL)
+    contents = {f.name: f.read_bytes() for f in target.parent.glob("*.csv")}
+    clean_ids(dataset)
+    # Only the cognate judgement IDs of the sample data need cleaning.
+    assert [
+        f.name
+        for f in target.parent.glob("*.csv")
+        if f.read_bytes() != contents[f.name]
+    ] == ["cognate.csv"]
+
+
+def test_clean_ids_refuses_duplicate_ids():
+    dataset, target = copy_to_temp(SMALL)
+    forms = list(dataset["FormTable"])
+    forms[0]["ID"] = forms[1]["ID"] = "Dup X"
+    dataset["FormTable"].write(forms)
+    contents = {f.name: f.read_bytes() for f in target.parent.glob("*")}
+    with pytest.raises(ValueError, match="Dup X"):
+        clean_ids(dataset)
+    assert {f.name: f.read_bytes() for f in target.parent.glob("*")} == contents
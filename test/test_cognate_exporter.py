@@ -72,3 +72,34 @@ def test_adding_singleton_cognatesets():
         "X2_paraguayan_guarani",
         "X3_ache",
     ]
+
+
+def test_write_only_export_matches_normal_export():
+    def cells(path):
+        ws = op.load_workbook(path).active
+        return [
+            [
+                (
+                    cell.value,
+                    cell.comment and cell.comment.text,
+                    cell.hyperlink and cell.hyperlink.target,
+                )
+                for cell in row
+                if cell.value is not None
+            ]
+            for row in ws.iter_rows()
+        ]
+
+    dirname = Path(tempfile.mkdtemp(prefix="lexedata-test"))
+    for metadata in [
+        "data/cldf/minimal/cldf-metadata.json",
+        "data/cldf/smallmawetiguarani/cldf-metadata.json",
+    ]:
+        outputs = []
+        for write_only in [False, True]:
+            dataset = pycldf.Dataset.from_metadata(Path(__file__).parent / metadata)
+            excel_writer = ExcelWriter(dataset=dataset, singleton_cognate=True)
+            output = dirname / f"out-{write_only}.xlsx"
+            excel_writer.create_excel(out=output, write_only=write_only)
+            outputs.append(cells(output))
+        assert outputs[0] == outputs[1]
@@ -0,0 +1,41 @@
+from pathlib import Path
+
+import pycldf
+
+from lexedata.exporter.coverage import CoverageMatrix, coverage_report
+
+SMALL = Path(__file__).parent / "data/cldf/smallmawetiguarani/cldf-metadata.json"
+
+
+def test_coverage_matches_forms():
+    dataset = pycldf.Wordlist.from_metadata(SMALL)
+    matrix = CoverageMatrix.from_dataset(dataset)
+    counts = {}
+    for form in dataset["FormTable"]:
+        for concept in form["Parameter_ID"]:
+            key = form["Language_ID"], concept
+            counts[key] = counts.get(key, 0) + 1
+    dense = matrix.dense()
+    assert {
+        (language, concept): dense[i, j]
+        for i, language in enumerate(matrix.languages)
+        for j, concept in enumerate(matrix.concepts)
+        if dense[i, j]
+    } == counts
+
+
+def test_coverage_report_filters():
+    matrix = CoverageMatrix.from_pairs(
+        [("a", "1"), ("a", "2"), ("a", "2"), ("b", "1"), ("c", "2")],
+        languages=["a", "b", "c", "d"],
+    )
+    assert coverage_report(matrix) == [
+        {"Language_ID": "a", "Concepts": 2, "Forms": 3, "Synonymy": 1.5},
+        {"Language_ID": "b", "Concepts": 1, "Forms": 1, "Synonymy": 1.0},
+        {"Language_ID": "c", "Concepts": 1, "Forms": 1, "Synonymy": 1.0},
+        {"Language_ID": "d", "Concepts": 0, "Forms": 0, "Synonymy": 0.0},
+    ]
+    assert [
+        r["Language_ID"]
+        for r in coverage_report(matrix, min_concepts=1, with_concepts=["2"])
+    ] == ["a", "c"]
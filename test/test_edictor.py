@@ -0,0 +1,137 @@
+import csv
+
+import pytest
+import pycldf
+
+from lexedata.exporter.edictor import forms_to_tsv, WorldSet
+from lexedata.importer.edictor import load_forms_from_tsv, match_cognatesets
+
+
+@pytest.fixture
+def morpheme_dataset(tmp_path):
+    dataset = pycldf.Wordlist.in_dir(tmp_path)
+    dataset.add_component("CognateTable")
+    dataset.add_component("CognatesetTable")
+    dataset["FormTable", "segments"].separator = " "
+    dataset["CognateTable", "segmentSlice"].separator = ","
+    dataset["CognateTable", "alignment"].separator = " "
+    forms = [
+        ("himmelauge", "de", "eye of heaven"),
+        ("himmelsauge", "de", "eye of heaven"),
+        ("tão", "pt", "so"),
+        ("auge", "de", "eye"),
+    ]
+    judgements = [
+        ("himmelauge", "HIMMEL", ["1:6"]),
+        ("himmelauge", "AUGE", ["7:10"]),
+        ("himmelsauge", "HIMMEL", ["1:6"]),
+        ("himmelsauge", "AUGE", ["8:11"]),
+        ("tão", "TA", ["1:2"]),
+        ("tão", "NO", ["3:3"]),
+    ]
+    dataset.write(
+        FormTable=[
+            {
+                "ID": form.replace("ã", "a"),
+                "Form": form,
+                "Language_ID": language,
+                "Parameter_ID": concept,
+                "Segments": list(form),
+            }
+            for form, language, concept in forms
+        ],
+        CognateTable=[
+            {
+                "ID": f"{form}-{cognateset}".replace("ã", "a"),
+                "Form_ID": form.replace("ã", "a"),
+                "Cognateset_ID": cognateset,
+                "Segment_Slice": slice,
+            }
+            for form, cognateset, slice in judgements
+        ],
+        CognatesetTable=[{"ID": c} for c in ["HIMMEL", "AUGE", "TA", "NO", "UNUSED"]],
+    )
+    return dataset
+
+
+def test_forms_to_tsv(morpheme_dataset, tmp_path):
+    output = tmp_path / "cognate.tsv"
+    forms_to_tsv(morpheme_dataset, WorldSet(), WorldSet(), WorldSet(), output)
+    rows = list(csv.DictReader(output.open(encoding="utf-8"), delimiter="\t"))
+    assert [(r["ID"], r["TOKENS"], r["COGID"]) for r in rows] == [
+        ("1", "h i m m e l + a u g e", "1 2"),
+        ("2", "h i m m e l + s + a u g e", "1 0 2"),
+        ("3", "t ã + o", "3 4"),
+        ("4", "a u g e", "0"),
+    ]
+    assert rows[1]["ALIGNMENT"] == "h i m m e l + s + a u g e"
+
+
+def test_forms_to_tsv_filters(morpheme_dataset, tmp_path):
+    output = tmp_path / "cognate.tsv"
+    forms_to_tsv(morpheme_dataset, {"de"}, {"eye of heaven"}, {"AUGE"}, output)
+    rows = list(csv.DictReader(output.open(encoding="utf-8"), delimiter="\t"))
+    assert [(r["ID"], r["TOKENS"], r["COGID"]) for r in rows] == [
+        ("1", "h i m m e l + a u g e", "0 2"),
+        ("2", "h i m m e l s + a u g e", "0 2"),
+    ]
+
+
+def test_edictor_roundtrip(morpheme_dataset, tmp_path):
+    output = tmp_path / "cognate.tsv"
+    forms_to_tsv(morpheme_dataset, WorldSet(), WorldSet(), WorldSet(), output)
+    forms = list(morpheme_dataset["FormTable"])
+    cognatesets = load_forms_from_tsv(morpheme_dataset, output)
+    assert list(morpheme_dataset["FormTable"]) == forms
+    assert {
+        c: [(form, start, end) for form, start, end, _ in morphemes]
+        for c, morphemes in cognatesets.items()
+    } == {
+        "1": [("himmelauge", 0, 6), ("himmelsauge", 0, 6)],
+        "2": [("himmelauge", 6, 10), ("himmelsauge", 7, 11)],
+        "3": [("tao", 0, 2)],
+        "4": [("tao", 2, 3)],
+    }
+    assert cognatesets["2"][1][3] == list("auge")
+
+
+def test_edictor_import_merges_forms(morpheme_dataset, tmp_path):
+    output = tmp_path / "cognate.tsv"
+    forms_to_tsv(morpheme_dataset, {"de"}, WorldSet(), WorldSet(), output)
+    lines = output.read_text(encoding="utf-8").split("\n")
+    # Swap the rows, and change the tokens of one form
+    lines[1], lines[2] = lines[2], lines[1].replace("a u g e", "a u k e")
+    output.write_text("\n".join(lines), encoding="utf-8")
+    load_forms_from_tsv(morpheme_dataset, output)
+    assert [(f["ID"], f["Segments"]) for f in morpheme_dataset["FormTable"]] == [
+        ("himmelauge", list("himmelauke")),
+        ("himmelsauge", list("himmelsauge")),
+        ("tao", list("tão")),
+        ("auge", list("auge")),
+    ]
+
+
+def test_edictor_import_skips_repeated_forms(morpheme_dataset, tmp_path):
+    output = tmp_path / "cognate.tsv"
+    forms_to_tsv(morpheme_dataset, {"de"}, WorldSet(), WorldSet(), output)
+    lines = output.read_text(encoding="utf-8").split("\n")
+    # Repeat the first form, with other tokens
+    lines.insert(2, lines[1].replace("a u g e", "a u k e"))
+    output.write_text("\n".join(lines), encoding="utf-8")
+    load_forms_from_tsv(morpheme_dataset, output)
+    assert [(f["ID"], f["Segments"]) for f in morpheme_dataset["FormTable"]] == [
+        ("himmelauge", list("himmelauge")),
+        ("himmelsauge", list("himmelsauge")),
+        ("tao", list("tão")),
+        ("auge", list("auge")),
+    ]
+
+
+def test_match_cognatesets_greedy():
+    new = {"a": [("1",), ("2",), ("3",), ("6",), ("7",)], "b": [("4",), ("5",)]}
+    reference = {
+        "X": [("1",), ("2",), ("3",), ("4",), ("5",)],
+        "Y": [("6",), ("7",)],
+        "Z": [("8",)],
+    }
+    assert match_cognatesets(new, reference) == {"a": "X", "b": None}
@@ -178,6 +178,44 @@ def test_roundtrip(cldf_wordlist, working_and_nonworking_bibfile):
     assert new_judgements == old_judgements
 
 
+@pytest.mark.parametrize("shard_by", ["rows", "concept", "size"])
+@pytest.mark.parametrize("separate_files", [False, True])
+def test_roundtrip_sharded(cldf_wordlist, shard_by, separate_files):
+    dataset, target = copy_to_temp(cldf_wordlist)
+    c_formReference = dataset["CognateTable", "formReference"].name
+    c_cogsetReference = dataset["CognateTable", "cognatesetReference"].name
+    old_judgements = {
+        (row[c_formReference], row[c_cogsetReference])
+        for row in dataset["CognateTable"].iterdicts()
+    }
+    writer = ExcelWriter(dataset)
+    out_filename = Path(tempfile.mkdtemp(prefix="lexedata-test")) / "cognates.xlsx"
+    writer.create_excel(
+        out_filename,
+        shard_by=shard_by,
+        shard_rows=2,
+        separate_files=separate_files,
+        jobs=2,
+    )
+    if separate_files:
+        shards = sorted(out_filename.parent.glob("cognates-*.xlsx"))
+    else:
+        shards = [out_filename]
+
+    dataset["CognateTable"].write([])
+    dataset["CognatesetTable"].write([])
+
+    # Separate files have one sheet each, sharded workbooks need all sheets.
+    import_cognates_from_excel(shards, dataset, all_sheets=not separate_files)
+
+    new_judgements = {
+        (row[c_formReference], row[c_cogsetReference])
+        for row in dataset["CognateTable"].iterdicts()
+    }
+
+    assert new_judgements == old_judgements
+
+
 def test_roundtrip_separator_column(cldf_wordlist, working_and_nonworking_bibfile):
     """Test whether a CognatesetTable column with separator survives a roundtrip."""
     dataset, target = working_and_nonworking_bibfile(cldf_wordlist)
@@ -0,0 +1,52 @@
+import sys
+import pkgutil
+import subprocess
+
+import pytest
+
+import lexedata
+
+MODULES = sorted(
+    module.name for module in pkgutil.walk_packages(lexedata.__path__, "lexedata.")
+)
+
+# Budget for the time a lexedata module spends on its own module body, in
+# microseconds, not counting the time taken to import its dependencies. Every
+# module currently takes a few milliseconds at most; expensive work like
+# loading a reference catalog must happen lazily, not at import time.
+BUDGET = 50_000
+
+
+@pytest.fixture(scope="module")
+def import_times():
+    """Import all lexedata modules with `python -X importtime`
+
+    Return the self time (in microseconds) of every lexedata module.
+
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c"]
+        + ["; ".join(f"import {module}" for module in MODULES)],
+        capture_output=True,
+        text=True,
+    )
+    assert process.returncode == 0, process.stderr
+    times = {}
+    for line in process.stderr.split("\n"):
+        if not line.startswith("import time:"):
+            continue
+        self_time, cumulative, module = line[len("import time:") :].split("|")
+        try:
+            times[module.strip()] = int(self_time)
+        except ValueError:
+            # The header line
+            continue
+    return times
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_time(import_times, module):
+    assert import_times[module] < BUDGET, (
+        f"Importing {module} took {import_times[module] / 1000:.0f}ms, "
+        "not counting its dependencies."
+    )
@@ -0,0 +1,76 @@
+import csv
+import json
+
+import pycldf
+import networkx as nx
+
+from lexedata.report import list_homophones as lh
+
+
+def homophone_dataset(tmp_path):
+    dataset = pycldf.Wordlist.in_dir(tmp_path)
+    dataset.add_component(
+        "ParameterTable",
+        {
+            "name": "Concepticon_ID",
+            "propertyUrl": "http://cldf.clld.org/v1.0/terms.rdf#concepticonReference",
+        },
+    )
+    dataset.write(
+        ParameterTable=[
+            {"ID": "arm", "Name": "arm", "Concepticon_ID": "1"},
+            {"ID": "hand", "Name": "hand", "Concepticon_ID": "2"},
+            {"ID": "sun", "Name": "sun", "Concepticon_ID": "3"},
+            {"ID": "moon", "Name": "moon", "Concepticon_ID": None},
+        ],
+        FormTable=[
+            {"ID": "a1", "Language_ID": "a", "Parameter_ID": "arm", "Form": "ma"},
+            {"ID": "a2", "Language_ID": "a", "Parameter_ID": "hand", "Form": "ma"},
+            {"ID": "a3", "Language_ID": "a", "Parameter_ID": "sun", "Form": "ta"},
+            {"ID": "a4", "Language_ID": "a", "Parameter_ID": "moon", "Form": "ta"},
+            {"ID": "a5", "Language_ID": "a", "Parameter_ID": "hand", "Form": "ka"},
+            {"ID": "b1", "Language_ID": "b", "Parameter_ID": "arm", "Form": "ma"},
+            {"ID": "b2", "Language_ID": "b", "Parameter_ID": "sun", "Form": "ma"},
+        ],
+    )
+    return dataset
+
+
+def test_subgraph_connectivity():
+    connected = lh.SubgraphConnectivity(nx.Graph([("1", "2"), ("2", "3"), ("3", "4")]))
+    assert connected(frozenset({"1", "2", "3", "4"}))
+    assert connected(frozenset({"2", "3"}))
+    assert not connected(frozenset({"1", "4"}))
+    assert not connected(frozenset({"1", "2", "4"}))
+    assert len(connected.cache) == 4
+
+
+def test_homophone_groups(tmp_path):
+    dataset = homophone_dataset(tmp_path)
+    assert sorted(lh.homophone_groups(dataset)) == [
+        ("a", "ma", [("arm", "a1"), ("hand", "a2")]),
+        ("a", "ta", [("sun", "a3"), ("moon", "a4")]),
+        ("b", "ma", [("arm", "b1"), ("sun", "b2")]),
+    ]
+
+
+def test_report_csv_and_json(tmp_path, monkeypatch):
+    dataset = homophone_dataset(tmp_path)
+    monkeypatch.setattr(lh, "load_clics", lambda: nx.Graph([("1", "2"), ("3", "4")]))
+    report = lh.list_homophones(dataset, tmp_path / "homophones.csv")
+    with (tmp_path / "homophones.csv").open(encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [
+        (row["Language_ID"], row["Form"], row["Connectivity"], row["Incomplete"])
+        for row in rows
+    ] == [
+        ("a", "ma", "connected", "False"),
+        ("a", "ta", "unknown", "True"),
+        ("b", "ma", "unconnected", "False"),
+    ]
+    assert rows[0]["Concepts"] == "arm;hand"
+    assert rows[0]["Form_IDs"] == "a1;a2"
+
+    lh.list_homophones(dataset, tmp_path / "homophones.json", format="json")
+    with (tmp_path / "homophones.json").open(encoding="utf-8") as f:
+        assert json.load(f) == report
@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+
+import pytest
+import pycldf
+
+from lexedata.exporter.phylogenetics import (
+    export_alignment,
+    filter_wordlist,
+    read_cldf_dataset,
+)
+from lexedata.exporter.phylogenetics_batch import read_jobs, run_batch
+
+SMALL = Path(__file__).parent / "data/cldf/smallmawetiguarani/cldf-metadata.json"
+
+
+def test_batch_matches_single_exports(tmp_path):
+    dataset = pycldf.Dataset.from_metadata(SMALL)
+    job_file = tmp_path / "jobs.json"
+    job_file.write_text(
+        json.dumps(
+            [
+                {
+                    "coding": "rootmeaning",
+                    "format": "nexus",
+                    "output_file": "rm.nex",
+                    "stats_file": "rm.tex",
+                },
+                {
+                    "coding": "multistate",
+                    "format": "raw",
+                    "output_file": "ms.txt",
+                    "languages": ["ache", "kaiwa"],
+                    "exclude_concepts": ["one"],
+                },
+            ]
+        )
+    )
+    jobs = read_jobs(job_file)
+    durations = run_batch(dataset, jobs, max_workers=2)
+    assert len(durations) == 2
+
+    data = read_cldf_dataset(dataset)
+    export_alignment(
+        data,
+        coding="rootmeaning",
+        format="nexus",
+        output_file=tmp_path / "single_rm.nex",
+        stats_file=tmp_path / "single_rm.tex",
+    )
+    export_alignment(
+        filter_wordlist(data, languages={"ache", "kaiwa"}, exclude_concepts={"one"}),
+        coding="multistate",
+        format="raw",
+        output_file=tmp_path / "single_ms.txt",
+    )
+    for batch, single in [
+        ("rm.nex", "single_rm.nex"),
+        ("rm.tex", "single_rm.tex"),
+        ("ms.txt", "single_ms.txt"),
+    ]:
+        assert (tmp_path / batch).read_text() == (tmp_path / single).read_text()
+    assert "kaiwa" in (tmp_path / "ms.txt").read_text()
+    assert "paraguayan_guarani" not in (tmp_path / "ms.txt").read_text()
+
+
+def test_batch_runs_stdout_jobs_in_order(tmp_path, capsys):
+    dataset = pycldf.Dataset.from_metadata(SMALL)
+    jobs = [
+        {"coding": "rootmeaning", "format": "raw"},
+        {"coding": "multistate", "format": "raw", "output_file": tmp_path / "ms"},
+        {"coding": "rootpresence", "format": "raw"},
+    ]
+    run_batch(dataset, jobs, max_workers=2)
+    batch = capsys.readouterr().out
+
+    data = read_cldf_dataset(dataset)
+    export_alignment(data, coding="rootmeaning", format="raw")
+    export_alignment(data, coding="rootpresence", format="raw")
+    assert batch == capsys.readouterr().out
+    assert (tmp_path / "ms").exists()
+
+
+def test_read_jobs_checks_jobs(tmp_path):
+    (tmp_path / "languages.txt").write_text("ache\nkaiwa\n", encoding="utf-8")
+    job_file = tmp_path / "jobs.json"
+    job_file.write_text(json.dumps([{"languages": "languages.txt"}]))
+    assert read_jobs(job_file)[0]["languages"][:2] == ["ache", "kaiwa"]
+    job_file.write_text(json.dumps(["rootmeaning"]))
+    with pytest.raises(ValueError, match="not a JSON object"):
+        read_jobs(job_file)
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+from lexedata.change.rename_concept import rename as rename_concept
+from lexedata.change.rename_language import rename as rename_language
+from lexedata.change.rename_language import replace_column
+from lexedata.util import substitute_ids
+from test_excel_conversion import copy_to_temp
+
+SMALL = Path(__file__).parent / "data/cldf/smallmawetiguarani/cldf-metadata.json"
+
+
+def test_rename_language():
+    dataset, _ = copy_to_temp(SMALL)
+    forms = {f["ID"]: f["Language_ID"] for f in dataset["FormTable"]}
+    replace_column(
+        dataset, "ache", "axe", column_replace=False, smush=False, status_update=None
+    )
+    languages = [language["ID"] for language in dataset["LanguageTable"]]
+    assert "axe" in languages and "ache" not in languages
+    assert {f["ID"]: f["Language_ID"] for f in dataset["FormTable"]} == {
+        id: "axe" if language == "ache" else language for id, language in forms.items()
+    }
+
+
+def test_rename_many_concepts():
+    dataset, _ = copy_to_temp(SMALL)
+    mapping = {
+        concept["ID"]: concept["ID"].upper() for concept in dataset["ParameterTable"]
+    }
+    rename_concept(dataset, mapping, status_update=None)
+    assert {c["ID"] for c in dataset["ParameterTable"]} == set(mapping.values())
+    for form in dataset["FormTable"]:
+        assert set(form["Parameter_ID"]) <= set(mapping.values())
+
+
+def test_rename_language_refuses_to_smush():
+    dataset, _ = copy_to_temp(SMALL)
+    with pytest.raises(AssertionError):
+        rename_language(dataset, {"ache": "kaiwa"}, status_update=None)
+    rename_language(dataset, {"ache": "kaiwa"}, status_update=None, smush=True)
+    assert [c["ID"] for c in dataset["LanguageTable"]].count("kaiwa") == 1
+
+
+def test_rename_language_adds_status_column():
+    dataset, _ = copy_to_temp(SMALL)
+    replace_column(
+        dataset, "ache", "axe", column_replace=False, smush=False, status_update="new"
+    )
+    status = {
+        language["ID"]: language["Status_Column"]
+        for language in dataset["LanguageTable"]
+    }
+    assert status["axe"] == "new"
+    assert status["kaiwa"] is None
+
+
+def test_substitute_ids_merges_only_on_request():
+    dataset, _ = copy_to_temp(SMALL)
+    forms = list(dataset["FormTable"])
+    url = dataset["FormTable"].url.string
+    substitute_ids(dataset, {url: {forms[1]["ID"]: forms[0]["ID"]}})
+    assert len(list(dataset["FormTable"])) == len(forms)
+    substitute_ids(dataset, {url: {forms[2]["ID"]: forms[0]["ID"]}}, merge=True)
+    assert len(list(dataset["FormTable"])) == len(forms) - 2